@@ -28,13 +28,18 @@ import berserk2.bugtracker
 from settings import BUG_TRACKER_TYPE
 
 class BugTrackerFactory:
+    # The class named by BUG_TRACKER_TYPE, once it has been looked up
+    _tracker = {}
+
     @staticmethod
     def get_bug_tracker():
-        try:
-            mod = berserk2.bugtracker
-            parts = BUG_TRACKER_TYPE.split('.')
-            for i in parts:
-                mod = getattr(mod, i)
-            return mod
-        except:
-            return None
+        if BUG_TRACKER_TYPE not in BugTrackerFactory._tracker:
+            try:
+                mod = berserk2.bugtracker
+                parts = BUG_TRACKER_TYPE.split('.')
+                for i in parts:
+                    mod = getattr(mod, i)
+            except:
+                mod = None
+            BugTrackerFactory._tracker[BUG_TRACKER_TYPE] = mod
+        return BugTrackerFactory._tracker[BUG_TRACKER_TYPE]
@@ -0,0 +1,100 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from django.db import connection, transaction
+from django.db.models import AutoField
+
+# The number of rows sent to the database in a single INSERT statement
+BULK_INSERT_ROWS = 100
+
+def bulk_insert(objs):
+    """
+    Inserts a list of new model instances, all of the same class, using as few
+    statements as the database allows, and sets their primary keys if the
+    database generated them.  Unlike save(), no signals are sent.  Returns
+    objs.
+
+    PostgreSQL hands the new ids back with RETURNING.  MySQL reports the id
+    of the first row of a multi-row INSERT, and allocates the rest
+    consecutively (as long as innodb_autoinc_lock_mode is 0 or 1, the
+    default).  Other databases, such as SQLite, don't have a network round
+    trip to save, so rows are inserted one at a time.
+    """
+    if not objs:
+        return objs
+
+    opts = objs[0]._meta
+    fields = [f for f in opts.local_fields if not isinstance(f, AutoField)]
+
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) VALUES ' \
+          % (qn(opts.db_table), ', '.join([qn(f.column) for f in fields]))
+    placeholders = '(%s)' % ', '.join(['%s'] * len(fields))
+
+    def get_params(obj):
+        return [f.get_db_prep_save(f.pre_save(obj, True), connection=connection)
+                for f in fields]
+
+    engine = connection.settings_dict['ENGINE']
+    multi_row = connection.features.can_return_id_from_insert \
+                or engine.endswith('mysql')
+    auto_pk = isinstance(opts.pk, AutoField)
+
+    cursor = connection.cursor()
+    for i in xrange(0, len(objs), BULK_INSERT_ROWS):
+        chunk = objs[i:i + BULK_INSERT_ROWS]
+
+        if multi_row:
+            params = []
+            for obj in chunk:
+                params.extend(get_params(obj))
+
+            values = ', '.join([placeholders] * len(chunk))
+            if not auto_pk:
+                cursor.execute(sql + values, params)
+                continue
+
+            if connection.features.can_return_id_from_insert:
+                cursor.execute(sql + values + ' RETURNING %s' % qn(opts.pk.column),
+                               params)
+                ids = [row[0] for row in cursor.fetchall()]
+            else:
+                cursor.execute(sql + values, params)
+                first = connection.ops.last_insert_id(cursor, opts.db_table,
+                                                      opts.pk.column)
+                ids = range(first, first + len(chunk))
+        else:
+            ids = []
+            for obj in chunk:
+                cursor.execute(sql + placeholders, get_params(obj))
+                if auto_pk:
+                    ids.append(connection.ops.last_insert_id(cursor, opts.db_table,
+                                                             opts.pk.column))
+            if not auto_pk:
+                continue
+
+        for obj, id in zip(chunk, ids):
+            setattr(obj, opts.pk.attname, id)
+
+    transaction.commit_unless_managed()
+    return objs
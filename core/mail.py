@@ -0,0 +1,107 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import os
+import re
+import socket
+import smtplib
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from berserk2.core.models import QueuedEmail
+
+# How long a run has to send a message it has claimed before another run may
+# try it again.
+CLAIM_SECONDS = 10 * 60
+
+def send_queued_messages(now=None):
+    """
+    Sends the queued messages that are due over a single connection to the
+    mail server, keeping to EMAIL_QUEUE_RATE_PER_MINUTE.  A message that
+    can't be sent is tried again after EMAIL_QUEUE_RETRY_SECONDS, doubling
+    each time, until it has been tried EMAIL_QUEUE_MAX_ATTEMPTS times.
+    Returns the number of messages sent and the number that failed.
+    """
+    now = now or datetime.now()
+
+    allowance = settings.EMAIL_QUEUE_RATE_PER_MINUTE \
+              - QueuedEmail.objects.filter(sent__gt=now - timedelta(minutes=1)).count()
+    if allowance <= 0:
+        return 0, 0
+
+    queued = list(QueuedEmail.objects.due(now)[:allowance])
+    if not queued:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection()
+    connection.open()
+    try:
+        for q in queued:
+            if not QueuedEmail.objects.claim(q, now + timedelta(seconds=CLAIM_SECONDS)):
+                continue
+
+            q.attempts += 1
+            try:
+                connection.send_messages([q.to_message()])
+            except (smtplib.SMTPException, socket.error), e:
+                q.last_error = str(e)
+                q.next_attempt = now \
+                               + timedelta(seconds=settings.EMAIL_QUEUE_RETRY_SECONDS \
+                                                   * 2 ** (q.attempts - 1))
+                failed += 1
+
+                # The connection may not survive the error; it is opened
+                # again for the next message.
+                connection.close()
+            else:
+                q.sent = now
+                sent += 1
+            q.save()
+    finally:
+        connection.close()
+    return sent, failed
+
+def write_messages(messages, directory):
+    """
+    Writes each of a list of EmailMessages to its own file in directory,
+    exactly as it would be sent, so that it can be looked over instead.
+    Returns the paths of the files.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    paths = []
+    for i, message in enumerate(messages):
+        name = '%03d-%s.eml' % (i, re.sub(r'[^\w@.-]', '_', ','.join(message.to)))
+        path = os.path.join(directory, name)
+        f = open(path, 'w')
+        try:
+            f.write(message.message().as_string())
+        finally:
+            f.close()
+        paths.append(path)
+    return paths
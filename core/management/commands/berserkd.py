@@ -0,0 +1,152 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import os
+import fcntl
+import signal
+import threading
+import simplejson
+
+from datetime import datetime, timedelta
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from berserk2.core import metrics
+from berserk2.core.scheduler import Job, Scheduler
+from berserk2.sprints.models import keep_clients
+
+def log(msg):
+    print '[%s]: %s' % (datetime.now(), msg)
+
+class Command(BaseCommand):
+    help = "Runs the jobs in BERSERKD_JOBS on their intervals in a single long lived process"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--status', action='store_true', dest='status', default=False,
+                    help='Print when each job of the running berserkd last ran, and for how long'),
+    )
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self._print_status()
+            return
+
+        # Only one berserkd may run against a database at a time
+        lock = open(settings.BERSERKD_LOCK_FILE, 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            raise CommandError('berserkd is already running')
+
+        self.jobs = [Job(j['command'], self._make_func(j), j['interval'],
+                         jitter=j.get('jitter', 0),
+                         missed=j.get('missed', 'run_once'))
+                     for j in settings.BERSERKD_JOBS]
+        if not self.jobs:
+            raise CommandError('No jobs are listed in BERSERKD_JOBS')
+
+        client_max_age = timedelta(seconds=settings.BERSERKD_CLIENT_MAX_AGE)
+        scheduler = Scheduler(self.jobs, on_run=self._on_run,
+                              init_thread=lambda job: keep_clients(client_max_age))
+        self._status_lock = threading.Lock()
+
+        def stop(signum, frame):
+            log('Stopping once running jobs finish')
+            scheduler.stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        log('Starting %s' % ', '.join([j.name for j in self.jobs]))
+        self._write_status()
+        scheduler.run()
+        log('Stopped')
+
+    def _make_func(self, job):
+        def func():
+            metrics.start('command:%s' % job['command'])
+            try:
+                call_command(job['command'], *job.get('args', ()))
+            finally:
+                metrics.finish()
+        return func
+
+    def _on_run(self, job):
+        if job.last_error:
+            log('%s failed after %.1fs: %s' % (job.name, job.last_duration,
+                                              job.last_error))
+        else:
+            log('%s finished in %.1fs' % (job.name, job.last_duration))
+        self._write_status()
+
+        if settings.METRICS_PUSH_DIR:
+            metrics.write_push_file(os.path.join(settings.METRICS_PUSH_DIR,
+                                                 'berserkd.prom'))
+
+    def _write_status(self):
+        """
+        Writes the status of every job to BERSERKD_STATUS_FILE, where
+        berserkd --status can read it.
+        """
+        self._status_lock.acquire()
+        try:
+            path = settings.BERSERKD_STATUS_FILE
+            f = open(path + '.tmp', 'w')
+            try:
+                simplejson.dump({
+                    'pid': os.getpid(),
+                    'updated': datetime.now().isoformat(),
+                    'jobs': [j.get_status() for j in self.jobs],
+                }, f)
+            finally:
+                f.close()
+            os.rename(path + '.tmp', path)
+        finally:
+            self._status_lock.release()
+
+    def _print_status(self):
+        try:
+            f = open(settings.BERSERKD_STATUS_FILE, 'r')
+        except IOError:
+            raise CommandError('berserkd has not been started')
+        try:
+            status = simplejson.load(f)
+        finally:
+            f.close()
+
+        print 'berserkd (pid %d), last updated %s' % (status['pid'],
+                                                      status['updated'])
+        for j in status['jobs']:
+            duration = '-'
+            if j['last_duration'] is not None:
+                duration = '%.1fs' % j['last_duration']
+
+            print '  %-20s %s last started %s, took %s, next run %s' \
+                  % (j['name'], 'running' if j['running'] else 'idle   ',
+                     j['last_started'] or 'never', duration, j['next_run'])
+            print '  %-20s %d runs, %d missed, %d failed%s' \
+                  % ('', j['runs'], j['missed_runs'], j['failures'],
+                     j['last_error'] and ' (%s)' % j['last_error'] or '')
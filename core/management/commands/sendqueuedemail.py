@@ -0,0 +1,54 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import NoArgsCommand
+
+from berserk2.core.mail import send_queued_messages
+from berserk2.core.models import QueuedEmail
+
+class Command(NoArgsCommand):
+    help = "Sends the queued emails that are due, up to EMAIL_QUEUE_RATE_PER_MINUTE"
+
+    def handle_noargs(self, **options):
+        def log(msg):
+            print '[%s]: %s' % (datetime.now(), msg)
+
+        now = datetime.now()
+
+        # Each message is claimed and marked as it is sent, rather than in
+        # one transaction, so that an overlapping run never sends it twice.
+        sent, failed = send_queued_messages(now)
+        log('Sent %d emails, %d failed' % (sent, failed))
+
+        QueuedEmail.objects.purge(now)
+
+        given_up = QueuedEmail.objects.filter(sent__isnull=True,
+                                              attempts__gte=settings.EMAIL_QUEUE_MAX_ATTEMPTS) \
+                                      .count()
+        if given_up:
+            log('%d emails could not be sent after %d attempts' \
+                % (given_up, settings.EMAIL_QUEUE_MAX_ATTEMPTS))
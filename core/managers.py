@@ -0,0 +1,73 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+
+class QueuedEmailManager(models.Manager):
+    def enqueue(self, message, key):
+        """
+        Queues an EmailMessage to be sent by the sendqueuedemail command,
+        unless a message has already been queued under key.  Returns whether
+        the message was queued.
+        """
+        if self.filter(key=key).exists():
+            return False
+
+        self.create(key=key, subject=message.subject, body=message.body,
+                    from_email=message.from_email,
+                    to='\n'.join(message.to), bcc='\n'.join(message.bcc))
+        return True
+
+    def due(self, now):
+        """
+        Returns the unsent messages whose next attempt is due by now, oldest
+        first, leaving out those that have used up EMAIL_QUEUE_MAX_ATTEMPTS.
+        """
+        return self.filter(sent__isnull=True, next_attempt__lte=now,
+                           attempts__lt=settings.EMAIL_QUEUE_MAX_ATTEMPTS) \
+                   .order_by('next_attempt', 'id')
+
+    def claim(self, queued, until):
+        """
+        Marks a due message as being sent until the given time, so that an
+        overlapping run doesn't send it too.  Returns False if another run
+        has already claimed or sent it.
+        """
+        claimed = self.filter(pk=queued.pk, sent__isnull=True,
+                              next_attempt=queued.next_attempt) \
+                      .update(next_attempt=until)
+        if claimed:
+            queued.next_attempt = until
+        return claimed == 1
+
+    def purge(self, now):
+        """
+        Deletes the messages sent more than EMAIL_QUEUE_KEEP_DAYS ago.  Their
+        keys may be queued again after that.
+        """
+        self.filter(sent__lt=now - timedelta(settings.EMAIL_QUEUE_KEEP_DAYS)) \
+            .delete()
@@ -0,0 +1,268 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import os
+import time
+import atexit
+import bisect
+import threading
+
+from django.conf import settings
+
+# The upper bounds, in seconds, of the request duration histogram's buckets
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Commands that don't get a push file, as they serve requests themselves
+UNTIMED_COMMANDS = ('runserver', 'shell', 'help')
+
+class Scope:
+    """
+    The SQL queries and bug tracker calls made while handling one request
+    or command run.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.tracker_calls = 0
+        self.tracker_seconds = 0.0
+
+class TimedClient:
+    """
+    Wraps a bug tracker client, timing every call made through it.
+    """
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if not callable(value):
+            return value
+
+        def timed(*args, **kwargs):
+            start = time.time()
+            try:
+                return value(*args, **kwargs)
+            finally:
+                record_tracker_call(time.time() - start)
+        return timed
+
+class _TimedCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, *args):
+        start = time.time()
+        try:
+            return self.cursor.execute(*args)
+        finally:
+            record_query(time.time() - start)
+
+    def executemany(self, *args):
+        start = time.time()
+        try:
+            return self.cursor.executemany(*args)
+        finally:
+            record_query(time.time() - start)
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+_lock = threading.Lock()
+
+# The scope of the request each thread is handling, if any
+_local = threading.local()
+
+# The scope of the management command the process is running, which queries
+# made outside of a request, such as on a command's worker threads, count
+# towards
+_command_scope = None
+
+# Totals for each request or command name, since the process started
+_totals = {}
+
+def install():
+    """
+    Starts timing the SQL queries made on every database connection.  Safe
+    to call more than once.
+    """
+    from django.db.backends import BaseDatabaseWrapper
+
+    _lock.acquire()
+    try:
+        if getattr(BaseDatabaseWrapper, '_timed', False):
+            return
+
+        cursor = BaseDatabaseWrapper.cursor
+        def timed_cursor(self):
+            return _TimedCursor(cursor(self))
+        BaseDatabaseWrapper.cursor = timed_cursor
+        BaseDatabaseWrapper._timed = True
+    finally:
+        _lock.release()
+
+def start(name):
+    """
+    Starts timing a request or command run on the calling thread.
+    """
+    _local.scope = Scope(name)
+
+def set_name(name):
+    """
+    Renames the calling thread's request, once it is known which view
+    handles it.
+    """
+    scope = getattr(_local, 'scope', None)
+    if scope is not None:
+        scope.name = name
+
+def finish():
+    """
+    Stops timing the calling thread's request or command run, and adds it
+    to the totals.
+    """
+    scope = getattr(_local, 'scope', None)
+    if scope is not None:
+        _local.scope = None
+        _record(scope)
+
+def record_query(seconds):
+    _add(seconds, 'sql_queries', 'sql_seconds')
+
+def record_tracker_call(seconds):
+    _add(seconds, 'tracker_calls', 'tracker_seconds')
+
+def _add(seconds, count_attr, seconds_attr):
+    scope = getattr(_local, 'scope', None) or _command_scope
+    if scope is None:
+        return
+
+    _lock.acquire()
+    try:
+        setattr(scope, count_attr, getattr(scope, count_attr) + 1)
+        setattr(scope, seconds_attr, getattr(scope, seconds_attr) + seconds)
+    finally:
+        _lock.release()
+
+def _record(scope):
+    duration = time.time() - scope.started
+
+    _lock.acquire()
+    try:
+        totals = _totals.get(scope.name)
+        if totals is None:
+            totals = _totals[scope.name] = {
+                'buckets': [0] * len(BUCKETS), 'count': 0, 'seconds': 0.0,
+                'sql_queries': 0, 'sql_seconds': 0.0,
+                'tracker_calls': 0, 'tracker_seconds': 0.0,
+            }
+
+        i = bisect.bisect_left(BUCKETS, duration)
+        if i < len(BUCKETS):
+            totals['buckets'][i] += 1
+        totals['count'] += 1
+        totals['seconds'] += duration
+        for attr in ('sql_queries', 'sql_seconds', 'tracker_calls', 'tracker_seconds'):
+            totals[attr] += getattr(scope, attr)
+    finally:
+        _lock.release()
+
+def render():
+    """
+    Returns the totals in the Prometheus text exposition format.
+    """
+    def escape(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    _lock.acquire()
+    try:
+        totals = sorted([(name, dict(t, buckets=list(t['buckets'])))
+                         for name, t in _totals.items()])
+    finally:
+        _lock.release()
+
+    lines = [
+        '# HELP berserk_request_duration_seconds How long requests and command runs took.',
+        '# TYPE berserk_request_duration_seconds histogram',
+    ]
+    for name, t in totals:
+        label = 'handler="%s"' % escape(name)
+        cumulative = 0
+        for bound, count in zip(BUCKETS, t['buckets']):
+            cumulative += count
+            lines.append('berserk_request_duration_seconds_bucket{%s,le="%s"} %d' \
+                         % (label, bound, cumulative))
+        lines.append('berserk_request_duration_seconds_bucket{%s,le="+Inf"} %d' \
+                     % (label, t['count']))
+        lines.append('berserk_request_duration_seconds_sum{%s} %f' % (label, t['seconds']))
+        lines.append('berserk_request_duration_seconds_count{%s} %d' % (label, t['count']))
+
+    for metric, key, description in (
+            ('berserk_sql_queries_total', 'sql_queries', 'SQL queries made.'),
+            ('berserk_sql_seconds_total', 'sql_seconds', 'Time spent on SQL queries.'),
+            ('berserk_tracker_calls_total', 'tracker_calls', 'Calls made to bug trackers.'),
+            ('berserk_tracker_seconds_total', 'tracker_seconds', 'Time spent on calls to bug trackers.')):
+        lines.append('# HELP %s %s' % (metric, description))
+        lines.append('# TYPE %s counter' % metric)
+        line = key.endswith('_seconds') and '%s{handler="%s"} %f' or '%s{handler="%s"} %d'
+        for name, t in totals:
+            lines.append(line % (metric, escape(name), t[key]))
+    return '\n'.join(lines) + '\n'
+
+def write_push_file(path):
+    """
+    Writes the totals to path, in the same format as /metrics, replacing
+    whatever was there in one step so that a collector never reads half a
+    file.
+    """
+    f = open(path + '.tmp', 'w')
+    try:
+        f.write(render())
+    finally:
+        f.close()
+    os.rename(path + '.tmp', path)
+
+def record_command(argv):
+    """
+    Times the management command given on the command line, and writes the
+    totals to <command>.prom in METRICS_PUSH_DIR when the process exits.
+    Does nothing unless METRICS_PUSH_DIR is set.
+    """
+    global _command_scope
+
+    if not settings.METRICS_PUSH_DIR or len(argv) < 2 \
+       or argv[1] in UNTIMED_COMMANDS:
+        return
+
+    install()
+    name = argv[1]
+    _command_scope = Scope('command:%s' % name)
+
+    def push():
+        _record(_command_scope)
+        write_push_file(os.path.join(settings.METRICS_PUSH_DIR, '%s.prom' % name))
+    atexit.register(push)
@@ -0,0 +1,47 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+from berserk2.core import metrics
+
+class MetricsMiddleware(object):
+    """
+    Times each request under the name of the view that handles it, along
+    with the SQL queries and bug tracker calls it makes.  The totals are
+    served at /metrics.  Should be listed first in MIDDLEWARE_CLASSES, so
+    that the time spent in other middleware is counted too.
+    """
+    def __init__(self):
+        metrics.install()
+
+    def process_request(self, request):
+        metrics.start('unresolved')
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics.set_name('%s.%s' % (view_func.__module__,
+                                    getattr(view_func, '__name__',
+                                            view_func.__class__.__name__)))
+
+    def process_response(self, request, response):
+        metrics.finish()
+        return response
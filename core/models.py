@@ -0,0 +1,60 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+from datetime import datetime
+
+from django.db import models
+from django.core.mail import EmailMessage
+
+from berserk2.core.managers import QueuedEmailManager
+
+class QueuedEmail(models.Model):
+    """
+    An email waiting in the outbox to be sent by the sendqueuedemail command.
+    Messages are queued under a key, such as the user and day they are for,
+    so that queueing the same message twice only sends it once.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    subject = models.TextField()
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    # One address per line
+    to = models.TextField()
+    bcc = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    next_attempt = models.DateTimeField(default=datetime.now, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    sent = models.DateTimeField(null=True, blank=True, db_index=True)
+    objects = QueuedEmailManager()
+
+    def __unicode__(self):
+        return self.key
+
+    def to_message(self):
+        """
+        Returns the EmailMessage this was queued from.
+        """
+        return EmailMessage(self.subject, self.body, self.from_email,
+                            to=self.to.splitlines(), bcc=self.bcc.splitlines())
@@ -0,0 +1,226 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import random
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from django.db import connection
+
+class Job:
+    """
+    A function run by a Scheduler every interval seconds, give or take up to
+    jitter seconds so that jobs with the same interval don't all start at
+    once.
+
+    A job never overlaps with itself.  When a run is due while the previous
+    one is still going, or the scheduler was held up for more than a whole
+    interval, the run is missed, and the missed policy decides what happens:
+
+     - 'run_once': the job runs once as soon as it can, however many runs
+       were missed.
+
+     - 'skip': the job waits for its next scheduled run.
+    """
+    MISSED_POLICIES = ('run_once', 'skip')
+
+    def __init__(self, name, func, interval, jitter=0, missed='run_once'):
+        if missed not in self.MISSED_POLICIES:
+            raise ValueError('Unknown missed run policy: %s' % missed)
+
+        self.name = name
+        self.func = func
+        self.interval = timedelta(seconds=interval)
+        self.jitter = jitter
+        self.missed = missed
+
+        self.next_run = None
+        self.running = False
+        self.pending = False
+
+        self.runs = 0
+        self.missed_runs = 0
+        self.failures = 0
+        self.last_started = None
+        self.last_duration = None
+        self.last_error = None
+
+        self._trigger = threading.Event()
+
+    def schedule(self, now):
+        """
+        Sets the job's next run to one interval after now.
+        """
+        self.next_run = now + self.interval \
+                        + timedelta(seconds=random.uniform(0, self.jitter))
+
+    def get_status(self):
+        """
+        Returns a dict describing the job's last run and next run.
+        """
+        def format(d):
+            return d.isoformat() if d else None
+
+        return {
+            'name': self.name,
+            'running': self.running,
+            'runs': self.runs,
+            'missed_runs': self.missed_runs,
+            'failures': self.failures,
+            'last_started': format(self.last_started),
+            'last_duration': self.last_duration,
+            'last_error': self.last_error,
+            'next_run': format(self.next_run),
+        }
+
+class Scheduler:
+    """
+    Runs a list of Jobs until stopped.  Each job gets a thread of its own
+    which lives as long as the scheduler, so database connections and
+    anything else a job keeps on its thread stay warm between runs.
+    """
+    # The longest the scheduler sleeps before checking whether it has been
+    # stopped
+    MAX_SLEEP = 1.0
+
+    def __init__(self, jobs, on_run=None, init_thread=None):
+        """
+        on_run, if given, is called with the job after every run.  init_thread,
+        if given, is called on each job's thread before its first run.
+        """
+        self.jobs = jobs
+        self.on_run = on_run
+        self.init_thread = init_thread
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self):
+        """
+        Runs the jobs until stop() is called, then waits for any jobs which
+        are still running to finish.
+        """
+        now = datetime.now()
+        threads = []
+        for job in self.jobs:
+            # Spread out the first runs, too
+            job.next_run = now + timedelta(seconds=random.uniform(0, job.jitter))
+
+            t = threading.Thread(target=self._work, args=(job,),
+                                 name='berserkd-%s' % job.name)
+            t.setDaemon(True)
+            t.start()
+            threads.append(t)
+
+        while not self._stop.isSet():
+            now = datetime.now()
+            for job in self.jobs:
+                if job.next_run <= now:
+                    self._dispatch(job, now)
+
+            wait = min([j.next_run for j in self.jobs]) - datetime.now()
+            wait = wait.days * 86400 + wait.seconds + wait.microseconds / 1e6
+            self._stop.wait(max(0, min(wait, self.MAX_SLEEP)))
+
+        for job in self.jobs:
+            job._trigger.set()
+        for t in threads:
+            t.join()
+
+    def stop(self):
+        self._stop.set()
+
+    def _dispatch(self, job, now):
+        late = now - job.next_run > job.interval
+        job.schedule(now)
+
+        self._lock.acquire()
+        try:
+            if not job.running and not late:
+                job.running = True
+                job._trigger.set()
+                return
+
+            job.missed_runs += 1
+            if job.missed == 'skip':
+                logging.warning('%s: skipping missed run' % job.name)
+            elif job.running:
+                logging.warning('%s: still running, will run again once done'
+                                % job.name)
+                job.pending = True
+            else:
+                logging.warning('%s: running late' % job.name)
+                job.running = True
+                job._trigger.set()
+        finally:
+            self._lock.release()
+
+    def _work(self, job):
+        if self.init_thread:
+            self.init_thread(job)
+
+        try:
+            while True:
+                job._trigger.wait()
+                job._trigger.clear()
+                if self._stop.isSet():
+                    return
+
+                self._run(job)
+
+                self._lock.acquire()
+                try:
+                    if job.pending and not self._stop.isSet():
+                        job.pending = False
+                        job._trigger.set()
+                    else:
+                        job.running = False
+                finally:
+                    self._lock.release()
+        finally:
+            connection.close()
+
+    def _run(self, job):
+        job.last_started = datetime.now()
+        job.last_error = None
+        try:
+            job.func()
+        except SystemExit:
+            # Some commands exit early when they have nothing to do
+            pass
+        except Exception, e:
+            job.failures += 1
+            job.last_error = '%s: %s' % (e.__class__.__name__, e)
+            logging.exception('%s failed' % job.name)
+        finally:
+            # End the run's transaction, so that the next run doesn't read
+            # the same stale snapshot, and don't hand a broken connection on
+            connection.close()
+
+        elapsed = datetime.now() - job.last_started
+        job.last_duration = elapsed.days * 86400 + elapsed.seconds \
+                            + elapsed.microseconds / 1e6
+        job.runs += 1
+
+        if self.on_run:
+            self.on_run(job)
@@ -0,0 +1,247 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import os
+import shutil
+import smtplib
+import tempfile
+import threading
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import mail
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth.models import User
+from django.core.mail.backends.base import BaseEmailBackend
+
+from berserk2.core import metrics
+from berserk2.core.mail import send_queued_messages, write_messages
+from berserk2.core.models import QueuedEmail
+from berserk2.core.scheduler import Job, Scheduler
+
+class SchedulerTest(TestCase):
+    def setUp(self):
+        self.now = datetime(2011, 3, 1, 12, 0)
+
+    def _dispatch(self, missed, running=False, late=False):
+        job = Job('test', lambda: None, 60, missed=missed)
+        job.running = running
+        job.next_run = self.now - timedelta(seconds=late and 90 or 0)
+        Scheduler([job])._dispatch(job, self.now)
+        return job
+
+    def test_due(self):
+        job = self._dispatch('skip')
+        self.assertTrue(job._trigger.isSet())
+        self.assertEqual(0, job.missed_runs)
+        self.assertEqual(self.now + timedelta(seconds=60), job.next_run)
+
+    def test_overlap_run_once(self):
+        job = self._dispatch('run_once', running=True)
+        self.assertFalse(job._trigger.isSet())
+        self.assertTrue(job.pending)
+        self.assertEqual(1, job.missed_runs)
+
+    def test_overlap_skip(self):
+        job = self._dispatch('skip', running=True)
+        self.assertFalse(job._trigger.isSet())
+        self.assertFalse(job.pending)
+        self.assertEqual(1, job.missed_runs)
+
+    def test_late_run_once(self):
+        job = self._dispatch('run_once', late=True)
+        self.assertTrue(job._trigger.isSet())
+        self.assertEqual(1, job.missed_runs)
+
+    def test_late_skip(self):
+        job = self._dispatch('skip', late=True)
+        self.assertFalse(job._trigger.isSet())
+        self.assertFalse(job.running)
+        self.assertEqual(1, job.missed_runs)
+
+class SchedulerTransactionTest(TransactionTestCase):
+    def _create_user_elsewhere(self, username):
+        # Committed from another connection, as another process would.  An
+        # in-memory SQLite database can't be shared, so it is written here.
+        if connection.settings_dict['NAME'] in ('', ':memory:'):
+            User.objects.create(username=username)
+            return
+
+        def create():
+            try:
+                User.objects.create(username=username)
+            finally:
+                connection.close()
+        thread = threading.Thread(target=create)
+        thread.start()
+        thread.join()
+
+    def test_run_sees_rows_committed_since_last_run(self):
+        counts = []
+        job = Job('test', lambda: counts.append(User.objects.count()), 60)
+        scheduler = Scheduler([job])
+
+        scheduler._run(job)
+        self._create_user_elsewhere('late')
+        scheduler._run(job)
+        self.assertEqual(counts[0] + 1, counts[1])
+
+class MailTest(TestCase):
+    def setUp(self):
+        self.messages = [mail.EmailMessage('Subject %d' % i, 'Body', 'berserk@example.com',
+                                           to=['user%d@example.com' % i])
+                         for i in xrange(3)]
+
+    def test_write_messages(self):
+        directory = tempfile.mkdtemp()
+        try:
+            paths = write_messages(self.messages, directory)
+            self.assertEqual(['000-user0@example.com.eml', '001-user1@example.com.eml',
+                              '002-user2@example.com.eml'],
+                             sorted(os.listdir(directory)))
+            self.assertTrue('Subject: Subject 1' in open(paths[1]).read())
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual([], mail.outbox)
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+
+class QueuedEmailTest(TestCase):
+    def setUp(self):
+        self.now = datetime.now()
+        for i in xrange(3):
+            QueuedEmail.objects.enqueue(mail.EmailMessage('Subject %d' % i, 'Body',
+                                                          'berserk@example.com',
+                                                          to=['user%d@example.com' % i],
+                                                          bcc=['Manager <boss@example.com>']),
+                                        'test-%d' % i)
+
+    def test_enqueue_once_per_key(self):
+        message = QueuedEmail.objects.get(key='test-0').to_message()
+        self.assertEqual(['user0@example.com'], message.to)
+        self.assertEqual(['Manager <boss@example.com>'], message.bcc)
+
+        self.assertFalse(QueuedEmail.objects.enqueue(message, 'test-0'))
+        self.assertEqual(3, QueuedEmail.objects.count())
+        self.assertEqual([], mail.outbox)
+
+    def test_send_queued_messages(self):
+        self.assertEqual((3, 0), send_queued_messages(self.now))
+        self.assertEqual(['Subject 0', 'Subject 1', 'Subject 2'],
+                         [m.subject for m in mail.outbox])
+        self.assertEqual(0, QueuedEmail.objects.filter(sent__isnull=True).count())
+
+        # Sent messages are never sent again
+        self.assertEqual((0, 0), send_queued_messages(self.now))
+
+    def test_rate_limit(self):
+        rate = settings.EMAIL_QUEUE_RATE_PER_MINUTE
+        settings.EMAIL_QUEUE_RATE_PER_MINUTE = 2
+        try:
+            self.assertEqual((2, 0), send_queued_messages(self.now))
+            self.assertEqual((0, 0), send_queued_messages(self.now))
+            self.assertEqual((1, 0), send_queued_messages(self.now + timedelta(minutes=2)))
+        finally:
+            settings.EMAIL_QUEUE_RATE_PER_MINUTE = rate
+
+    def test_retry_with_backoff(self):
+        backend = settings.EMAIL_BACKEND
+        settings.EMAIL_BACKEND = 'berserk2.core.tests.FailingEmailBackend'
+        try:
+            self.assertEqual((0, 3), send_queued_messages(self.now))
+        finally:
+            settings.EMAIL_BACKEND = backend
+
+        queued = QueuedEmail.objects.get(key='test-0')
+        self.assertEqual(1, queued.attempts)
+        self.assertTrue('unexpectedly closed' in queued.last_error)
+        backoff = timedelta(seconds=settings.EMAIL_QUEUE_RETRY_SECONDS)
+        self.assertEqual((self.now + backoff).replace(microsecond=0),
+                         queued.next_attempt.replace(microsecond=0))
+
+        # Not due again until the backoff has passed
+        self.assertEqual((0, 0), send_queued_messages(self.now))
+        retry = self.now + timedelta(seconds=settings.EMAIL_QUEUE_RETRY_SECONDS + 5)
+        self.assertEqual((3, 0), send_queued_messages(retry))
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        metrics._totals.clear()
+
+    def test_render(self):
+        metrics.start('berserk2.sprints.views.sprint_detail')
+        metrics.record_query(0.002)
+        metrics.record_query(0.003)
+        metrics.record_tracker_call(0.5)
+        metrics.finish()
+
+        # Nothing is recorded outside of a request
+        metrics.record_query(0.1)
+
+        text = metrics.render()
+        label = 'handler="berserk2.sprints.views.sprint_detail"'
+        self.assertTrue('berserk_request_duration_seconds_bucket{%s,le="30"} 1' % label in text)
+        self.assertTrue('berserk_request_duration_seconds_count{%s} 1' % label in text)
+        self.assertTrue('berserk_sql_queries_total{%s} 2' % label in text)
+        self.assertTrue('berserk_sql_seconds_total{%s} 0.005000' % label in text)
+        self.assertTrue('berserk_tracker_calls_total{%s} 1' % label in text)
+
+    def test_timed_client(self):
+        class Client:
+            product = 'Berserk'
+            def get_bug(self, remote_tracker_id):
+                return remote_tracker_id
+
+        metrics.start('test')
+        client = metrics.TimedClient(Client())
+        self.assertEqual('Berserk', client.product)
+        self.assertEqual('1', client.get_bug('1'))
+        metrics.finish()
+        self.assertEqual(1, metrics._totals['test']['tracker_calls'])
+
+    def test_metrics_view(self):
+        self.client.get('/metrics')
+        response = self.client.get('/metrics')
+        self.assertEqual(200, response.status_code)
+        self.assertTrue('berserk_sql_queries_total{handler="berserk2.core.views.metrics"}'
+                        in response.content)
+
+        response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(403, response.status_code)
+
+    def test_write_push_file(self):
+        metrics.start('command:snapshottasks')
+        metrics.finish()
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'snapshottasks.prom')
+            metrics.write_push_file(path)
+            self.assertEqual(metrics.render(), open(path).read())
+            self.assertEqual(['snapshottasks.prom'], os.listdir(directory))
+        finally:
+            shutil.rmtree(directory)
@@ -8,4 +8,10 @@ except ImportError:
     sys.exit(1)
 
 if __name__ == "__main__":
+    import sys
+    from django.core.management import setup_environ
+    from berserk2.core.metrics import record_command
+
+    setup_environ(settings)
+    record_command(sys.argv)
     execute_manager(settings)
@@ -0,0 +1,207 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import os
+import zlib
+import shutil
+import struct
+import tempfile
+import simplejson
+
+from time import mktime
+
+import numpy
+
+from berserk2.reports.export import iter_chunks
+
+# Starts and ends every archive
+MAGIC = 'BSNAP\x00\x01\x00'
+
+# Each column starts at a multiple of this many bytes into the archive, so
+# that it can be mapped and read as an array in place.
+ALIGNMENT = 64
+
+# The archived TaskSnapshot fields: the name of the column, the lookup it is
+# read with and its numpy dtype.  Dates are stored as Unix time, and
+# unassigned tasks as assigned to user 0.
+COLUMNS = (
+    ('id', 'id', '<i4'),
+    ('date', 'date', '<i8'),
+    ('task', 'task', '<i4'),
+    ('status', 'status', '<u2'),
+    ('component', 'component', '<u2'),
+    ('assigned_to', 'assigned_to', '<i4'),
+    ('estimated_hours', 'estimated_hours', '<i4'),
+    ('actual_hours', 'actual_hours', '<i4'),
+    ('remaining_hours', 'remaining_hours', '<i4'),
+)
+
+# The columns whose strings are stored once each, in the archive's footer,
+# with the column holding their index.
+DICTIONARY_COLUMNS = ('status', 'component')
+
+def write_archive(snapshots, path, compress=False):
+    """
+    Writes the given queryset of TaskSnapshots, in id order, to a new
+    archive at path, and returns the number of snapshots written.
+
+    An archive is made of one array per column, followed by a JSON footer
+    describing them.  If compress is True, each column is compressed with
+    zlib; this makes the archive smaller, but the columns then have to be
+    decompressed into memory to be read.
+
+    The snapshots are read a chunk at a time and each column is spooled to
+    a temporary file, so any number of them can be archived in the same
+    memory.
+    """
+    dictionaries = dict([(name, {}) for name in DICTIONARY_COLUMNS])
+    def encode(name, value):
+        codes = dictionaries[name]
+        if value not in codes:
+            if len(codes) > numpy.iinfo(numpy.uint16).max:
+                raise ValueError('Too many distinct values of %s to archive' % name)
+            codes[value] = len(codes)
+        return codes[value]
+
+    def convert(name, values):
+        if name == 'date':
+            return [int(mktime(d.timetuple())) for d in values]
+        elif name in DICTIONARY_COLUMNS:
+            return [encode(name, v) for v in values]
+        elif name == 'assigned_to':
+            return [v or 0 for v in values]
+        return values
+
+    spools = [tempfile.TemporaryFile() for c in COLUMNS]
+    compressors = [zlib.compressobj() if compress else None for c in COLUMNS]
+    rows = 0
+    try:
+        for chunk in iter_chunks(snapshots, [lookup for name, lookup, dtype in COLUMNS]):
+            for (name, lookup, dtype), values, spool, compressor \
+                in zip(COLUMNS, zip(*chunk), spools, compressors):
+                data = numpy.array(convert(name, values), dtype=dtype).tostring()
+                if compressor:
+                    data = compressor.compress(data)
+                spool.write(data)
+            rows += len(chunk)
+
+        for spool, compressor in zip(spools, compressors):
+            if compressor:
+                spool.write(compressor.flush())
+
+        # Written next to path and renamed, so that readers never see a
+        # partly written archive
+        temp_path = path + '.tmp'
+        out = open(temp_path, 'wb')
+        try:
+            try:
+                out.write(MAGIC)
+                columns = []
+                for (name, lookup, dtype), spool in zip(COLUMNS, spools):
+                    out.write('\0' * (-out.tell() % ALIGNMENT))
+                    offset = out.tell()
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, out)
+                    columns.append({'name': name, 'dtype': dtype, 'offset': offset,
+                                    'length': out.tell() - offset})
+
+                footer = simplejson.dumps({
+                    'rows': rows,
+                    'compressed': compress,
+                    'columns': columns,
+                    'dictionaries': dict([(name, sorted(codes, key=codes.get))
+                                          for name, codes in dictionaries.items()]),
+                })
+                out.write(footer)
+                out.write(struct.pack('<I', len(footer)))
+                out.write(MAGIC)
+            finally:
+                out.close()
+            os.rename(temp_path, path)
+        finally:
+            # Only left behind if writing or renaming failed
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    finally:
+        for spool in spools:
+            spool.close()
+    return rows
+
+class SnapshotArchive(object):
+    """
+    An archive written by write_archive.  Its columns are numpy arrays,
+    looked up by name.  The columns of an uncompressed archive are mapped
+    from the file rather than read, so that only the parts of it used are
+    ever loaded.
+    """
+    def __init__(self, path):
+        self.path = path
+
+        f = open(path, 'rb')
+        try:
+            start = f.read(len(MAGIC))
+            f.seek(-(4 + len(MAGIC)), os.SEEK_END)
+            length = struct.unpack('<I', f.read(4))[0]
+            if start != MAGIC or f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('%s is not a snapshot archive' % path)
+
+            f.seek(-(4 + len(MAGIC) + length), os.SEEK_END)
+            footer = simplejson.loads(f.read(length))
+        finally:
+            f.close()
+
+        self.rows = footer['rows']
+        self.compressed = footer['compressed']
+        self.dictionaries = footer['dictionaries']
+        self.columns = [c['name'] for c in footer['columns']]
+        self._columns = dict([(c['name'], c) for c in footer['columns']])
+        self._arrays = {}
+
+    def __getitem__(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = self._load(self._columns[name])
+        return self._arrays[name]
+
+    def decode(self, name, codes):
+        """
+        Returns the strings of a dictionary column, such as status, for the
+        given array of its codes.
+        """
+        return numpy.array(self.dictionaries[name], dtype=object)[codes]
+
+    def _load(self, column):
+        dtype = numpy.dtype(str(column['dtype']))
+        if self.rows == 0:
+            return numpy.zeros(0, dtype=dtype)
+
+        if not self.compressed:
+            return numpy.memmap(self.path, dtype=dtype, mode='r',
+                                offset=column['offset'], shape=(self.rows,))
+
+        f = open(self.path, 'rb')
+        try:
+            f.seek(column['offset'])
+            data = zlib.decompress(f.read(column['length']))
+        finally:
+            f.close()
+        return numpy.frombuffer(data, dtype=dtype)
@@ -0,0 +1,105 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import csv
+import simplejson
+from StringIO import StringIO
+
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+# The content type each report format is sent as
+FORMATS = {
+    'txt': 'text/plain',
+    'csv': 'text/csv',
+    'json': 'application/json',
+}
+
+COLUMNS = ('id', 'title', 'component', 'status', 'assigned_to', 'url')
+
+def report_response(snapshots, format, filename, header_template=None,
+                    context=None):
+    """
+    Returns a response which streams a report of the given TaskSnapshots in
+    format, one of FORMATS.  snapshots should be a queryset, such as one from
+    TaskSnapshot.objects.closed(); it is read in a single query and never held
+    in memory all at once.  Text reports start with header_template, rendered
+    with context.
+    """
+    snapshots = snapshots.select_related('task__bug_tracker', 'assigned_to') \
+                         .order_by('task')
+    rows = _get_rows(snapshots.iterator())
+
+    if format == 'txt':
+        content = _render_txt(rows, header_template, context)
+    elif format == 'csv':
+        content = render_csv(rows, COLUMNS)
+    else:
+        content = _render_json(rows)
+
+    response = HttpResponse(content, mimetype=FORMATS[format])
+    if format != 'txt':
+        response['Content-Disposition'] = 'attachment; filename=%s.%s' \
+                                          % (filename, format)
+    return response
+
+def _get_rows(snapshots):
+    for s in snapshots:
+        yield {
+            'id': s.task.remote_tracker_id.replace(' ', ''),
+            'title': s.title,
+            'component': s.component,
+            'status': s.status,
+            'assigned_to': s.assigned_to.first_name if s.assigned_to else None,
+            'url': s.task.get_absolute_url(),
+        }
+
+def _render_txt(rows, header_template, context):
+    if header_template:
+        yield render_to_string(header_template, context or {})
+    for row in rows:
+        yield u' * #%(id)s - %(title)s\n' % row
+
+def render_csv(rows, columns):
+    """
+    Yields a csv header of columns, then one line for each of rows, a
+    dictionary keyed by column, encoded as UTF-8.
+    """
+    out = StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([unicode(row[c] if row[c] is not None else '').encode('utf-8')
+                         for c in columns])
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    yield out.getvalue()
+
+def _render_json(rows):
+    yield '['
+    for i, row in enumerate(rows):
+        if i:
+            yield ', '
+        yield simplejson.dumps(row)
+    yield ']'
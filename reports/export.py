@@ -0,0 +1,153 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import simplejson
+
+from datetime import datetime, timedelta
+from optparse import make_option
+
+from django.core.management.base import CommandError
+
+from berserk2.sprints.models import Milestone, Sprint, Task, TaskSnapshot
+from berserk2.reports.engine import render_csv
+
+# The content type each export format is sent as
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# The number of snapshots read from the database at a time
+SNAPSHOTS_PER_CHUNK = 5000
+
+FIELDS = (
+    ('id', 'id'),
+    ('date', 'date'),
+    ('task', 'task'),
+    ('remote_tracker_id', 'task__remote_tracker_id'),
+    ('title', 'title'),
+    ('component', 'component'),
+    ('assigned_to', 'assigned_to__username'),
+    ('submitted_by', 'submitted_by__username'),
+    ('status', 'status'),
+    ('estimated_hours', 'estimated_hours'),
+    ('actual_hours', 'actual_hours'),
+    ('remaining_hours', 'remaining_hours'),
+)
+COLUMNS = [name for name, lookup in FIELDS]
+
+def export_snapshots(format, **filters):
+    """
+    Returns an iterator over the text of every TaskSnapshot matching filters
+    (see filter_snapshots), oldest first, in format, one of FORMATS.
+    """
+    rows = _get_rows(filter_snapshots(**filters))
+    if format == 'csv':
+        return render_csv(rows, COLUMNS)
+    return _render_ndjson(rows)
+
+def filter_snapshots(sprint=None, milestone=None, start=None, end=None):
+    """
+    Returns a queryset of the TaskSnapshots of the tasks of sprint or
+    milestone, if given, taken from start to end (dates), both inclusive.
+    """
+    snapshots = TaskSnapshot.objects.all()
+    if sprint is not None:
+        snapshots = snapshots.filter(task__in=Task.objects.filter(sprints=sprint))
+    if milestone is not None:
+        snapshots = snapshots.filter(task__in=Task.objects.filter(sprints__milestone=milestone))
+    if start is not None:
+        snapshots = snapshots.filter(date__gte=start)
+    if end is not None:
+        snapshots = snapshots.filter(date__lt=end + timedelta(1))
+    return snapshots
+
+def filter_options(verb):
+    """
+    Returns the options of a management command that takes the arguments of
+    filter_snapshots, described as the snapshots the command will verb.
+    """
+    return (
+        make_option('--sprint', dest='sprint', type='int',
+                    help='Only %s the snapshots of the tasks in this sprint (an id)' % verb),
+        make_option('--milestone', dest='milestone', type='int',
+                    help='Only %s the snapshots of the tasks in this milestone (an id)' % verb),
+        make_option('--start', dest='start',
+                    help='Only %s snapshots taken on or after this date (YYYY-MM-DD)' % verb),
+        make_option('--end', dest='end',
+                    help='Only %s snapshots taken on or before this date (YYYY-MM-DD)' % verb),
+    )
+
+def parse_filter_options(options):
+    """
+    Returns the arguments of filter_snapshots given by the options of
+    filter_options, raising CommandError if any of them is invalid.
+    """
+    filters = {}
+    try:
+        if options['sprint']:
+            filters['sprint'] = Sprint.objects.get(pk=options['sprint'])
+        if options['milestone']:
+            filters['milestone'] = Milestone.objects.get(pk=options['milestone'])
+    except (Sprint.DoesNotExist, Milestone.DoesNotExist):
+        raise CommandError('No such sprint or milestone')
+
+    for name in ('start', 'end'):
+        if options[name]:
+            try:
+                filters[name] = datetime.strptime(options[name], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Invalid %s date %s' % (name, options[name]))
+    return filters
+
+def iter_chunks(snapshots, lookups):
+    """
+    Returns an iterator over lists of up to SNAPSHOTS_PER_CHUNK tuples of the
+    values of lookups for snapshots, in id order.  lookups must start with
+    'id'.
+
+    Each chunk starts after the id the last one ended at, so reading every
+    snapshot takes the same memory, and the same time per row, however long
+    the history is.
+    """
+    last_id = 0
+    while True:
+        chunk = list(snapshots.filter(pk__gt=last_id).order_by('pk') \
+                              .values_list(*lookups)[:SNAPSHOTS_PER_CHUNK])
+        if chunk:
+            yield chunk
+
+        if len(chunk) < SNAPSHOTS_PER_CHUNK:
+            break
+        last_id = chunk[-1][0]
+
+def _get_rows(snapshots):
+    for chunk in iter_chunks(snapshots, [lookup for name, lookup in FIELDS]):
+        for values in chunk:
+            row = dict(zip(COLUMNS, values))
+            row['date'] = row['date'].isoformat()
+            yield row
+
+def _render_ndjson(rows):
+    for row in rows:
+        yield simplejson.dumps(row) + '\n'
@@ -0,0 +1,53 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from datetime import datetime
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from berserk2.reports.export import filter_options, filter_snapshots, \
+                                    parse_filter_options
+from berserk2.reports.archive import write_archive
+
+class Command(BaseCommand):
+    args = '<path>'
+    help = "Writes task snapshots to a columnar archive which can be loaded with reports.archive.SnapshotArchive"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--compress', action='store_true', dest='compress', default=False,
+                    help='Compress the columns, at the cost of having to read them into memory to load them'),
+    ) + filter_options('archive')
+
+    def handle(self, *args, **options):
+        def log(msg):
+            print '[%s]: %s' % (datetime.now(), msg)
+
+        if len(args) != 1:
+            raise CommandError('Give the path of the archive to write')
+
+        filters = parse_filter_options(options)
+
+        rows = write_archive(filter_snapshots(**filters), args[0],
+                             compress=options['compress'])
+        log('Archived %d snapshots to %s' % (rows, args[0]))
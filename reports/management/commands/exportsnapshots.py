@@ -0,0 +1,57 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import sys
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from berserk2.reports.export import FORMATS, export_snapshots, filter_options, \
+                                    parse_filter_options
+
+class Command(BaseCommand):
+    help = "Writes the history of every task snapshot as csv or newline delimited json"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format', dest='format', default='csv',
+                    help='csv (the default) or ndjson'),
+        make_option('--output', dest='output',
+                    help='The file to write to, instead of standard output'),
+    ) + filter_options('export')
+
+    def handle(self, *args, **options):
+        if options['format'] not in FORMATS:
+            raise CommandError('Unknown format %s' % options['format'])
+
+        filters = parse_filter_options(options)
+
+        out = sys.stdout
+        if options['output']:
+            out = open(options['output'], 'w')
+        try:
+            for text in export_snapshots(options['format'], **filters):
+                out.write(text)
+        finally:
+            if out is not sys.stdout:
+                out.close()
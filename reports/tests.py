@@ -0,0 +1,113 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import os
+import shutil
+import tempfile
+import simplejson
+
+from datetime import date, datetime, timedelta
+
+from django.test import TestCase
+
+from berserk2.reports import export
+from berserk2.reports.archive import SnapshotArchive, write_archive
+from berserk2.sprints.models import BugTracker, TaskSnapshot
+from berserk2.sprints.testutils import create_task
+
+def _create_snapshots():
+    tracker = BugTracker.objects.create(base_url='http://example.com',
+                                        product='Berserk', username='',
+                                        password='')
+    task = create_task('1', tracker)
+    for i in xrange(5):
+        TaskSnapshot.objects.create(task=task, title='Snapshot %d' % i,
+                                    component='', status=('NEW', 'RESOLVED')[i % 2],
+                                    estimated_hours=4, actual_hours=i,
+                                    remaining_hours=4 - i)
+
+class ExportSnapshotsTest(TestCase):
+    def setUp(self):
+        _create_snapshots()
+        self.chunk_size = export.SNAPSHOTS_PER_CHUNK
+        export.SNAPSHOTS_PER_CHUNK = 2
+
+    def tearDown(self):
+        export.SNAPSHOTS_PER_CHUNK = self.chunk_size
+
+    def test_ndjson(self):
+        rows = [simplejson.loads(l)
+                for l in ''.join(export.export_snapshots('ndjson')).splitlines()]
+        self.assertEqual(range(5), [r['actual_hours'] for r in rows])
+        self.assertEqual('1', rows[0]['remote_tracker_id'])
+        self.assertEqual(None, rows[0]['assigned_to'])
+
+    def test_csv(self):
+        lines = ''.join(export.export_snapshots('csv')).splitlines()
+        self.assertEqual(','.join(export.COLUMNS), lines[0])
+        self.assertEqual(6, len(lines))
+
+    def test_date_range(self):
+        tomorrow = date.today() + timedelta(1)
+        self.assertEqual([], list(export.export_snapshots('ndjson', start=tomorrow)))
+        self.assertEqual(5, len(list(export.export_snapshots('ndjson', end=date.today()))))
+
+class SnapshotArchiveTest(TestCase):
+    def setUp(self):
+        _create_snapshots()
+        self.chunk_size = export.SNAPSHOTS_PER_CHUNK
+        export.SNAPSHOTS_PER_CHUNK = 2
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        export.SNAPSHOTS_PER_CHUNK = self.chunk_size
+        shutil.rmtree(self.dir)
+
+    def _check(self, compress):
+        path = os.path.join(self.dir, 'snapshots.bsnap')
+        self.assertEqual(5, write_archive(TaskSnapshot.objects.all(), path,
+                                          compress=compress))
+
+        archive = SnapshotArchive(path)
+        self.assertEqual(5, archive.rows)
+        self.assertEqual(range(5), list(archive['actual_hours']))
+        self.assertEqual([0] * 5, list(archive['assigned_to']))
+        self.assertEqual(['NEW', 'RESOLVED', 'NEW', 'RESOLVED', 'NEW'],
+                         list(archive.decode('status', archive['status'])))
+
+        first = TaskSnapshot.objects.order_by('pk')[0]
+        self.assertEqual(first.date.replace(microsecond=0),
+                         datetime.fromtimestamp(archive['date'][0]))
+
+    def test_archive(self):
+        self._check(False)
+
+    def test_compressed_archive(self):
+        self._check(True)
+
+    def test_failed_archive_leaves_no_temp_file(self):
+        # A directory can't be renamed over, so the last step fails
+        path = os.path.join(self.dir, 'snapshots.bsnap')
+        os.mkdir(path)
+        self.assertRaises(OSError, write_archive, TaskSnapshot.objects.all(), path)
+        self.assertEqual(['snapshots.bsnap'], os.listdir(self.dir))
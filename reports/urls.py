@@ -24,5 +24,7 @@
 from django.conf.urls.defaults import *
 
 urlpatterns = patterns('berserk2.reports.views',
-    url(r'^resolved_tasks/(?P<sprint_id>\d+)/txt/$', 'reports_resolved_tasks_txt'),
+    url(r'^resolved_tasks/(?P<sprint_id>\d+)/(?P<format>txt|csv|json)/$', 'reports_resolved_tasks'),
+    url(r'^milestone_resolved_tasks/(?P<milestone_id>\d+)/(?P<format>txt|csv|json)/$', 'reports_milestone_resolved_tasks'),
+    url(r'^snapshots/(?P<format>csv|ndjson)/$', 'reports_export_snapshots'),
 )
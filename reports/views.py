@@ -21,20 +21,62 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
-import simplejson
+from datetime import datetime
 
-from django.db.models import Q
-from django.template import RequestContext
-from django.shortcuts import render_to_response, get_object_or_404
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.shortcuts import get_object_or_404
+from django.contrib.admin.views.decorators import staff_member_required
 
-from berserk2.sprints.models import *
+from berserk2.sprints.models import Milestone, Sprint, TaskSnapshot
+from berserk2.reports.engine import report_response
+from berserk2.reports.export import FORMATS as EXPORT_FORMATS, export_snapshots
 
-def reports_resolved_tasks_txt(request, sprint_id,
-                               template_name='reports/resolved_tasks.txt'):
+def reports_resolved_tasks(request, sprint_id, format='txt',
+                           template_name='reports/resolved_tasks.txt'):
+    """
+    Returns the tasks resolved in the given sprint as release notes, in txt,
+    csv or json format.
+    """
     sprint = get_object_or_404(Sprint, pk=int(sprint_id))
-    tasks = Task.objects.filter(sprints=sprint)
-    return render_to_response(template_name,
-                              {'sprint': sprint,
-                               'snapshots': [t.get_latest_snapshot() for t in tasks]},
-                              mimetype='text/plain',
-                              context_instance=RequestContext(request))
+    snapshots = TaskSnapshot.objects.closed().filter(task__sprints=sprint)
+    return report_response(snapshots, format,
+                           'sprint-%d-resolved-tasks' % sprint.pk,
+                           template_name, {'sprint': sprint})
+
+def reports_milestone_resolved_tasks(request, milestone_id, format='txt',
+                                     template_name='reports/resolved_tasks.txt'):
+    """
+    Returns the tasks resolved in every sprint of the given milestone as
+    release notes, in txt, csv or json format.
+    """
+    milestone = get_object_or_404(Milestone, pk=int(milestone_id))
+    snapshots = TaskSnapshot.objects.closed() \
+                                    .filter(task__sprints__milestone=milestone) \
+                                    .distinct()
+    return report_response(snapshots, format,
+                           'milestone-%d-resolved-tasks' % milestone.pk,
+                           template_name, {'milestone': milestone})
+
+@staff_member_required
+def reports_export_snapshots(request, format):
+    """
+    Streams the history of every task snapshot, oldest first, as csv or
+    newline delimited json.  The sprint and milestone parameters (ids) limit
+    it to their tasks, and the start and end parameters (YYYY-MM-DD) to the
+    snapshots taken between them.
+    """
+    filters = {}
+    try:
+        for name, model in (('sprint', Sprint), ('milestone', Milestone)):
+            if name in request.GET:
+                filters[name] = get_object_or_404(model, pk=int(request.GET[name]))
+        for name in ('start', 'end'):
+            if name in request.GET:
+                filters[name] = datetime.strptime(request.GET[name], '%Y-%m-%d').date()
+    except ValueError:
+        return HttpResponseBadRequest()
+
+    response = HttpResponse(export_snapshots(format, **filters),
+                            mimetype=EXPORT_FORMATS[format])
+    response['Content-Disposition'] = 'attachment; filename=snapshots.%s' % format
+    return response
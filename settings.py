@@ -26,6 +26,23 @@ DATABASE_STORAGE_ENGINE = 'INNODB'
 # simply ignoring the emails.
 UPDATE_HOURS_REMINDER_DAYS = 3
 
+# The address reminder and report emails are sent from.
+EMAIL_FROM = 'berserk@localhost'
+
+# Whether estimationaccuracyemail emails each assignee, and BCCs MANAGERS,
+# the day after a sprint ends.  Off, it only logs what it would send.
+ESTIMATION_ACCURACY_EMAIL_ENABLED = False
+
+# Reminder emails are queued and sent by the sendqueuedemail command, at most
+# EMAIL_QUEUE_RATE_PER_MINUTE a minute.  A message that can't be sent is
+# tried again after EMAIL_QUEUE_RETRY_SECONDS, doubling each time, up to
+# EMAIL_QUEUE_MAX_ATTEMPTS times.  Sent messages are kept, so that they
+# aren't queued again, for EMAIL_QUEUE_KEEP_DAYS.
+EMAIL_QUEUE_RATE_PER_MINUTE = 30
+EMAIL_QUEUE_RETRY_SECONDS = 60
+EMAIL_QUEUE_MAX_ATTEMPTS = 8
+EMAIL_QUEUE_KEEP_DAYS = 30
+
 NEW_TASK_BOOKMARKLET_URL = "javascript:(function(){window.open('%s?url=' + encodeURIComponent(window.location.href), 'new_berserk_task')})()"
 
 # The bugtracker class to use.  Must be a child of berserk2.bugtracker
@@ -34,9 +51,12 @@ BUG_TRACKER_TYPE = "fogbugz.FogBugzClient"
 
 # List all the data sources (rooted at berserk2.timeline.sources) that should
 # be run on scheduled intervals for the timeline app.  If you don't want to use
-# timeline, just comment out the sources below.
+# timeline, just comment out the sources below.  GitHubPushSource processes the
+# pushes GitHub posts to /timeline/github_hook/, which refuses them unless it
+# is listed.
 TIMELINE_SOURCES = (
 #    'FogBugzEmailSource',
+#    'GitHubPushSource',
 )
 
 # Settings for the FogBugz email source for berserk's timeline
@@ -46,6 +66,104 @@ FB_EMAIL_SOURCE_HOST = ''
 FB_EMAIL_SOURCE_USER = ''
 FB_EMAIL_SOURCE_PASSWORD = ''
 
+# To read from more than one mailbox, such as those of several FogBugz
+# installations, list them here instead.  Each mailbox is read at the same
+# time as the others, and keeps track of its own progress.  folder defaults to
+# INBOX, and timeout to FB_EMAIL_SOURCE_TIMEOUT.
+FB_EMAIL_SOURCE_MAILBOXES = (
+#    {'host': 'imap.example.com', 'user': 'fogbugz', 'password': '',
+#     'folder': 'INBOX', 'timeout': 60},
+)
+
+# How many seconds the FogBugz email source waits on an IMAP server before
+# giving up on it until the next run
+FB_EMAIL_SOURCE_TIMEOUT = 60
+
+# The maximum number of messages the FogBugz email source will process in a
+# single run, and how many of those are fetched from the server at once.  A
+# large backlog will be worked through over several runs.
+FB_EMAIL_SOURCE_MAX_MESSAGES = 500
+FB_EMAIL_SOURCE_BATCH_SIZE = 50
+
+# How many fetched batches may wait to be parsed and written while a timeline
+# source is running.  Fetching pauses once this many are queued.
+TIMELINE_PIPELINE_QUEUE_SIZE = 4
+
+# How many days of events the timeline keeps in its hot window.  The timeline
+# is served from the hot window, and only reads the full event history when
+# paging further back.  Trimmed by the trimrecentevents command.
+TIMELINE_HOT_WINDOW_DAYS = 31
+
+# Changes to the same task by the same person, each made within this many
+# seconds of the last, are shown in the timeline as a single digest event
+# which can be expanded.  Set to 0 to show every change on its own.
+TIMELINE_DIGEST_SECONDS = 120
+
+# How many events each user's personal feed keeps.  Feeds are written as
+# events are inserted, and trimmed back to this length by the trimfeeds
+# command.
+TIMELINE_FEED_LENGTH = 500
+
+# The jobs run by the berserkd daemon, as an alternative to running them from
+# cron.  Each job is a management command, run every interval seconds plus a
+# random delay of up to jitter seconds.  A job never overlaps with itself; if
+# a run is missed because the previous one is still going, missed decides
+# whether it runs as soon as it can ('run_once', the default) or waits for its
+# next turn ('skip').
+BERSERKD_JOBS = (
+    {'command': 'syncsources', 'interval': 3 * 60, 'jitter': 10},
+    {'command': 'sendqueuedemail', 'interval': 60},
+    {'command': 'runsnapshotjobs', 'interval': 60},
+    {'command': 'snapshottasks', 'interval': 60 * 60, 'jitter': 60},
+    {'command': 'snapshotmilestones', 'interval': 3 * 60 * 60, 'jitter': 60,
+     'missed': 'skip'},
+    {'command': 'trimrecentevents', 'interval': 24 * 60 * 60, 'jitter': 600,
+     'missed': 'skip'},
+    {'command': 'trimfeeds', 'interval': 60 * 60, 'jitter': 60,
+     'missed': 'skip'},
+    {'command': 'updateestimationaccuracy', 'interval': 24 * 60 * 60,
+     'jitter': 600, 'missed': 'skip'},
+)
+
+# Snapshot jobs queued from the admin are run by the runsnapshotjobs command
+# on this many threads at once, each taking this many tasks at a time.  A
+# task a run has claimed but not finished within SNAPSHOT_JOB_CLAIM_SECONDS
+# is picked up again by the next run.
+SNAPSHOT_JOB_THREADS = 4
+SNAPSHOT_JOB_BATCH_SIZE = 25
+SNAPSHOT_JOB_CLAIM_SECONDS = 10 * 60
+
+# Request metrics are served at /metrics to these addresses only.  Each
+# process keeps its own, so with several processes, scrape each of them.
+# If METRICS_PUSH_DIR is set, management commands write theirs to
+# <command>.prom there when they exit, such as for node_exporter's textfile
+# collector.
+METRICS_ALLOWED_IPS = ('127.0.0.1',)
+METRICS_PUSH_DIR = None
+
+# How long reference data that rarely changes, such as the current sprint and
+# the bug trackers, is kept in memory, in seconds.  Saving it drops it from
+# the process that saved it straight away; other processes pick up the
+# change within this time.
+REFERENCE_CACHE_SECONDS = 60
+
+# How long berserkd reuses a logged in bug tracker client before logging in
+# again, in seconds.
+BERSERKD_CLIENT_MAX_AGE = 60 * 60
+
+# Where berserkd records the last run of each job for berserkd --status, and
+# the lock file that keeps a second berserkd from starting.
+BERSERKD_STATUS_FILE = os.path.join(PROJECT_ROOT, 'berserkd.status')
+BERSERKD_LOCK_FILE = os.path.join(PROJECT_ROOT, 'berserkd.lock')
+
+# The sprint completion forecast is drawn from this many simulated runs of
+# the rest of the sprint, in which each person works at rates seen in up to
+# this many past sprints.  Forecasts are cached for up to
+# SPRINT_FORECAST_CACHE_SECONDS, or until the sprint's data changes.
+SPRINT_FORECAST_SIMULATIONS = 2000
+SPRINT_FORECAST_HISTORY_SPRINTS = 6
+SPRINT_FORECAST_CACHE_SECONDS = 6 * 60 * 60
+
 # Local time zone for this installation. Choices can be found here:
 # http://en.wikipedia.org/wiki/List_of_tz_zones_by_name
 # although not all choices may be available on all operating systems.
@@ -88,6 +206,7 @@ TEMPLATE_LOADERS = (
 )
 
 MIDDLEWARE_CLASSES = (
+    'berserk2.core.middleware.MetricsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
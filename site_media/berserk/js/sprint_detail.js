@@ -21,6 +21,39 @@
  * WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE. 
 */
 
+// Turns the compact form of the sprint's tasks, sent column by column with
+// people, components and statuses sent once, into rows for the tasks grid.
+function expandCompactTasks(data) {
+    var escape = function (s) {
+        return $('<div>').text(s).html();
+    };
+
+    var cols = data.tasks;
+    var rows = [];
+    for (var i = 0; i < cols.id.length; i++) {
+        var remaining = [];
+        var sparkline = [cols.estimated_hours[i]];
+        for (var j = 0; j < cols.remaining[i].length; j++) {
+            var v = cols.remaining[i][j];
+            remaining.push(v === null ? '' : v);
+            if (v !== null)
+                sparkline.push(v);
+        }
+
+        rows.push([
+            '<a href="' + cols.url[i] + '" target="_blank">#' + escape(cols.id[i]) + '</a>',
+            escape(cols.title[i]) + '&nbsp;<span class="sparkline invisible">'
+                + sparkline.join(',') + '</span>',
+            data.components[cols.component[i]],
+            data.people[cols.assigned_to[i]],
+            data.people[cols.submitted_by[i]],
+            data.statuses[cols.status[i]],
+            cols.estimated_hours[i]
+        ].concat(remaining));
+    }
+    return rows;
+}
+
 function createTasksGrid(target_id, url, iteration_days) {
     var fields = [
         { name: 'id', type: 'string' }, { name: 'title', type: 'string' },
@@ -59,8 +92,6 @@ function createTasksGrid(target_id, url, iteration_days) {
     var grid = new Ext.grid.GridPanel({
         store: new Ext.data.GroupingStore({
             reader: new Ext.data.ArrayReader({}, fields),
-            url: url,
-            autoLoad: true,
             sortInfo: { field: 'status', direction: "asc" },
             groupField: 'component'
         }),
@@ -81,19 +112,18 @@ function createTasksGrid(target_id, url, iteration_days) {
         $.sparkline_display_visible();
     };
 
-    grid.on('render', function(component) {
-        // This behavior is lame.  For some reason, render is giving us the
-        // event after only the parent has rendered, not after all of the
-        // children have.  Of course, with network delays, it is possible that
-        // you won't see sparklines at all.
-        sparkify.defer(500);
-        sparkify.defer(2000);
-        sparkify.defer(3500);
-        sparkify.defer(5000);
-    });
-        
     grid.getColumnModel().defaultSortable = true;
     grid.render(target_id);
+
+    grid.loadMask.show();
+    $.getJSON(url, { format: 'compact' }, function (data) {
+        grid.store.loadData(expandCompactTasks(data));
+        grid.loadMask.hide();
+
+        // Give the grid a moment to draw the rows before drawing the
+        // sparklines inside them
+        sparkify.defer(100);
+    });
     return grid;
 }
 
@@ -29,6 +29,9 @@ Timeline.prototype = {
 	_options : {
 		latestEventsUrl : null,
 		previousEventsUrl : null,
+		eventChildrenUrl : null,
+		compact : true,
+		facets : {},
 		timeUpdateFrequency : 30000,
 		updateFrequency : 5000,
 		cullFrequency : 30000,
@@ -63,6 +66,12 @@ Timeline.prototype = {
 		window.setInterval(function () { klass.cullEventList(); },
 		                   this._options.cullFrequency);
 
+		$('#timeline-event-container').delegate('.timeline-event-children a', 'click',
+			function () {
+				klass.expandDigest($(this).closest('.timeline-event'));
+				return false;
+			});
+
 		$(window).scroll(function () {
 			// Fetch down starting when we're viewing the last 20% of the page
 			var startFetching = $(document).height() - $(window).height()
@@ -102,6 +111,56 @@ Timeline.prototype = {
 		return mesg;
 	},
 
+	_escape : function (s) {
+		return $('<div>').text(s).html();
+	},
+
+	_getJSON : function (url, callback) {
+		var klass = this;
+		var params = $.extend({}, this._options.facets);
+		if (this._options.compact)
+			params.format = 'compact';
+		$.getJSON(url, params, function (data) {
+			callback(klass._expandEvents(data), data);
+		});
+	},
+
+	// Turns a compact response, where events are sent column by column and
+	// actors and tasks are sent once, back into a list of rendered events.
+	_expandEvents : function (data) {
+		if ($.isArray(data.events))
+			return data.events;
+
+		var cols = data.events;
+		var events = [];
+		for (var i = 0; i < cols.pk.length; i++) {
+			var proto = data.actors[cols.protagonist[i]] || ['', ''];
+			var deuter = data.actors[cols.deuteragonist[i]] || ['', ''];
+			var task = data.tasks[cols.task[i]];
+
+			var vars = {
+				protagonist : this._escape(proto[0]),
+				proto_self : proto[1],
+				deuteragonist : this._escape(deuter[0]),
+				deuter_self : deuter[1],
+				task_link : task ? '<a href="' + task[1] + '" target="_blank">#'
+				                   + this._escape(task[0]) + '</a>' : ''
+			};
+			var message = cols.message[i].replace(/{{\s*(\w+)\s*}}/g,
+				function (m, name) { return vars[name] || ''; });
+
+			events.push({
+				pk : cols.pk[i],
+				date : cols.date[i],
+				message : message,
+				task : task ? this._escape('#' + task[0] + ': ' + task[2]) : '',
+				comment : cols.comment[i],
+				children : cols.children[i]
+			});
+		}
+		return events;
+	},
+
 	_addHiddenEvent : function (e, prepend) {
 		var li = $('<li>').addClass('timeline-event').attr('data-id', e.pk)
 				  .attr('data-timestamp', e.date)
@@ -112,6 +171,10 @@ Timeline.prototype = {
 			li.append($('<p>').addClass('timeline-event-task').html(e.task));
 		if (e.comment != '')
 			li.append($('<p>').addClass('timeline-event-comment').html(e.comment));
+		if (e.children > 0)
+			li.append($('<p>').addClass('timeline-event-children')
+					  .append($('<a>').attr('href', '#')
+							  .text('Show ' + e.children + ' changes')));
 
 		li.hide();
 		if (prepend) {
@@ -131,6 +194,18 @@ Timeline.prototype = {
 		});
 	},
 
+	expandDigest : function (li) {
+		var url = this._options.eventChildrenUrl.replace('99', li.attr('data-id'));
+		var children = li.children('.timeline-event-children');
+		this._getJSON(url, function (events) {
+			var ul = $('<ul>');
+			$.each(events, function (i, e) {
+				ul.append($('<li>').html(e.message));
+			});
+			children.empty().append(ul);
+		});
+	},
+
 	fetchDown : function () {
 		if (this._fetchingDown)
 			return;
@@ -143,8 +218,8 @@ Timeline.prototype = {
 
 		var klass = this;
 		this._fetchingDown = true;
-		$.getJSON(url, function (data) {
-			$.each(data.events, function (i, e) {
+		this._getJSON(url, function (events, data) {
+			$.each(events, function (i, e) {
 				var li = klass._addHiddenEvent(e, false);
 				li.slideDown();
 			});
@@ -161,8 +236,8 @@ Timeline.prototype = {
 		var url = this._options.latestEventsUrl.replace('99', start_after);
 
 		var klass = this;
-		$.getJSON(url, function (data) {
-			$.each(data.events, function (i, e) {
+		this._getJSON(url, function (events, data) {
+			$.each(events, function (i, e) {
 				var li = klass._addHiddenEvent(e, true);
 				li.delay(i * 800).slideDown();
 
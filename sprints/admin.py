@@ -26,7 +26,8 @@ from django.db.models import Q
 from django.contrib import admin
 from django.forms.util import ErrorList
 from berserk2.bugtracker import BugTrackerFactory
-from berserk2.sprints.models import BugTracker, Sprint, Task, Milestone
+from berserk2.sprints.models import BugTracker, Sprint, Task, Milestone, \
+                                    SnapshotJob, SnapshotJobTask
 
 from django.utils.translation import ugettext as _
 
@@ -103,23 +104,83 @@ class SprintAdminForm(forms.ModelForm):
 
         return self.cleaned_data
 
+def _queue_snapshot_job(modeladmin, request, tasks, description):
+    job = SnapshotJob.objects.enqueue(tasks, description, request.user)
+    modeladmin.message_user(request,
+        _('%(count)d tasks will be snapshotted again in the background.  Follow their progress under snapshot job %(job)d.') \
+        % {'count': job.items.count(), 'job': job.pk})
+
+def resnapshot_tasks(modeladmin, request, queryset):
+    _queue_snapshot_job(modeladmin, request, queryset,
+                        _('%d selected tasks') % queryset.count())
+resnapshot_tasks.short_description = _('Snapshot selected tasks again')
+
+def resnapshot_sprint_tasks(modeladmin, request, queryset):
+    _queue_snapshot_job(modeladmin, request,
+                        Task.objects.filter(sprints__in=queryset),
+                        _('Tasks of sprints %s') \
+                        % ', '.join([str(s.pk) for s in queryset]))
+resnapshot_sprint_tasks.short_description = _('Snapshot the tasks of selected sprints again')
+
+def resnapshot_milestone_tasks(modeladmin, request, queryset):
+    _queue_snapshot_job(modeladmin, request,
+                        Task.objects.filter(sprints__milestone__in=queryset),
+                        _('Tasks of milestones %s') \
+                        % ', '.join([m.name for m in queryset]))
+resnapshot_milestone_tasks.short_description = _('Snapshot the tasks of selected milestones again')
+
 class SprintAdmin(admin.ModelAdmin):
     list_display = ('id', 'start_date', 'end_date', 'velocity')
     form = SprintAdminForm
+    actions = [resnapshot_sprint_tasks]
 
 class TaskAdmin(admin.ModelAdmin):
-    list_display = ('remote_tracker_id', 'bug_tracker')
+    list_display = ('remote_tracker_id', 'bug_tracker', 'title', 'status',
+                    'assigned_to', 'remaining_hours')
+    list_filter = ('status',)
     search_fields = (
-        'remote_tracker_id', 'tasksnapshot__title', 'tasksnapshot__status',
-        'tasksnapshot__assigned_to__first_name', 'tasksnapshot__assigned_to__last_name',
-        'tasksnapshot__submitted_by__first_name', 'tasksnapshot__submitted_by__last_name',
+        'remote_tracker_id', 'title', 'status',
+        'assigned_to__first_name', 'assigned_to__last_name',
     )
+    # Kept up to date from the task's snapshots
+    readonly_fields = ('latest_snapshot', 'title', 'status', 'assigned_to',
+                       'remaining_hours')
+    actions = [resnapshot_tasks]
 
 class MilestoneAdmin(admin.ModelAdmin):
     list_display = ('name', 'start_date', 'end_date')
     search_fields = ('name',)
+    actions = [resnapshot_milestone_tasks]
+
+class FailedSnapshotJobTaskInline(admin.TabularInline):
+    model = SnapshotJobTask
+    fields = ('task', 'error')
+    readonly_fields = ('task', 'error')
+    extra = 0
+    can_delete = False
+    verbose_name = _('failed task')
+    verbose_name_plural = _('failed tasks')
+
+    def queryset(self, request):
+        return super(FailedSnapshotJobTaskInline, self).queryset(request) \
+                   .filter(status='F').select_related('task')
+
+class SnapshotJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'description', 'created', 'created_by', 'progress',
+                    'finished')
+    fields = ('description', 'created_by', 'started', 'finished')
+    readonly_fields = ('description', 'created_by', 'started', 'finished')
+    inlines = [FailedSnapshotJobTaskInline]
+
+    def progress(self, job):
+        counts = job.get_progress()
+        return _('%(done)d of %(total)d done, %(failed)d failed') \
+               % {'done': counts['D'], 'failed': counts['F'],
+                  'total': sum(counts.values())}
+    progress.short_description = _('Progress')
 
 admin.site.register(BugTracker, BugTrackerAdmin)
 admin.site.register(Sprint, SprintAdmin)
 admin.site.register(Task, TaskAdmin)
 admin.site.register(Milestone, MilestoneAdmin)
+admin.site.register(SnapshotJob, SnapshotJobAdmin)
@@ -0,0 +1,82 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import numpy
+
+from berserk2.core.db import bulk_insert
+from berserk2.sprints.models import EstimationAccuracy, TaskSnapshot, \
+                                    TaskSnapshotCache
+
+def update_estimation_accuracy(sprint):
+    """
+    Replaces the EstimationAccuracy of sprint with figures computed from the
+    snapshots of the tasks closed in it, as of its last day, which are the
+    same snapshots the estimation accuracy email reports on.  The snapshots
+    are read in a single query, and each figure is computed over all of them
+    at once.
+    """
+    rows = list(TaskSnapshotCache.objects.filter(date=sprint.end_date,
+                                                 task_snapshot__task__sprints=sprint,
+                                                 task_snapshot__status__in=TaskSnapshot.CLOSED_STATUSES) \
+                                         .values_list('task_snapshot__assigned_to',
+                                                      'task_snapshot__component',
+                                                      'task_snapshot__estimated_hours',
+                                                      'task_snapshot__actual_hours'))
+
+    # Unassigned tasks are given the user id 0, which no user has
+    users = numpy.array([r[0] or 0 for r in rows], dtype=int)
+    components = numpy.array([r[1] for r in rows], dtype=object)
+    estimated = numpy.array([r[2] for r in rows], dtype=float)
+    actual = numpy.array([r[3] for r in rows], dtype=float)
+
+    # As in TaskSnapshot.percent_accuracy: the smaller of the estimated and
+    # actual hours over the larger, for tasks that had any hours reported.
+    reported = actual > 0
+    accuracy = numpy.minimum(estimated, actual)[reported] \
+               / numpy.maximum(estimated, actual)[reported] * 100
+
+    def measure(mask, **kwargs):
+        acc = accuracy[mask[reported]]
+        return EstimationAccuracy(sprint=sprint,
+                                  tasks=int(mask.sum()),
+                                  estimated_hours=int(estimated[mask].sum()),
+                                  actual_hours=int(actual[mask].sum()),
+                                  over_estimated=int((estimated[mask] > actual[mask]).sum()),
+                                  under_estimated=int((estimated[mask] < actual[mask]).sum()),
+                                  mean_accuracy=float(acc.mean()) if len(acc) else None,
+                                  median_accuracy=float(numpy.median(acc)) if len(acc) else None,
+                                  **kwargs)
+
+    figures = [measure(numpy.ones(len(rows), dtype=bool), dimension='S')]
+    for user_id in numpy.unique(users):
+        if user_id:
+            figures.append(measure(users == user_id, dimension='U',
+                                   user_id=int(user_id)))
+    for component in numpy.unique(components):
+        if component:
+            figures.append(measure(components == component, dimension='C',
+                                   component=component))
+
+    EstimationAccuracy.objects.filter(sprint=sprint).delete()
+    bulk_insert(figures)
+    return figures
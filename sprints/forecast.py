@@ -0,0 +1,120 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import numpy
+
+from datetime import date
+from django.db.models import Sum
+
+from berserk2.sprints.models import Sprint, TaskSnapshotCache, _workday_diff
+from berserk2.sprints.utils import date_range
+
+# The percentiles of the remaining hours the forecast gives for each day
+PERCENTILES = (10, 50, 90)
+
+def forecast_completion(sprint, simulations, history_sprints, seed=None):
+    """
+    Simulates the rest of sprint many times over, and returns, for each day
+    left in it, the probability that every task is done by that day and the
+    PERCENTILES of the hours left.
+
+    Each simulated day, everyone burns through their remaining hours at a
+    rate drawn at random from their past daily burn rates: those seen so
+    far in sprint and in the last history_sprints sprints before it.  People
+    without any use the team's, and with no history at all, the sprint's
+    velocity is used.  Nobody works on weekends.  Every simulation is run
+    at once, as arrays of shape (simulations, days left).
+
+    Returns None if nothing has been snapshotted in sprint yet.
+    """
+    remaining = _get_daily_remaining(sprint, min(sprint.end_date, date.today()))
+    if not remaining:
+        return None
+
+    burns = _get_burns(remaining)
+    for past in Sprint.objects.filter(end_date__lt=sprint.start_date) \
+                              .order_by('-end_date')[:history_sprints]:
+        for user_id, user_burns in _get_burns(_get_daily_remaining(past)).items():
+            burns.setdefault(user_id, []).extend(user_burns)
+    team_burns = sum(burns.values(), []) or [sprint.velocity]
+
+    last = max([max(series) for series in remaining.values()])
+    days = [(day, d) for day, d in date_range(sprint.start_date, sprint.end_date)
+            if d > last]
+    workdays = numpy.array([d.isoweekday() <= 5 for day, d in days], dtype=float)
+
+    random = numpy.random.RandomState(seed)
+    left = numpy.zeros((simulations, len(days)))
+    for user_id, series in remaining.items():
+        hours = series.get(last, 0)
+        if hours <= 0:
+            continue
+
+        rates = numpy.array(burns.get(user_id) or team_burns, dtype=float)
+        draws = rates[random.randint(len(rates), size=(simulations, len(days)))]
+        user_left = hours - numpy.cumsum(draws * workdays, axis=1)
+
+        # Once someone is done, they stay done
+        done = numpy.logical_or.accumulate(user_left <= 0, axis=1)
+        user_left[done] = 0
+        left += user_left
+
+    probability = (left <= 0).mean(axis=0)
+    percentiles = numpy.percentile(left, PERCENTILES, axis=0) if days else []
+
+    day_numbers = [day for day, d in days]
+    return {
+        'simulations': simulations,
+        'probability': zip(day_numbers, [float(p) for p in probability]),
+        'remaining': dict([('p%d' % p, zip(day_numbers, [float(h) for h in hours]))
+                           for p, hours in zip(PERCENTILES, percentiles)]),
+    }
+
+def _get_daily_remaining(sprint, until=None):
+    """
+    Returns a dict mapping each user id, or None for unassigned tasks, to a
+    dict of the hours left on their tasks in sprint each day, up to until.
+    """
+    rows = TaskSnapshotCache.objects.filter(task_snapshot__task__sprints=sprint,
+                                            date__gte=sprint.start_date,
+                                            date__lte=until or sprint.end_date) \
+                                    .values('date', 'task_snapshot__assigned_to') \
+                                    .annotate(Sum('task_snapshot__remaining_hours'))
+    remaining = {}
+    for row in rows:
+        remaining.setdefault(row['task_snapshot__assigned_to'], {})[row['date']] \
+            = row['task_snapshot__remaining_hours__sum'] or 0
+    return remaining
+
+def _get_burns(remaining):
+    """
+    Returns a dict mapping each user id to a list of the hours they burnt
+    through in remaining on each workday, from the workday before.
+    """
+    burns = {}
+    for user_id, series in remaining.items():
+        dates = sorted([d for d in series if d.isoweekday() <= 5])
+        for previous, d in zip(dates, dates[1:]):
+            if _workday_diff(previous, d) == 2:
+                burns.setdefault(user_id, []).append(series[previous] - series[d])
+    return burns
@@ -0,0 +1,130 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+import Queue
+import logging
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection
+
+from berserk2.sprints.models import SnapshotJobTask
+
+def run_snapshot_job(job, threads=None, batch_size=None):
+    """
+    Snapshots the pending tasks of a SnapshotJob again, batch_size (by
+    default, SNAPSHOT_JOB_BATCH_SIZE) at a time on each of threads (by
+    default, SNAPSHOT_JOB_THREADS) worker threads.  Each thread logs into a
+    bug tracker only once.  Each task is claimed before it is snapshotted,
+    so that a run that overlaps a slow one skips it, and how it went is
+    recorded as it finishes, so the job's progress can be followed in the
+    admin.  With one thread, the tasks are snapshotted on the calling
+    thread.
+
+    Returns the number of tasks snapshotted and the number that failed.
+    """
+    threads = threads or settings.SNAPSHOT_JOB_THREADS
+    batch_size = batch_size or settings.SNAPSHOT_JOB_BATCH_SIZE
+
+    if job.started is None:
+        job.started = datetime.now()
+        job.save()
+
+    pending = list(job.items.pending(datetime.now()).values_list('pk', flat=True))
+    batches = Queue.Queue()
+    for i in xrange(0, len(pending), batch_size):
+        batches.put(pending[i:i + batch_size])
+
+    results = {'D': 0, 'F': 0}
+    lock = threading.Lock()
+
+    if threads == 1:
+        _snapshot_batches(batches, results, lock)
+    else:
+        workers = []
+        for i in xrange(min(threads, batches.qsize())):
+            worker = threading.Thread(target=_run_worker,
+                                      args=(batches, results, lock))
+            worker.setDaemon(True)
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+
+    if not job.items.filter(status__in=('P', 'R')).exists():
+        job.finished = datetime.now()
+        job.save()
+    return results['D'], results['F']
+
+def _run_worker(batches, results, lock):
+    try:
+        _snapshot_batches(batches, results, lock)
+    finally:
+        # Django opens a connection per thread
+        connection.close()
+
+def _snapshot_batches(batches, results, lock):
+    clients = {}
+    while True:
+        try:
+            batch = batches.get_nowait()
+        except Queue.Empty:
+            return
+
+        now = datetime.now()
+        items = SnapshotJobTask.objects.pending(now) \
+                                       .filter(pk__in=batch) \
+                                       .select_related('task__bug_tracker')
+        for item in items:
+            if not SnapshotJobTask.objects.claim(item, now):
+                continue
+
+            status, error = _snapshot_task(item.task, clients)
+            SnapshotJobTask.objects.filter(pk=item.pk) \
+                                   .update(status=status, error=error)
+            lock.acquire()
+            try:
+                results[status] += 1
+            finally:
+                lock.release()
+
+def _snapshot_task(task, clients):
+    """
+    Snapshots a task using the thread's client for its bug tracker, logging
+    in first if need be.  Returns the status and error to record for it.
+    """
+    if task.bug_tracker_id not in clients:
+        clients[task.bug_tracker_id] = task.bug_tracker.get_client()
+
+    client = clients[task.bug_tracker_id]
+    if client is None:
+        return 'F', 'Could not log in to the bug tracker'
+
+    try:
+        task.snapshot(client)
+    except Exception, e:
+        logging.exception('Snapshotting task %d failed' % task.pk)
+        return 'F', unicode(e) or e.__class__.__name__
+    return 'D', ''
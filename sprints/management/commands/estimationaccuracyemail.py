@@ -24,20 +24,26 @@
 #
 
 from datetime import date, datetime, timedelta
+from optparse import make_option
 
 from berserk2.sprints.models import *
+from berserk2.core.mail import write_messages
+from berserk2.core.models import QueuedEmail
 
 from django.conf import settings
 from django.core.mail import EmailMessage
-from django.db.models import Count, Sum, Q
 from django.template import loader, Context
-from django.contrib.auth.models import User
-from django.core.management.base import NoArgsCommand
+from django.core.management.base import BaseCommand
 
-class Command(NoArgsCommand):
+class Command(BaseCommand):
     help = "Emails users at the end of the sprint with statistics about the accuracy of their estimates"
 
-    def handle_noargs(self, **options):
+    option_list = BaseCommand.option_list + (
+        make_option('--dry-run', dest='dry_run', metavar='DIR',
+                    help='Write the emails to files in DIR instead of sending them'),
+    )
+
+    def handle(self, *args, **options):
         def log(msg):
             print '[%s]: %s' % (datetime.now(), msg)
 
@@ -54,43 +60,52 @@ class Command(NoArgsCommand):
             log('   Not the day after the end of the sprint.  Exiting.')
             return
 
-        for user in User.objects.filter(email__isnull=False):
+        # Every task closed in the sprint, grouped by who it was assigned to
+        cached_snaps = TaskSnapshotCache.objects.filter(task_snapshot__task__sprints=sprint,
+                                                        task_snapshot__assigned_to__isnull=False,
+                                                        task_snapshot__status__in=TaskSnapshot.CLOSED_STATUSES,
+                                                        date=sprint.end_date) \
+                                                .select_related('task_snapshot__task',
+                                                                'task_snapshot__assigned_to') \
+                                                .order_by('task_snapshot__task')
+        completed = {}
+        for c in cached_snaps:
+            completed.setdefault(c.task_snapshot.assigned_to, []).append(c.task_snapshot)
+
+        subject_template = loader.get_template('email/estimation-accuracy-subject.txt')
+        body_template = loader.get_template('email/estimation-accuracy.txt')
+
+        messages = []
+        for user, snapshots in sorted(completed.items(), key=lambda i: i[0].username):
             log('   Examining user %s...' % user)
 
             if user.email == "":
                 log('   - User has no email address.  Aborting.')
                 continue
 
-            cached_snaps = TaskSnapshotCache.objects.filter(task_snapshot__task__sprints=sprint,
-                                                            task_snapshot__assigned_to=user,
-                                                            date=sprint.end_date) \
-                                                    .filter(Q(task_snapshot__status='RESOLVED') \
-                                                            | Q(task_snapshot__status='CLOSED') \
-                                                            | Q(task_snapshot__status='VERIFIED')) \
-                                                    .order_by('-date') \
-                                                    .select_related()
-            if cached_snaps.count() == 0:
-                log('   - User closed no bugs this iteration or was assigned no tasks.  Aborting.')
-                continue
-
-            t = loader.get_template('email/estimation-accuracy-subject.txt')
             c = Context({
                 'user': user, 'sprint': sprint,
-                'completed': [c.task_snapshot for c in cached_snaps]
+                'completed': snapshots,
             })
 
             # Make sure to strip out any trailing newlines as they will cause sendmail
             # to reject the email
-            subject = t.render(c).rstrip()
-
-            t = loader.get_template('email/estimation-accuracy.txt')
-            body = t.render(c)
-
-            print "About to send to %s" % user
-            print subject
-            print body
-            print
-
-            #email = EmailMessage (subject, body, settings.EMAIL_FROM,
-            #                      to=[user.email], bcc=["%s <%s>" % i for i in settings.MANAGERS])
-            #email.send(fail_silently=False)
+            subject = subject_template.render(c).rstrip()
+            body = body_template.render(c)
+
+            # Keyed so that running the command again doesn't send twice
+            messages.append(('estimation-accuracy-%d-%d' % (sprint.pk, user.pk),
+                             EmailMessage(subject, body, settings.EMAIL_FROM,
+                                          to=[user.email],
+                                          bcc=["%s <%s>" % i for i in settings.MANAGERS])))
+
+        if options['dry_run']:
+            write_messages([m for key, m in messages], options['dry_run'])
+            log('Wrote %d emails to %s' % (len(messages), options['dry_run']))
+        elif not settings.ESTIMATION_ACCURACY_EMAIL_ENABLED:
+            log('ESTIMATION_ACCURACY_EMAIL_ENABLED is off.  Not sending %d emails.' \
+                % len(messages))
+        else:
+            queued = [QueuedEmail.objects.enqueue(m, key) for key, m in messages]
+            log('Queued %d emails, %d already queued' \
+                % (queued.count(True), queued.count(False)))
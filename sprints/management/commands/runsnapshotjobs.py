@@ -0,0 +1,48 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+from datetime import datetime
+
+from django.db import transaction
+from django.core.management.base import NoArgsCommand
+
+from berserk2.sprints.models import SnapshotJob
+from berserk2.sprints.jobs import run_snapshot_job
+
+class Command(NoArgsCommand):
+    help = "Snapshots the tasks of the snapshot jobs queued from the admin"
+
+    def handle_noargs(self, **options):
+        def log(msg):
+            print '[%s]: %s' % (datetime.now(), msg)
+
+        # Run from a long lived process such as berserkd, the connection may
+        # still be in a transaction that started before the newest jobs were
+        # queued
+        transaction.commit_unless_managed()
+
+        for job in SnapshotJob.objects.unfinished():
+            log('Running snapshot job %d (%s)' % (job.pk, job))
+            done, failed = run_snapshot_job(job)
+            log('   %d tasks snapshotted, %d failed' % (done, failed))
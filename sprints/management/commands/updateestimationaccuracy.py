@@ -0,0 +1,59 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from datetime import date, datetime
+from optparse import make_option
+
+from django.db import transaction
+from django.core.management.base import BaseCommand
+
+from berserk2.sprints.models import EstimationAccuracy, Sprint
+from berserk2.sprints.analytics import update_estimation_accuracy
+
+class Command(BaseCommand):
+    help = "Computes the estimation accuracy of sprints that are over"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--all', action='store_true', dest='all', default=False,
+                    help='Recompute every past sprint, not only the ones not computed yet'),
+    )
+
+    def handle(self, *args, **options):
+        def log(msg):
+            print '[%s]: %s' % (datetime.now(), msg)
+
+        sprints = Sprint.objects.filter(end_date__lt=date.today()) \
+                                .order_by('end_date')
+        if not options['all']:
+            computed = EstimationAccuracy.objects.filter(dimension='S') \
+                                                 .values_list('sprint', flat=True)
+            sprints = sprints.exclude(pk__in=list(computed))
+
+        for sprint in sprints:
+            figures = self._update(sprint)
+            log('Sprint %d: %d closed tasks, mean accuracy %s' \
+                % (sprint.pk, figures[0].tasks, figures[0].mean_accuracy))
+
+    @transaction.commit_on_success
+    def _update(self, sprint):
+        return update_estimation_accuracy(sprint)
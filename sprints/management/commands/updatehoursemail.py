@@ -24,20 +24,28 @@
 #
 
 from datetime import date, datetime, timedelta
+from optparse import make_option
 
 from berserk2.sprints.models import *
+from berserk2.core.mail import write_messages
+from berserk2.core.models import QueuedEmail
 
 from django.conf import settings
 from django.core.mail import EmailMessage
-from django.db.models import Count, Sum, Q
+from django.db.models import Count, Sum
 from django.template import loader, Context
 from django.contrib.auth.models import User
-from django.core.management.base import NoArgsCommand
+from django.core.management.base import BaseCommand
 
-class Command(NoArgsCommand):
+class Command(BaseCommand):
     help = "Emails users who have not updated their remaining hours in UPDATE_HOURS_REMINDER_DAYS"
 
-    def handle_noargs(self, **options):
+    option_list = BaseCommand.option_list + (
+        make_option('--dry-run', dest='dry_run', metavar='DIR',
+                    help='Write the emails to files in DIR instead of sending them'),
+    )
+
+    def handle(self, *args, **options):
         def log(msg):
             print '[%s]: %s' % (datetime.now(), msg)
 
@@ -48,51 +56,70 @@ class Command(NoArgsCommand):
             log('   No active sprints found.  Exiting.')
             return
 
-        for user in User.objects.all():
-            log('   Examining user %s...' % user)
-
-            if user.email == "":
-                log('   - User has no email address.  Aborting.')
-                continue
-
-            if TaskSnapshot.objects.filter(task__sprints=sprint,
-                                           assigned_to=user) \
-                                   .exclude(Q(status='RESOLVED') | Q(status='CLOSED') \
-                                            | Q(status='VERIFIED')) \
-                                   .count() == 0:
-                log('   - User has no tasks assigned this sprint.')
-                continue
-
-            sprint_tasks = TaskSnapshotCache.objects.filter(task_snapshot__task__sprints=sprint,
-                                                            task_snapshot__assigned_to=user)
-
-            past_tasks = sprint_tasks.filter(date=date.today() - timedelta(settings.UPDATE_HOURS_REMINDER_DAYS))
-            todays_tasks = sprint_tasks.filter(date=date.today())
+        today = date.today()
+        past = today - timedelta(settings.UPDATE_HOURS_REMINDER_DAYS)
+
+        # The number of tasks each user had, and the hours left on them, today
+        # and UPDATE_HOURS_REMINDER_DAYS ago.  Users whose tasks and hours
+        # are the same on both days haven't updated their hours; that
+        # includes users with no snapshots on either day.
+        totals = {}
+        for row in TaskSnapshotCache.objects.filter(task_snapshot__task__sprints=sprint,
+                                                    task_snapshot__assigned_to__isnull=False,
+                                                    date__in=[past, today]) \
+                                            .values('task_snapshot__assigned_to', 'date') \
+                                            .annotate(tasks=Count('id'),
+                                                      hours=Sum('task_snapshot__remaining_hours')):
+            totals.setdefault(row['task_snapshot__assigned_to'], {})[row['date']] \
+                = (row['tasks'], row['hours'])
+
+        # Only users who still have open tasks are reminded
+        busy = set(Task.objects.filter(sprints=sprint, assigned_to__isnull=False) \
+                               .exclude(status__in=TaskSnapshot.CLOSED_STATUSES) \
+                               .values_list('assigned_to', flat=True))
+        stale = [user_id for user_id in busy
+                 if totals.get(user_id, {}).get(past) == totals.get(user_id, {}).get(today)]
+        users = User.objects.filter(pk__in=stale).exclude(email='') \
+                            .order_by('username')
+        log('   %d of %d users have not updated their hours!' \
+            % (len(users), len(busy)))
+
+        todays_tasks = {}
+        for c in TaskSnapshotCache.objects.filter(task_snapshot__task__sprints=sprint,
+                                                  task_snapshot__assigned_to__in=users,
+                                                  date=today) \
+                                          .select_related('task_snapshot__task__bug_tracker') \
+                                          .order_by('task_snapshot__task'):
+            todays_tasks.setdefault(c.task_snapshot.assigned_to_id, []).append(c)
+
+        subject_template = loader.get_template('email/update-hours-reminder-subject.txt')
+        body_template = loader.get_template('email/update-hours-reminder.txt')
+
+        messages = []
+        for user in users:
+            log('   - Reminding %s' % user)
 
-            if past_tasks.aggregate(Count('id')) != todays_tasks.aggregate(Count('id')):
-                log('   - User has a different number of tasks than in the past.')
-                continue
-
-            if past_tasks.aggregate(Sum('task_snapshot__remaining_hours')) != todays_tasks.aggregate(Sum('task_snapshot__remaining_hours')):
-                log('   - User has updated their hours in the last %s days.' % settings.UPDATE_HOURS_REMINDER_DAYS)
-                continue
-
-            log('   - User has not updated their hours!')
-
-            t = loader.get_template('email/update-hours-reminder-subject.txt')
             c = Context({
-                'date': date.today(), 'remind_days': settings.UPDATE_HOURS_REMINDER_DAYS,
+                'date': today, 'remind_days': settings.UPDATE_HOURS_REMINDER_DAYS,
                 'user': user, 'sprint': sprint,
-                'task_snapshot_cache': todays_tasks
+                'task_snapshot_cache': todays_tasks.get(user.pk, [])
             })
 
             # Make sure to strip out any trailing newlines as they will cause sendmail
             # to reject the email
-            subject = t.render(c).rstrip()
-
-            t = loader.get_template('email/update-hours-reminder.txt')
-            body = t.render(c)
-
-            email = EmailMessage (subject, body, settings.EMAIL_FROM,
-                                  to=[user.email], bcc=["%s <%s>" % i for i in settings.MANAGERS])
-            email.send(fail_silently=False)
+            subject = subject_template.render(c).rstrip()
+            body = body_template.render(c)
+
+            # Keyed so that running the command again doesn't send twice
+            messages.append(('update-hours-%s-%d' % (today.isoformat(), user.pk),
+                             EmailMessage(subject, body, settings.EMAIL_FROM,
+                                          to=[user.email],
+                                          bcc=["%s <%s>" % i for i in settings.MANAGERS])))
+
+        if options['dry_run']:
+            write_messages([m for key, m in messages], options['dry_run'])
+            log('Wrote %d emails to %s' % (len(messages), options['dry_run']))
+        else:
+            queued = [QueuedEmail.objects.enqueue(m, key) for key, m in messages]
+            log('Queued %d emails, %d already queued' \
+                % (queued.count(True), queued.count(False)))
@@ -1,5 +1,9 @@
-from datetime import date
+from datetime import date, timedelta
+from django.conf import settings
 from django.db import connection, backend, models
+from django.db.models import Q
+
+from berserk2.core.db import bulk_insert
 
 class SprintManager(models.Manager):
     def current(self):
@@ -14,3 +18,95 @@ class SprintManager(models.Manager):
             return sprint[0]
         else:
             return None
+
+class TaskManager(models.Manager):
+    def update_latest_snapshot(self, snapshot):
+        """
+        Points the snapshot's task at it, and copies the fields shown in lists
+        of tasks onto the task, unless the task already points at a newer
+        snapshot.  Snapshots are only ever added, so the latest one has the
+        largest id.  Returns whether the task was updated.
+        """
+        return self.filter(Q(latest_snapshot__isnull=True)
+                           | Q(latest_snapshot__lt=snapshot.pk),
+                           pk=snapshot.task_id) \
+                   .update(latest_snapshot=snapshot, title=snapshot.title,
+                           status=snapshot.status,
+                           assigned_to=snapshot.assigned_to_id,
+                           remaining_hours=snapshot.remaining_hours) == 1
+
+    def refresh_latest_snapshots(self):
+        """
+        Points every task at its latest snapshot, for tasks created before
+        the pointer was kept, or whose snapshots were inserted in bulk.
+        Returns the number of tasks updated.
+        """
+        snapshot_model = self.model._meta.get_field('latest_snapshot').rel.to
+        qn = connection.ops.quote_name
+        table = qn(snapshot_model._meta.db_table)
+        latest = snapshot_model.objects.extra(where=[
+            '%s.%s = (SELECT MAX(latest.%s) FROM %s latest WHERE latest.%s = %s.%s)' \
+            % (table, qn('id'), qn('id'), table, qn('task_id'), table, qn('task_id'))
+        ])
+
+        updated = 0
+        for snapshot in latest.iterator():
+            if self.update_latest_snapshot(snapshot):
+                updated += 1
+        return updated
+
+class TaskSnapshotManager(models.Manager):
+    def latest_per_task(self):
+        """
+        Returns a queryset of the latest snapshot of each task, which can be
+        filtered further like any other.  The latest snapshot is found by
+        joining on the pointer each task keeps to it, rather than by a query
+        per task.
+        """
+        return self.filter(latest_of__isnull=False)
+
+    def closed(self):
+        """
+        Returns a queryset of the latest snapshot of each task that shows it
+        in a resolved state.
+        """
+        return self.latest_per_task() \
+                   .filter(status__in=self.model.CLOSED_STATUSES)
+
+class SnapshotJobManager(models.Manager):
+    def enqueue(self, tasks, description, user=None):
+        """
+        Creates a job to snapshot each of the given tasks again, to be run in
+        the background by the runsnapshotjobs command.  Returns the job.
+        """
+        task_ids = list(tasks.values_list('pk', flat=True).distinct())
+        job = self.create(description=description, created_by=user)
+        bulk_insert([job.items.model(job=job, task_id=t) for t in task_ids])
+        return job
+
+    def unfinished(self):
+        """
+        Returns the jobs that still have tasks to snapshot, oldest first.
+        """
+        return self.filter(finished__isnull=True).order_by('created', 'id')
+
+class SnapshotJobTaskManager(models.Manager):
+    def pending(self, now):
+        """
+        Returns the tasks that are waiting to be snapshotted, along with those
+        a run claimed more than SNAPSHOT_JOB_CLAIM_SECONDS before now but
+        never finished, such as because it was killed.
+        """
+        stale = now - timedelta(seconds=settings.SNAPSHOT_JOB_CLAIM_SECONDS)
+        return self.filter(Q(status='P') | Q(status='R', claimed__lt=stale))
+
+    def claim(self, item, now):
+        """
+        Marks a pending task as being snapshotted, so that an overlapping run
+        doesn't snapshot it too.  Returns False if another run has already
+        claimed it.
+        """
+        claimed = self.filter(pk=item.pk, status=item.status,
+                              claimed=item.claimed) \
+                      .update(status='R', claimed=now)
+        return claimed == 1
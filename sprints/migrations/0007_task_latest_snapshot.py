@@ -0,0 +1,168 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding field 'Task.latest_snapshot'
+        db.add_column('sprints_task', 'latest_snapshot', self.gf('django.db.models.fields.related.ForeignKey')(blank=True, related_name='latest_of', null=True, to=orm['sprints.TaskSnapshot']), keep_default=False)
+
+        # Adding field 'Task.title'
+        db.add_column('sprints_task', 'title', self.gf('django.db.models.fields.CharField')(default='', max_length=128, blank=True), keep_default=False)
+
+        # Adding field 'Task.status'
+        db.add_column('sprints_task', 'status', self.gf('django.db.models.fields.CharField')(default='', db_index=True, max_length=32, blank=True), keep_default=False)
+
+        # Adding field 'Task.assigned_to'
+        db.add_column('sprints_task', 'assigned_to', self.gf('django.db.models.fields.related.ForeignKey')(blank=True, related_name='assigned_tasks', null=True, to=orm['auth.User']), keep_default=False)
+
+        # Adding field 'Task.remaining_hours'
+        db.add_column('sprints_task', 'remaining_hours', self.gf('django.db.models.fields.IntegerField')(null=True, blank=True), keep_default=False)
+
+
+    def backwards(self, orm):
+        
+        # Deleting field 'Task.latest_snapshot'
+        db.delete_column('sprints_task', 'latest_snapshot_id')
+
+        # Deleting field 'Task.title'
+        db.delete_column('sprints_task', 'title')
+
+        # Deleting field 'Task.status'
+        db.delete_column('sprints_task', 'status')
+
+        # Deleting field 'Task.assigned_to'
+        db.delete_column('sprints_task', 'assigned_to_id')
+
+        # Deleting field 'Task.remaining_hours'
+        db.delete_column('sprints_task', 'remaining_hours')
+
+
+    models = {
+        'auth.group': {
+            'Meta': {'object_name': 'Group'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'}),
+            'permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'})
+        },
+        'auth.permission': {
+            'Meta': {'ordering': "('content_type__app_label', 'content_type__model', 'codename')", 'unique_together': "(('content_type', 'codename'),)", 'object_name': 'Permission'},
+            'codename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'})
+        },
+        'auth.user': {
+            'Meta': {'object_name': 'User'},
+            'date_joined': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75', 'blank': 'True'}),
+            'first_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'groups': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['auth.Group']", 'symmetrical': 'False', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'last_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'user_permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'}),
+            'username': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '30'})
+        },
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        'sprints.bugtracker': {
+            'Meta': {'unique_together': "(('base_url', 'product', 'backend'),)", 'object_name': 'BugTracker'},
+            'backend': ('django.db.models.fields.CharField', [], {'max_length': '32', 'blank': 'True'}),
+            'base_url': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '32'}),
+            'product': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'username': ('django.db.models.fields.CharField', [], {'max_length': '32'})
+        },
+        'sprints.estimationaccuracy': {
+            'Meta': {'unique_together': "(('dimension', 'user', 'component', 'sprint'),)", 'object_name': 'EstimationAccuracy'},
+            'actual_hours': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'component': ('django.db.models.fields.CharField', [], {'max_length': '128', 'blank': 'True'}),
+            'computed': ('django.db.models.fields.DateTimeField', [], {'auto_now': 'True', 'blank': 'True'}),
+            'dimension': ('django.db.models.fields.CharField', [], {'max_length': '1'}),
+            'estimated_hours': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'mean_accuracy': ('django.db.models.fields.FloatField', [], {'null': 'True', 'blank': 'True'}),
+            'median_accuracy': ('django.db.models.fields.FloatField', [], {'null': 'True', 'blank': 'True'}),
+            'over_estimated': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'sprint': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['sprints.Sprint']"}),
+            'tasks': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'under_estimated': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['auth.User']", 'null': 'True', 'blank': 'True'})
+        },
+        'sprints.milestone': {
+            'Meta': {'object_name': 'Milestone'},
+            'bug_tracker': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['sprints.BugTracker']"}),
+            'end_date': ('django.db.models.fields.DateField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'remote_tracker_name': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'start_date': ('django.db.models.fields.DateField', [], {})
+        },
+        'sprints.milestonestatisticscache': {
+            'Meta': {'unique_together': "(('date', 'milestone'),)", 'object_name': 'MilestoneStatisticsCache'},
+            'date': ('django.db.models.fields.DateField', [], {'auto_now_add': 'True', 'db_index': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'milestone': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['sprints.Milestone']"}),
+            'total_estimated_hours': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'total_open_tasks': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'total_remaining_hours': ('django.db.models.fields.IntegerField', [], {'default': '0'})
+        },
+        'sprints.sprint': {
+            'Meta': {'ordering': "['-end_date']", 'object_name': 'Sprint'},
+            'default_bug_tracker': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['sprints.BugTracker']", 'null': 'True'}),
+            'end_date': ('django.db.models.fields.DateField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'milestone': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['sprints.Milestone']", 'null': 'True', 'blank': 'True'}),
+            'start_date': ('django.db.models.fields.DateField', [], {}),
+            'velocity': ('django.db.models.fields.IntegerField', [], {'default': '6'})
+        },
+        'sprints.task': {
+            'Meta': {'unique_together': "(('remote_tracker_id', 'bug_tracker'),)", 'object_name': 'Task'},
+            'assigned_to': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'assigned_tasks'", 'null': 'True', 'to': "orm['auth.User']"}),
+            'bug_tracker': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['sprints.BugTracker']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'latest_snapshot': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'latest_of'", 'null': 'True', 'to': "orm['sprints.TaskSnapshot']"}),
+            'remaining_hours': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'remote_tracker_id': ('django.db.models.fields.CharField', [], {'max_length': '32'}),
+            'sprints': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['sprints.Sprint']", 'symmetrical': 'False', 'blank': 'True'}),
+            'status': ('django.db.models.fields.CharField', [], {'db_index': 'True', 'max_length': '32', 'blank': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '128', 'blank': 'True'})
+        },
+        'sprints.tasksnapshot': {
+            'Meta': {'object_name': 'TaskSnapshot'},
+            'actual_hours': ('django.db.models.fields.IntegerField', [], {}),
+            'assigned_to': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'assigned_to'", 'null': 'True', 'to': "orm['auth.User']"}),
+            'component': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'date': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'db_index': 'True', 'blank': 'True'}),
+            'estimated_hours': ('django.db.models.fields.IntegerField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'remaining_hours': ('django.db.models.fields.IntegerField', [], {}),
+            'status': ('django.db.models.fields.CharField', [], {'max_length': '32'}),
+            'submitted_by': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'submitted_by'", 'null': 'True', 'to': "orm['auth.User']"}),
+            'task': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['sprints.Task']"}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '128'})
+        },
+        'sprints.tasksnapshotcache': {
+            'Meta': {'unique_together': "(('date', 'task_snapshot'),)", 'object_name': 'TaskSnapshotCache'},
+            'date': ('django.db.models.fields.DateField', [], {'db_index': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'task_snapshot': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['sprints.TaskSnapshot']"})
+        }
+    }
+
+    complete_apps = ['sprints']
@@ -22,20 +22,79 @@
 #
 
 import logging
+import threading
 from time import *
 from datetime import datetime, date, timedelta
 
+from django.conf import settings
 from django.db import models
-from django.db.models import Sum
+from django.db.models import Count, Max, Sum
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.core.exceptions import ObjectDoesNotExist
 
 from django.utils.translation import ugettext as _
 
+from berserk2.core.metrics import TimedClient
 from berserk2.sprints.utils import date_range
 from berserk2.bugtracker import BugTrackerFactory
-from berserk2.sprints.managers import SprintManager
+from berserk2.sprints.managers import SprintManager, TaskManager, TaskSnapshotManager, \
+                                     SnapshotJobManager, SnapshotJobTaskManager
+
+# How old a TaskSnapshot may get before it is refreshed on demand
+SNAPSHOT_MAX_AGE = timedelta(hours=1)
+
+# Logged in bug tracker clients, kept per thread by long running processes.
+# See keep_clients().
+_client_cache = threading.local()
+
+def keep_clients(max_age):
+    """
+    Makes BugTracker.get_client() hand out the same logged in client on the
+    calling thread for up to max_age (a timedelta), rather than logging in
+    again every time.  Used by berserkd, whose job threads live for as long
+    as it runs.
+    """
+    _client_cache.max_age = max_age
+    _client_cache.clients = {}
+
+# Reference data that rarely changes, such as the current sprint, kept for the
+# life of the process.  See get_current_sprint() and get_bug_tracker().
+_reference_cache = {}
+
+def _get_reference(key, fetch):
+    """
+    Returns the value cached under key, calling fetch() for it instead if it
+    isn't cached, was cached on an earlier day, or is older than
+    REFERENCE_CACHE_SECONDS.  Saving or deleting the model a value comes
+    from drops it straight away in this process; the age limit bounds how
+    long other processes go on using it.
+    """
+    now = datetime.now()
+    entry = _reference_cache.get(key)
+    if entry is None or entry[1].date() != now.date() \
+       or now - entry[1] > timedelta(seconds=settings.REFERENCE_CACHE_SECONDS):
+        entry = (fetch(), now)
+        _reference_cache[key] = entry
+    return entry[0]
+
+def get_current_sprint():
+    """
+    Returns Sprint.objects.current(), looked up at most once a day, or
+    again once a Sprint is saved or the cached copy gets too old.  The
+    sprint is shared, so it must not be changed.
+    """
+    return _get_reference('current_sprint', Sprint.objects.current)
+
+def get_bug_tracker(pk):
+    """
+    Returns the BugTracker with the given primary key, which is only looked
+    up again once it is saved or the cached copy gets too old.  Raises
+    BugTracker.DoesNotExist if there isn't one.  The bug tracker is shared,
+    so it must not be changed.
+    """
+    return _get_reference(('bug_tracker', pk),
+                          lambda: BugTracker.objects.get(pk=pk))
 
 class BugTracker(models.Model):
     """
@@ -63,6 +122,33 @@ class BugTracker(models.Model):
         tracker = BugTrackerFactory.get_bug_tracker()
         return tracker.get_url_from_id(task.remote_tracker_id, self.base_url)
 
+    def get_client(self):
+        """
+        Returns a client for the bug tracker that has been logged in, or None
+        if the backend could not be found or authentication failed.
+        """
+        clients = getattr(_client_cache, 'clients', None)
+        key = (self.base_url, self.backend, self.username, self.password)
+        if clients is not None and key in clients:
+            client, logged_in = clients[key]
+            if datetime.now() - logged_in < _client_cache.max_age:
+                return client
+
+        tracker = BugTrackerFactory.get_bug_tracker()
+        try:
+            client = TimedClient(tracker(self.base_url, self.backend))
+        except AttributeError:
+            logging.error('Backend %s not found' % self.backend)
+            return None
+
+        if not client.login(self.username, self.password):
+            logging.error('Could not authenticate with bug tracker')
+            return None
+
+        if clients is not None:
+            clients[key] = (client, datetime.now())
+        return client
+
 class Milestone(models.Model):
     """
     A collection of Sprints with a start date, an end date and a name.
@@ -85,17 +171,8 @@ class Milestone(models.Model):
         Fetches the latest statistics about the milestone from the remote
         tracker.
         """
-        tracker = BugTrackerFactory.get_bug_tracker()
-        try:
-            client = tracker(self.bug_tracker.base_url,
-                             self.bug_tracker.backend)
-        except AttributeError:
-            logging.error('Backend %s not found' % self.bug_tracker.backend)
-            return None
-
-        if not client.login(self.bug_tracker.username,
-                            self.bug_tracker.password):
-            logging.error('Could not authenticate with bug tracker')
+        client = self.bug_tracker.get_client()
+        if client is None:
             return None
 
         stats = client.get_stats_for_milestone(self.bug_tracker.product,
@@ -236,6 +313,32 @@ class Sprint(models.Model):
             pass
         return None
 
+def _clear_current_sprint(sender, instance, **kwargs):
+    """
+    Called from Sprint's post_save and post_delete signals.
+
+    Drops the cached current sprint, which may no longer be current.
+    """
+    _reference_cache.pop('current_sprint', None)
+
+post_save.connect(_clear_current_sprint, sender=Sprint,
+                  dispatch_uid='berserk2.sprints.models.Sprint')
+post_delete.connect(_clear_current_sprint, sender=Sprint,
+                    dispatch_uid='berserk2.sprints.models.Sprint')
+
+def _clear_bug_tracker(sender, instance, **kwargs):
+    """
+    Called from BugTracker's post_save and post_delete signals.
+
+    Drops the cached copy of the bug tracker.
+    """
+    _reference_cache.pop(('bug_tracker', instance.pk), None)
+
+post_save.connect(_clear_bug_tracker, sender=BugTracker,
+                  dispatch_uid='berserk2.sprints.models.BugTracker')
+post_delete.connect(_clear_bug_tracker, sender=BugTracker,
+                    dispatch_uid='berserk2.sprints.models.BugTracker')
+
 class Task(models.Model):
     """
     A work task associated with zero or more sprints.
@@ -244,6 +347,18 @@ class Task(models.Model):
     sprints = models.ManyToManyField(Sprint, blank=True)
     bug_tracker = models.ForeignKey(BugTracker)
 
+    # The newest snapshot of the task, and a copy of the fields of it that
+    # are shown in lists of tasks, kept up to date as snapshots are created.
+    # Run the updatelatestsnapshots command to fill them in for old tasks.
+    latest_snapshot = models.ForeignKey('TaskSnapshot', related_name='latest_of',
+                                        null=True, blank=True)
+    title = models.CharField(max_length=128, blank=True)
+    status = models.CharField(max_length=32, blank=True, db_index=True)
+    assigned_to = models.ForeignKey(User, related_name='assigned_tasks',
+                                    null=True, blank=True)
+    remaining_hours = models.IntegerField(null=True, blank=True)
+    objects = TaskManager()
+
     class Meta:
         unique_together = (('remote_tracker_id', 'bug_tracker'),)
 
@@ -251,45 +366,40 @@ class Task(models.Model):
         return _("Issue #%s") % (self.remote_tracker_id)
 
     def get_absolute_url(self):
-        return self.bug_tracker.get_remote_task_url(self)
+        return get_bug_tracker(self.bug_tracker_id).get_remote_task_url(self)
 
     def get_latest_snapshot(self, refresh_if_old=False):
         """
         Returns the most recent snapshot of the Task.  If no snapshots found,
         returns None.
         """
-        try:
-            snap = TaskSnapshot.objects.filter(task=self).latest('date')
-            if refresh_if_old \
-               and (datetime.now() - snap.date) > timedelta(hours=1):
-                snap = self.snapshot()
-            return snap
-        except ObjectDoesNotExist:
+        snap = self.latest_snapshot
+        if snap is None:
             if refresh_if_old:
                 return self.snapshot()
             return None
 
-    def snapshot(self):
+        if refresh_if_old \
+           and (datetime.now() - snap.date) > SNAPSHOT_MAX_AGE:
+            snap = self.snapshot()
+        return snap
+
+    def snapshot(self, client=None):
         """
         Creates a new TaskSnapshot from the most recent bug tracke data. Returns
         the new snapshot if successful, None otherwise.
+
+        An already logged in client for the Task's bug tracker may be passed
+        in to avoid authenticating again.
         """
         def lookup_user(email):
             users = User.objects.filter(email=email)
             return users[0] if users.count() > 0 else None
 
-        tracker = BugTrackerFactory.get_bug_tracker()
-        try:
-            client = tracker(self.bug_tracker.base_url,
-                             self.bug_tracker.backend)
-        except AttributeError:
-            logging.error('Backend %s not found' % self.bug_tracker.backend)
-            return None
-
-        if not client.login(self.bug_tracker.username,
-                            self.bug_tracker.password):
-            logging.error('Could not authenticate with bug tracker')
-            return None
+        if client is None:
+            client = self.bug_tracker.get_client()
+            if client is None:
+                return None
 
         bug = client.get_bug(self.remote_tracker_id)
         return TaskSnapshot.objects.create(task=self, title=bug.summary,
@@ -301,6 +411,32 @@ class Task(models.Model):
                                            remaining_hours=int(bug.remaining_time))
 
 
+def refresh_stale_tasks(tasks):
+    """
+    Creates new snapshots for the tasks in the given list that have no
+    snapshot, or whose latest snapshot is older than SNAPSHOT_MAX_AGE.  Logs
+    into each bug tracker only once.  Returns the number of tasks refreshed.
+    """
+    if not tasks:
+        return 0
+
+    latest = dict(TaskSnapshot.objects.filter(task__in=tasks)
+                                      .values_list('task')
+                                      .annotate(Max('date')))
+    now = datetime.now()
+    stale = [t for t in tasks
+             if t.pk not in latest or now - latest[t.pk] > SNAPSHOT_MAX_AGE]
+
+    clients = {}
+    for task in stale:
+        if task.bug_tracker_id not in clients:
+            clients[task.bug_tracker_id] = task.bug_tracker.get_client()
+
+        client = clients[task.bug_tracker_id]
+        if client is not None:
+            task.snapshot(client)
+    return len(stale)
+
 def _create_task_snapshot(sender, instance, created, **kwargs):
     """
     Called from Task's post_save signal.
@@ -328,6 +464,10 @@ class TaskSnapshot(models.Model):
     estimated_hours = models.IntegerField()
     actual_hours = models.IntegerField()
     remaining_hours = models.IntegerField()
+    objects = TaskSnapshotManager()
+
+    # The statuses of a task in a resolved state
+    CLOSED_STATUSES = ('RESOLVED', 'CLOSED', 'VERIFIED')
 
     class Meta:
         get_latest_by = 'date'
@@ -352,9 +492,7 @@ class TaskSnapshot(models.Model):
         """
         Returns True if the snapshot shows the Task is in a resolved state.
         """
-        return (self.status == "RESOLVED" \
-                or self.status == "CLOSED" \
-                or self.status == "VERIFIED")
+        return self.status in self.CLOSED_STATUSES
 
     def percent_accuracy(self):
         """
@@ -401,6 +539,27 @@ def _update_task_snapshot_cache(sender, instance, created, **kwargs):
 post_save.connect(_update_task_snapshot_cache, sender=TaskSnapshot,
                   dispatch_uid='berserk2.sprints.models.TaskSnapshot')
 
+def _update_latest_snapshot(sender, instance, created, **kwargs):
+    """
+    Called from TaskSnapshot's post_save signal.
+
+    Points the snapshot's task at it, along with the copy of the task held
+    by the snapshot, if any.
+    """
+    if not created: return
+
+    if Task.objects.update_latest_snapshot(instance):
+        task = getattr(instance, '_task_cache', None)
+        if task is not None:
+            task.latest_snapshot = instance
+            task.title = instance.title
+            task.status = instance.status
+            task.assigned_to = instance.assigned_to
+            task.remaining_hours = instance.remaining_hours
+
+post_save.connect(_update_latest_snapshot, sender=TaskSnapshot,
+                  dispatch_uid='berserk2.sprints.models.TaskSnapshot.latest')
+
 class TaskSnapshotCache(models.Model):
     """
     A cache of the last TaskSnapshot of the day for a given Task.
@@ -414,6 +573,88 @@ class TaskSnapshotCache(models.Model):
     def __unicode__(self):
         return _("%s - #%d") % (self.date, self.task_snapshot.id)
 
+class EstimationAccuracy(models.Model):
+    """
+    How accurate the estimates of the tasks closed in a sprint were, as of
+    the last day of the sprint: for the whole sprint, and for each user and
+    each component.  Computed once a sprint is over by the
+    updateestimationaccuracy command, so that accuracy trends across every
+    sprint can be charted without reading any snapshots.
+    """
+    DIMENSION_CHOICES = (
+        ('S', u'Sprint'),
+        ('U', u'User'),
+        ('C', u'Component'),
+    )
+    sprint = models.ForeignKey(Sprint)
+    dimension = models.CharField(max_length=1, choices=DIMENSION_CHOICES)
+    user = models.ForeignKey(User, null=True, blank=True)
+    component = models.CharField(max_length=128, blank=True)
+    tasks = models.IntegerField(default=0)
+    estimated_hours = models.IntegerField(default=0)
+    actual_hours = models.IntegerField(default=0)
+    over_estimated = models.IntegerField(default=0)
+    under_estimated = models.IntegerField(default=0)
+    mean_accuracy = models.FloatField(null=True, blank=True)
+    median_accuracy = models.FloatField(null=True, blank=True)
+    computed = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = (('dimension', 'user', 'component', 'sprint'),)
+
+    def __unicode__(self):
+        return _("Estimation accuracy of %s in sprint %d") \
+               % (self.user or self.component or _('everyone'), self.sprint_id)
+
+class SnapshotJob(models.Model):
+    """
+    A batch of tasks to be snapshotted again in the background, such as after
+    an outage of their bug tracker.  Queued from the admin, and run by the
+    runsnapshotjobs command.
+    """
+    description = models.CharField(max_length=255)
+    created = models.DateTimeField(auto_now_add=True)
+    created_by = models.ForeignKey(User, null=True, blank=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    objects = SnapshotJobManager()
+
+    def __unicode__(self):
+        return self.description
+
+    def get_progress(self):
+        """
+        Returns the number of the job's tasks that are pending, running, done
+        and failed, as a dictionary keyed by status.
+        """
+        counts = dict([(status, 0) for status, name in SnapshotJobTask.STATUS_CHOICES])
+        for row in self.items.values('status').annotate(count=Count('id')):
+            counts[row['status']] = row['count']
+        return counts
+
+class SnapshotJobTask(models.Model):
+    """
+    A task in a SnapshotJob, and how snapshotting it went.
+    """
+    STATUS_CHOICES = (
+        ('P', u'Pending'),
+        ('R', u'Running'),
+        ('D', u'Done'),
+        ('F', u'Failed'),
+    )
+    job = models.ForeignKey(SnapshotJob, related_name='items')
+    task = models.ForeignKey(Task)
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default='P')
+    claimed = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    objects = SnapshotJobTaskManager()
+
+    class Meta:
+        unique_together = (('job', 'task'),)
+
+    def __unicode__(self):
+        return u'%s: %s' % (self.job, self.task)
+
 def _workday_diff(start, end):
     return len([d for dy, d in date_range(start, end) if d.isoweekday() <= 5])
 
@@ -5,7 +5,24 @@ unittest). These will both pass when you run "manage.py test".
 Replace these with more appropriate tests for your application.
 """
 
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core import mail
 from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+
+from berserk2.core.db import bulk_insert
+from berserk2.core.models import QueuedEmail
+from berserk2.sprints.models import BugTracker, EstimationAccuracy, SnapshotJob, \
+                                    SnapshotJobTask, Sprint, Task, TaskSnapshot, \
+                                    TaskSnapshotCache, get_bug_tracker, \
+                                    get_current_sprint
+from berserk2.sprints.jobs import run_snapshot_job
+from berserk2.sprints.testutils import create_task
+from berserk2.sprints.analytics import update_estimation_accuracy
+from berserk2.sprints.forecast import forecast_completion
 
 class SimpleTest(TestCase):
     def test_basic_addition(self):
@@ -14,6 +31,285 @@ class SimpleTest(TestCase):
         """
         self.failUnlessEqual(1 + 1, 2)
 
+class ReferenceCacheTest(TestCase):
+    def setUp(self):
+        self.tracker = BugTracker.objects.create(base_url='http://example.com',
+                                                 product='Berserk', username='',
+                                                 password='')
+        self.sprint = Sprint.objects.create(start_date=date.today() - timedelta(1),
+                                            end_date=date.today() + timedelta(12),
+                                            default_bug_tracker=self.tracker)
+
+    def test_current_sprint(self):
+        self.assertEqual(self.sprint, get_current_sprint())
+
+        # Changes that bypass save() aren't seen until the cache expires
+        Sprint.objects.filter(pk=self.sprint.pk).update(end_date=date.today() - timedelta(1))
+        self.assertEqual(self.sprint, get_current_sprint())
+
+        Sprint.objects.get(pk=self.sprint.pk).save()
+        self.assertEqual(None, get_current_sprint())
+
+    def test_bug_tracker(self):
+        tracker = get_bug_tracker(self.tracker.pk)
+        self.assertTrue(tracker is get_bug_tracker(self.tracker.pk))
+
+        self.tracker.base_url = 'http://bugs.example.com'
+        self.tracker.save()
+        self.assertEqual('http://bugs.example.com',
+                         get_bug_tracker(self.tracker.pk).base_url)
+
+class TaskSnapshotManagerTest(TestCase):
+    def setUp(self):
+        tracker = BugTracker.objects.create(base_url='http://example.com',
+                                            product='Berserk', username='',
+                                            password='')
+        self.tasks = []
+        for remote_id, statuses in (('1', ('NEW', 'RESOLVED')),
+                                    ('2', ('RESOLVED', 'REOPENED')),
+                                    ('3', ('NEW',))):
+            task = create_task(remote_id, tracker)
+            for status in statuses:
+                TaskSnapshot.objects.create(task=task, title=status,
+                                            component='', status=status,
+                                            estimated_hours=1, actual_hours=0,
+                                            remaining_hours=1)
+            self.tasks.append(task)
+
+    def test_latest_per_task(self):
+        snaps = TaskSnapshot.objects.latest_per_task().order_by('task')
+        self.assertEqual(['RESOLVED', 'REOPENED', 'NEW'],
+                         [s.status for s in snaps])
+        self.assertEqual([t.get_latest_snapshot() for t in self.tasks],
+                         list(snaps))
+
+    def test_closed(self):
+        self.assertEqual([self.tasks[0]],
+                         [s.task for s in TaskSnapshot.objects.closed()])
+
+    def test_task_keeps_latest_snapshot(self):
+        tasks = Task.objects.order_by('pk')
+        self.assertEqual(['RESOLVED', 'REOPENED', 'NEW'], [t.status for t in tasks])
+        self.assertEqual([t.latest_snapshot_id for t in self.tasks],
+                         [t.latest_snapshot_id for t in tasks])
+
+    def test_refresh_latest_snapshots(self):
+        # Snapshots inserted in bulk don't move the pointer until refreshed
+        snap = bulk_insert([TaskSnapshot(task=self.tasks[2], date=datetime.now(),
+                                         title='Done', component='',
+                                         status='CLOSED', estimated_hours=1,
+                                         actual_hours=1, remaining_hours=0)])[0]
+        self.assertEqual('NEW', Task.objects.get(pk=self.tasks[2].pk).status)
+
+        self.assertEqual(1, Task.objects.refresh_latest_snapshots())
+        task = Task.objects.get(pk=self.tasks[2].pk)
+        self.assertEqual((snap.pk, 'CLOSED', 0),
+                         (task.latest_snapshot_id, task.status, task.remaining_hours))
+
+class EstimationAccuracyTest(TestCase):
+    def setUp(self):
+        self.brad = User.objects.create_user('brad', 'brad@example.com')
+        self.chris = User.objects.create_user('chris', 'chris@example.com')
+
+        tracker = BugTracker.objects.create(base_url='http://example.com',
+                                            product='Berserk', username='',
+                                            password='')
+        self.sprint = Sprint.objects.create(start_date=date.today() - timedelta(13),
+                                            end_date=date.today(),
+                                            default_bug_tracker=tracker)
+        for remote_id, user, component, status, estimated, actual in (
+                ('1', self.brad, 'UI', 'RESOLVED', 4, 2),
+                ('2', self.brad, 'UI', 'CLOSED', 2, 2),
+                ('3', self.chris, 'Core', 'VERIFIED', 1, 0),
+                ('4', self.chris, 'Core', 'NEW', 8, 1)):
+            task = create_task(remote_id, tracker)
+            task.sprints.add(self.sprint)
+            TaskSnapshot.objects.create(task=task, title=remote_id,
+                                        component=component,
+                                        assigned_to=user, status=status,
+                                        estimated_hours=estimated,
+                                        actual_hours=actual,
+                                        remaining_hours=0)
+
+    def test_update(self):
+        update_estimation_accuracy(self.sprint)
+
+        total = EstimationAccuracy.objects.get(sprint=self.sprint, dimension='S')
+        self.assertEqual(3, total.tasks)
+        self.assertEqual(7, total.estimated_hours)
+        self.assertEqual(4, total.actual_hours)
+        self.assertEqual(2, total.over_estimated)
+        self.assertEqual(0, total.under_estimated)
+        self.assertEqual(75.0, total.mean_accuracy)
+        self.assertEqual(75.0, total.median_accuracy)
+
+        brad = EstimationAccuracy.objects.get(dimension='U', user=self.brad)
+        self.assertEqual(2, brad.tasks)
+        self.assertEqual(75.0, brad.mean_accuracy)
+
+        chris = EstimationAccuracy.objects.get(dimension='U', user=self.chris)
+        self.assertEqual(1, chris.tasks)
+        self.assertEqual(None, chris.mean_accuracy)
+
+        self.assertEqual([(u'Core', 1), (u'UI', 2)],
+                         list(EstimationAccuracy.objects.filter(dimension='C') \
+                                                        .order_by('component') \
+                                                        .values_list('component', 'tasks')))
+
+    def test_update_replaces(self):
+        update_estimation_accuracy(self.sprint)
+        update_estimation_accuracy(self.sprint)
+        self.assertEqual(5, EstimationAccuracy.objects.filter(sprint=self.sprint).count())
+
+class ForecastTest(TestCase):
+    def setUp(self):
+        brad = User.objects.create_user('brad', 'brad@example.com')
+        tracker = BugTracker.objects.create(base_url='http://example.com',
+                                            product='Berserk', username='',
+                                            password='')
+        self.sprint = Sprint.objects.create(start_date=date.today() - timedelta(6),
+                                            end_date=date.today() + timedelta(14),
+                                            velocity=6, default_bug_tracker=tracker)
+        task = create_task('1', tracker)
+        task.sprints.add(self.sprint)
+        TaskSnapshot.objects.create(task=task, title='1', component='',
+                                    assigned_to=brad, status='NEW',
+                                    estimated_hours=12, actual_hours=0,
+                                    remaining_hours=12)
+
+    def test_without_history(self):
+        # With nothing else to go on, work is done at the sprint's velocity
+        forecast = forecast_completion(self.sprint, 100, 6, seed=1)
+        days = [day for day, p in forecast['probability']]
+        self.assertEqual(range(7, 21), days)
+        self.assertEqual(1.0, forecast['probability'][-1][1])
+        self.assertEqual(0.0, forecast['remaining']['p90'][-1][1])
+
+    def test_nothing_snapshotted(self):
+        TaskSnapshot.objects.all().delete()
+        self.assertEqual(None, forecast_completion(self.sprint, 100, 6))
+
+class UpdateHoursEmailTest(TestCase):
+    def setUp(self):
+        tracker = BugTracker.objects.create(base_url='http://example.com',
+                                            product='Berserk', username='',
+                                            password='')
+        sprint = Sprint.objects.create(start_date=date.today() - timedelta(6),
+                                       end_date=date.today() + timedelta(7),
+                                       default_bug_tracker=tracker)
+        self.tracker, self.sprint = tracker, sprint
+        past = date.today() - timedelta(settings.UPDATE_HOURS_REMINDER_DAYS)
+
+        def snapshot(task, user, remaining_hours, status='NEW'):
+            return TaskSnapshot.objects.create(task=task, title=task.remote_tracker_id,
+                                               component='', assigned_to=user,
+                                               status=status, estimated_hours=8,
+                                               actual_hours=0,
+                                               remaining_hours=remaining_hours)
+
+        # brad hasn't touched his task, chris has, and pj's is done
+        for remote_id, username, hours in (('1', 'brad', (5, 5)),
+                                           ('2', 'chris', (8, 6)),
+                                           ('3', 'pj', (0, 0))):
+            user = User.objects.create_user(username, '%s@example.com' % username)
+            task = create_task(remote_id, tracker)
+            task.sprints.add(sprint)
+
+            status = 'RESOLVED' if username == 'pj' else 'NEW'
+            TaskSnapshotCache.objects.create(date=past,
+                                             task_snapshot=snapshot(task, user, hours[0], status))
+            snapshot(task, user, hours[1], status)
+
+    def test_reminds_stale_users(self):
+        call_command('updatehoursemail')
+        self.assertEqual([], mail.outbox)
+
+        # Running again the same day doesn't queue a second reminder
+        call_command('updatehoursemail')
+        self.assertEqual(1, QueuedEmail.objects.count())
+
+        call_command('sendqueuedemail')
+        self.assertEqual([['brad@example.com']], [m.to for m in mail.outbox])
+        self.assertTrue('#1: 1' in mail.outbox[0].body)
+
+    def test_reminds_users_without_snapshots_on_either_day(self):
+        # No history on either day counts as not having updated
+        user = User.objects.create_user('mike', 'mike@example.com')
+        task = create_task('4', self.tracker)
+        task.sprints.add(self.sprint)
+        TaskSnapshot.objects.create(task=task, title='4', component='',
+                                    assigned_to=user, status='NEW',
+                                    estimated_hours=8, actual_hours=0,
+                                    remaining_hours=8)
+        TaskSnapshotCache.objects.filter(task_snapshot__task=task).delete()
+
+        call_command('updatehoursemail')
+        call_command('sendqueuedemail')
+        self.assertEqual([['brad@example.com'], ['mike@example.com']],
+                         sorted([m.to for m in mail.outbox]))
+
+class _FakeBug:
+    summary, component, status = 'Fixed title', 'UI', 'NEW'
+    submitted_by, assigned_to = '', ''
+    estimated_time, actual_time, remaining_time = 4, 1, 3
+
+class _FakeClient:
+    def get_bug(self, remote_tracker_id):
+        if remote_tracker_id == '2':
+            raise IOError('Connection refused')
+        return _FakeBug()
+
+class SnapshotJobTest(TestCase):
+    def setUp(self):
+        tracker = BugTracker.objects.create(base_url='http://example.com',
+                                            product='Berserk', username='',
+                                            password='')
+        self.sprint = Sprint.objects.create(start_date=date.today(),
+                                            end_date=date.today() + timedelta(13),
+                                            default_bug_tracker=tracker)
+        for remote_id in ('1', '2', '3'):
+            create_task(remote_id, tracker).sprints.add(self.sprint)
+        create_task('4', tracker)
+
+        self.get_client = BugTracker.get_client
+        BugTracker.get_client = lambda tracker: _FakeClient()
+
+    def tearDown(self):
+        BugTracker.get_client = self.get_client
+
+    def test_run_snapshot_job(self):
+        tasks = Task.objects.filter(sprints=self.sprint)
+        job = SnapshotJob.objects.enqueue(tasks, 'Sprint tasks')
+        self.assertEqual({'P': 3, 'R': 0, 'D': 0, 'F': 0}, job.get_progress())
+
+        self.assertEqual((2, 1), run_snapshot_job(job, threads=1, batch_size=2))
+        self.assertEqual({'P': 0, 'R': 0, 'D': 2, 'F': 1}, job.get_progress())
+        self.assertEqual(['Connection refused'],
+                         [i.error for i in job.items.filter(status='F')])
+        self.assertEqual(['Fixed title', 'Fixed title'],
+                         [t.title for t in tasks.exclude(remote_tracker_id='2')])
+
+        job = SnapshotJob.objects.get(pk=job.pk)
+        self.assertTrue(job.finished is not None)
+        self.assertEqual([], list(SnapshotJob.objects.unfinished()))
+
+    def test_claimed_tasks_are_skipped_until_stale(self):
+        tasks = Task.objects.filter(sprints=self.sprint) \
+                            .exclude(remote_tracker_id='2')
+        job = SnapshotJob.objects.enqueue(tasks, 'Sprint tasks')
+        running, stale = job.items.order_by('task__remote_tracker_id')
+        timeout = timedelta(seconds=settings.SNAPSHOT_JOB_CLAIM_SECONDS)
+        SnapshotJobTask.objects.filter(pk=running.pk) \
+                               .update(status='R', claimed=datetime.now())
+        SnapshotJobTask.objects.filter(pk=stale.pk) \
+                               .update(status='R',
+                                       claimed=datetime.now() - timeout * 2)
+
+        self.assertEqual((1, 0), run_snapshot_job(job, threads=1))
+        self.assertEqual({'P': 0, 'R': 1, 'D': 1, 'F': 0}, job.get_progress())
+        self.assertEqual('D', SnapshotJobTask.objects.get(pk=stale.pk).status)
+        self.assertTrue(SnapshotJob.objects.get(pk=job.pk).finished is None)
+
 __test__ = {"doctest": """
 Another way to test that 1 + 1 is equal to 2.
 
@@ -34,10 +34,12 @@ urlpatterns = patterns('berserk2.sprints.views',
     url(r'^(?P<sprint_id>\d+)/tasks/json/$', 'sprint_tasks_json'),
     url(r'^(?P<sprint_id>\d+)/my_tasks/json/$', 'sprint_my_tasks_json'),
     url(r'^(?P<sprint_id>\d+)/burndown/json/$', 'sprint_burndown_json'),
+    url(r'^(?P<sprint_id>\d+)/forecast/json/$', 'sprint_forecast_json'),
     url(r'^(?P<sprint_id>\d+)/new/json/$', 'sprint_new_json'),
     url(r'^(?P<sprint_id>\d+)/delete_task/json/$', 'sprint_delete_task_json'),
     url(r'^(?P<sprint_id>\d+)/statistics/partial/$', 'sprint_statistics_partial'),
     url(r'^(?P<sprint_id>\d+)/milestone-graph/json/$', 'sprint_milestone_graph_json'),
+    url(r'^estimation-accuracy/json/$', 'sprint_estimation_accuracy_json'),
 )
 
 def reverse_full_url(name, args=(), kwargs={}):
@@ -24,19 +24,22 @@
 import simplejson
 
 from time import mktime
-from datetime import timedelta
+from datetime import date, timedelta
 
 from django.db import transaction
+from django.core.cache import cache
 from django.core import serializers
 from django.db import IntegrityError
-from django.db.models import Count, Sum, Q
+from django.db.models import Count, Max, Sum, Q
 from django.template import RequestContext
 from django.core.urlresolvers import reverse
 from django.utils.translation import ugettext as _
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render_to_response, get_object_or_404
-from django.http import HttpResponse, HttpResponseRedirect, Http404
+from django.http import HttpResponse, HttpResponseBadRequest, \
+                        HttpResponseRedirect, Http404
 
 from berserk2 import settings
 from berserk2.sprints.models import *
@@ -46,7 +49,7 @@ from berserk2.sprints.urls import reverse_full_url
 from berserk2.sprints.models import _workday_diff, _calc_load
 
 def sprint_index(request):
-    sprint = Sprint.objects.current()
+    sprint = get_current_sprint()
     if sprint == None:
         try:
             sprint = Sprint.objects.latest()
@@ -91,7 +94,7 @@ def sprint_current_bookmarklet(request):
         return HttpResponseRedirect(reverse('sprint_edit',
                                             kwargs={'sprint_id': sprint.id}))
 
-    sprint = Sprint.objects.current()
+    sprint = get_current_sprint()
     if sprint == None or request.method != 'GET':
         return HttpResponseRedirect(reverse('sprint_index'))
 
@@ -99,14 +102,14 @@ def sprint_current_bookmarklet(request):
     if not tracker:
         return redirect(error=_('Your bug tracker has not been set up yet.'))
 
-    base_url = sprint.default_bug_tracker.base_url
+    default_bug_tracker = get_bug_tracker(sprint.default_bug_tracker_id)
     remote_tracker_id = tracker.get_id_from_url(urllib.unquote(request.GET['url']),
-                                                base_url)
+                                                default_bug_tracker.base_url)
 
     if not remote_tracker_id:
         return redirect(error=_('I don\'t recognize this type of URL.'))
 
-    result = _add_task(request, sprint, sprint.default_bug_tracker,
+    result = _add_task(request, sprint, default_bug_tracker,
                        remote_tracker_id)
     if 'error' in result:
         return redirect(error=result['error'])
@@ -138,13 +141,16 @@ def sprint_load_effort_json(request, sprint_id):
         'load': load_rows, 'effort': effort_rows,
     }))
 
+@gzip_page
 def sprint_tasks_json(request, sprint_id):
     """
     Returns a list of tasks and the effort values for each of the days in the
-    Sprint.
+    Sprint.  If the format parameter is 'compact', the tasks are sent column
+    by column without any markup, and each person, component and status is
+    sent once; see sprint_detail.js.
     """
     sprint = get_object_or_404(Sprint, pk=int(sprint_id))
-    iteration_days = [''] * (sprint.iteration_days() + 1)
+    iteration_days = sprint.iteration_days() + 1
 
     # This code is finely tuned to reduce the number of queries.  Please test
     # performance numbers before modifying
@@ -153,28 +159,67 @@ def sprint_tasks_json(request, sprint_id):
                                       .filter(date__gte=sprint.start_date,
                                               date__lt=sprint.end_date + timedelta(1)) \
                                       .order_by('task_snapshot__task', '-date')
-    tasks_data = []
-    task_data = latest_snap = None
+    rows = []
+    remaining = latest_snap = None
     for csnap in csnaps:
         s = csnap.task_snapshot
-        if latest_snap == None or s.task != latest_snap.task:
-            task_data = [
-                '<a href="%s" target="_blank">#%s</a>' % (s.task.get_absolute_url(), s.task.remote_tracker_id),
-                s.title, s.component, s.get_assigned_to_display(), s.get_submitted_by_display(),
-                s.status, s.estimated_hours
-            ]
-            task_data.extend(iteration_days)
-            tasks_data.append(task_data)
-
-        task_data[(csnap.date - sprint.start_date).days + 7] = s.remaining_hours
+        if latest_snap == None or s.task_id != latest_snap.task_id:
+            remaining = [''] * iteration_days
+            rows.append((s, remaining))
+
+        remaining[(csnap.date - sprint.start_date).days] = s.remaining_hours
         latest_snap = s
 
-    for task in tasks_data:
-        task[1] = task[1] + '&nbsp;<span class="sparkline invisible">%s</span>' % \
-            ','.join([str(i) for i in task[6:] if i != ''])
+    if request.GET.get('format') == 'compact':
+        return HttpResponse(simplejson.dumps(_compact_tasks(rows)))
+
+    tasks_data = []
+    for s, remaining in rows:
+        task_data = [
+            '<a href="%s" target="_blank">#%s</a>' % (s.task.get_absolute_url(), s.task.remote_tracker_id),
+            s.title, s.component, s.get_assigned_to_display(), s.get_submitted_by_display(),
+            s.status, s.estimated_hours
+        ]
+        task_data.extend(remaining)
+        task_data[1] = task_data[1] + '&nbsp;<span class="sparkline invisible">%s</span>' % \
+            ','.join([str(i) for i in task_data[6:] if i != ''])
+        tasks_data.append(task_data)
 
     return HttpResponse(simplejson.dumps(tasks_data))
 
+def _compact_tasks(rows):
+    people = {}
+    components = {}
+    statuses = {}
+    def lookup(table, value):
+        if value not in table:
+            table[value] = len(table)
+        return table[value]
+
+    columns = dict([(c, []) for c in ('id', 'url', 'title', 'component',
+                                      'assigned_to', 'submitted_by', 'status',
+                                      'estimated_hours', 'remaining')])
+    for s, remaining in rows:
+        columns['id'].append(s.task.remote_tracker_id)
+        columns['url'].append(s.task.get_absolute_url())
+        columns['title'].append(s.title)
+        columns['component'].append(lookup(components, s.component))
+        columns['assigned_to'].append(lookup(people, s.get_assigned_to_display()))
+        columns['submitted_by'].append(lookup(people, s.get_submitted_by_display()))
+        columns['status'].append(lookup(statuses, s.status))
+        columns['estimated_hours'].append(s.estimated_hours)
+        columns['remaining'].append([r if r != '' else None for r in remaining])
+
+    def by_index(table):
+        return [v for i, v in sorted([(i, v) for v, i in table.items()])]
+
+    return {
+        'tasks': columns,
+        'people': by_index(people),
+        'components': by_index(components),
+        'statuses': by_index(statuses),
+    }
+
 def sprint_my_tasks_json(request, sprint_id):
     if not request.user.is_authenticated():
         return HttpResponse(simplejson.dumps([]))
@@ -239,18 +284,39 @@ def sprint_burndown_json(request, sprint_id):
         'weekends': weekends,
     }))
 
+def sprint_forecast_json(request, sprint_id):
+    """
+    Returns, for each day left in the sprint, the probability that every
+    task will be done by then and the range of hours likely to be left, as
+    points in the same form as the burndown's.
+
+    The forecast is cached until a task is snapshotted or added to the
+    sprint, or the day changes.  Without numpy, there is no forecast.
+    """
+    try:
+        from berserk2.sprints.forecast import forecast_completion
+    except ImportError:
+        return HttpResponse(simplejson.dumps({}))
+
+    sprint = get_object_or_404(Sprint, pk=int(sprint_id))
+
+    version = '%s-%s-%s' % (TaskSnapshotCache.objects.aggregate(Max('id'))['id__max'],
+                            sprint.task_set.count(), date.today().toordinal())
+    key = 'sprint-forecast-%d-%s' % (sprint.pk, version)
+    data = cache.get(key)
+    if data is None:
+        forecast = forecast_completion(sprint, settings.SPRINT_FORECAST_SIMULATIONS,
+                                       settings.SPRINT_FORECAST_HISTORY_SPRINTS,
+                                       seed=abs(hash(key)) % (2 ** 32))
+        data = simplejson.dumps(forecast or {})
+        cache.set(key, data, settings.SPRINT_FORECAST_CACHE_SECONDS)
+    return HttpResponse(data)
+
 def sprint_milestone_graph_json(request, sprint_id):
     """
     Returns a list of points with the date as the X axis and the number of
     remaining hours as the Y axis.
     """
-    def jstime(date):
-        """
-        Similar to Unix time, Javascript time is the number of *milli*seconds
-        since the epoch.
-        """
-        return mktime(date.timetuple()) * 1000
-
     sprint = get_object_or_404(Sprint, pk=int(sprint_id))
     milestone = sprint.milestone
 
@@ -260,12 +326,59 @@ def sprint_milestone_graph_json(request, sprint_id):
     stats = MilestoneStatisticsCache.objects.filter(milestone=milestone) \
                                             .order_by('date')
     return HttpResponse(simplejson.dumps({
-        'remaining_hours': [(jstime(s.date), s.total_remaining_hours) for s in stats],
-        'open_tasks': [(jstime(s.date), s.total_open_tasks) for s in stats],
-        'start_date': jstime(milestone.start_date),
-        'end_date': jstime(milestone.end_date),
-        'sprint_start_date': jstime(sprint.start_date),
-        'sprint_end_date': jstime(sprint.end_date),
+        'remaining_hours': [(_jstime(s.date), s.total_remaining_hours) for s in stats],
+        'open_tasks': [(_jstime(s.date), s.total_open_tasks) for s in stats],
+        'start_date': _jstime(milestone.start_date),
+        'end_date': _jstime(milestone.end_date),
+        'sprint_start_date': _jstime(sprint.start_date),
+        'sprint_end_date': _jstime(sprint.end_date),
+    }))
+
+@gzip_page
+def sprint_estimation_accuracy_json(request):
+    """
+    Returns the estimation accuracy of every sprint that is over, oldest
+    first, for trend charts.  The by parameter (sprint, user or component)
+    picks whether there is a single series for the team or one for each user
+    or component; the user and component parameters narrow it down to one.
+    """
+    dimensions = {'sprint': 'S', 'user': 'U', 'component': 'C'}
+    by = request.GET.get('by', 'sprint')
+    if by not in dimensions:
+        return HttpResponseBadRequest()
+
+    figures = EstimationAccuracy.objects.filter(dimension=dimensions[by]) \
+                                        .select_related('sprint', 'user') \
+                                        .order_by('sprint__end_date')
+    if 'user' in request.GET:
+        try:
+            figures = figures.filter(user=int(request.GET['user']))
+        except ValueError:
+            return HttpResponseBadRequest()
+    if 'component' in request.GET:
+        figures = figures.filter(component=request.GET['component'])
+
+    series = {}
+    for f in figures:
+        if f.user_id:
+            label = f.user.first_name or f.user.username
+        else:
+            label = f.component or _('Everyone')
+        series.setdefault((f.user_id, f.component), {
+            'label': label, 'user': f.user_id, 'component': f.component,
+            'points': [],
+        })['points'].append({
+            'sprint': f.sprint_id, 'end_date': _jstime(f.sprint.end_date),
+            'tasks': f.tasks, 'estimated_hours': f.estimated_hours,
+            'actual_hours': f.actual_hours,
+            'over_estimated': f.over_estimated,
+            'under_estimated': f.under_estimated,
+            'mean_accuracy': f.mean_accuracy,
+            'median_accuracy': f.median_accuracy,
+        })
+
+    return HttpResponse(simplejson.dumps({
+        'series': sorted(series.values(), key=lambda s: s['label']),
     }))
 
 def sprint_statistics_partial(request, sprint_id,
@@ -329,6 +442,13 @@ def sprint_new_json(request, sprint_id):
 
     return HttpResponse(simplejson.dumps(result))
 
+def _jstime(date):
+    """
+    Similar to Unix time, Javascript time is the number of *milli*seconds
+    since the epoch.
+    """
+    return mktime(date.timetuple()) * 1000
+
 def _add_task(request, sprint, default_bug_tracker, remote_tracker_id):
     err, task = None, None
     try:
@@ -0,0 +1,46 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from datetime import datetime
+
+from django.db import transaction
+from django.core.management.base import NoArgsCommand
+
+from berserk2.sprints.models import Sprint
+from berserk2.timeline.models import Event
+
+class Command(NoArgsCommand):
+    help = "Points existing timeline events at the sprint they happened during"
+
+    def handle_noargs(self, **options):
+        def log(msg):
+            print '[%s]: %s' % (datetime.now(), msg)
+
+        for sprint in Sprint.objects.order_by('start_date'):
+            log('Assigning events from %s to %s' % (sprint.start_date,
+                                                    sprint.end_date))
+            self._assign(sprint)
+
+    @transaction.commit_on_success
+    def _assign(self, sprint):
+        Event.objects.assign_sprint(sprint)
@@ -21,7 +21,15 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
+from datetime import timedelta
+
 from django.db import models
+from django.db.models import Count, Q
+
+from berserk2.core.db import bulk_insert
+from berserk2.sprints.models import Sprint, Task
+from berserk2.timeline.search import tokenize, get_event_tokens
+from berserk2.timeline.signals import events_inserted
 
 class ActorManager(models.Manager):
     def get_or_create_by_full_name(self, full_name):
@@ -34,3 +42,375 @@ class ActorManager(models.Manager):
             return self.get_or_create(first_name=tokens[0], last_name=tokens[1])
         else:
             return self.get_or_create(first_name=tokens[0])
+
+class EventManager(models.Manager):
+    def bulk_insert(self, events, digest_window=None):
+        """
+        Inserts a list of new Events in as few statements as possible, then
+        sends events_inserted.  Returns the list of events, now with ids.
+
+        If digest_window (a timedelta) is given, bursts of events by the same
+        actor on the same task, each within digest_window of the last, are
+        grouped under a new digest Event, which is inserted and sent along
+        with them.
+        """
+        if not events:
+            return events
+
+        digests = []
+        if digest_window:
+            bursts = _find_bursts(events, digest_window)
+            digests = [self._make_digest(b) for b in bursts]
+
+        self._set_sprints(digests + events)
+
+        if digests:
+            bulk_insert(digests)
+
+            for digest, burst in zip(digests, bursts):
+                for e in burst:
+                    e.digest = digest
+
+        bulk_insert(events)
+        events_inserted.send(sender=self.model, events=digests + events)
+        return events
+
+    def assign_sprint(self, sprint, task_ids=None):
+        """
+        Points the events that happened during sprint, on tasks in the sprint,
+        at it.  If task_ids is given, only events on those tasks are updated.
+        """
+        tasks = Task.objects.filter(sprints=sprint)
+        if task_ids is not None:
+            tasks = tasks.filter(pk__in=task_ids)
+
+        self.filter(task__in=tasks, sprint__isnull=True,
+                    date__gte=sprint.start_date,
+                    date__lt=sprint.end_date + timedelta(1)) \
+            .update(sprint=sprint)
+
+    def get_facet_querysets(self, actor=None, task=None, source=None,
+                            sprint=None):
+        """
+        Returns querysets of the top level events matching the given facets.
+        Each can be read in date order along one of the (facet, date)
+        indexes.  An actor may be an event's protagonist or its
+        deuteragonist, which takes two querysets, one for each index.
+        """
+        qs = self.filter(digest__isnull=True) \
+                 .select_related('protagonist', 'deuteragonist', 'task')
+        if task is not None:
+            qs = qs.filter(task=task)
+        if source is not None:
+            qs = qs.filter(source=source)
+        if sprint is not None:
+            qs = qs.filter(sprint=sprint)
+
+        if actor is not None:
+            return [qs.filter(protagonist=actor), qs.filter(deuteragonist=actor)]
+        return [qs]
+
+    def newest(self, count, **facets):
+        """
+        Returns a list of the newest count events matching facets, newest
+        first.
+        """
+        return self._merge([qs.order_by('-date')[:count]
+                            for qs in self.get_facet_querysets(**facets)],
+                           True)[:count]
+
+    def newer_than(self, date, **facets):
+        """
+        Returns a list of the events matching facets newer than date, oldest
+        first.
+        """
+        return self._merge([qs.filter(date__gt=date).order_by('date')
+                            for qs in self.get_facet_querysets(**facets)],
+                           False)
+
+    def older_than(self, date, count, **facets):
+        """
+        Returns a list of up to count events matching facets older than date,
+        newest first.
+        """
+        return self._merge([qs.filter(date__lt=date).order_by('-date')[:count]
+                            for qs in self.get_facet_querysets(**facets)],
+                           True)[:count]
+
+    def _merge(self, querysets, newest_first):
+        events = {}
+        for qs in querysets:
+            for e in qs:
+                events[e.pk] = e
+        return sorted(events.values(), key=lambda e: (e.date, e.pk),
+                      reverse=newest_first)
+
+    def _set_sprints(self, events):
+        """
+        Points new events on tasks at the sprint of their task that they
+        happened during, so that a sprint's events can be read without
+        joining through Task.sprints.
+        """
+        task_ids = set([e.task_id for e in events
+                        if e.task_id and not e.sprint_id])
+        if not task_ids:
+            return
+
+        sprints = {}
+        for task_id, sprint_id, start, end \
+            in Sprint.objects.filter(task__in=task_ids) \
+                             .values_list('task', 'id', 'start_date', 'end_date'):
+            sprints.setdefault(task_id, []).append((sprint_id, start, end))
+
+        for e in events:
+            if e.sprint_id or not e.task_id:
+                continue
+            for sprint_id, start, end in sprints.get(e.task_id, ()):
+                if start <= e.date.date() <= end:
+                    e.sprint_id = sprint_id
+                    break
+
+    def _make_digest(self, burst):
+        # Each change in a FogBugz email is an event of its own carrying the
+        # email's comment, so the same comment is only kept once
+        comments = []
+        for e in burst:
+            if e.comment and e.comment not in comments:
+                comments.append(e.comment)
+
+        first = burst[0]
+        return self.model(date=first.date, source=first.source,
+                          protagonist=first.protagonist, task=first.task,
+                          message='{{ protagonist }} made %d changes to {{ task_link }}.' \
+                                  % len(burst),
+                          comment='\n\n'.join(comments),
+                          child_count=len(burst))
+
+def _find_bursts(events, window):
+    """
+    Returns the lists of two or more events by the same protagonist on the
+    same task, each within window of the one before it.
+    """
+    bursts = []
+    open_bursts = {}
+    for e in sorted(events, key=lambda e: e.date):
+        if not e.protagonist_id or not e.task_id:
+            continue
+
+        key = (e.protagonist_id, e.task_id)
+        burst = open_bursts.get(key)
+        if burst and e.date - burst[-1].date <= window:
+            burst.append(e)
+        else:
+            burst = open_bursts[key] = [e]
+            bursts.append(burst)
+    return [b for b in bursts if len(b) > 1]
+
+class RecentEventManager(models.Manager):
+    """
+    Answers the timeline's queries from the hot window of recent events where
+    it can, and only falls back to the full Event table for older pages.
+    """
+    def add_events(self, events):
+        """
+        Adds the given, saved, events to the hot window.  Events that belong to
+        a digest are only shown through it, and are left out.
+        """
+        bulk_insert([self.model(event=e, date=e.date) for e in events
+                     if not e.digest_id])
+
+    def trim(self, cutoff):
+        """
+        Removes events older than cutoff from the hot window.
+        """
+        self.filter(date__lt=cutoff).delete()
+
+    def newest(self, count):
+        """
+        Returns a list of the newest count events, newest first.
+        """
+        events = self._get_events(self.order_by('-date')[:count])
+        if len(events) < count:
+            events.extend(self._get_archived_events(events, None, count))
+        return events
+
+    def newer_than(self, date):
+        """
+        Returns a list of the events newer than date, oldest first.
+        """
+        if not self.filter(date__lte=date).exists():
+            # The hot window starts after date, so it may be missing some
+            archived = self._get_event_model().objects.filter(digest__isnull=True)
+            return list(archived.filter(date__gt=date).order_by('date'))
+        return self._get_events(self.filter(date__gt=date).order_by('date'))
+
+    def older_than(self, date, count):
+        """
+        Returns a list of up to count events older than date, newest first.
+        """
+        events = self._get_events(self.filter(date__lt=date) \
+                                      .order_by('-date')[:count])
+        if len(events) < count:
+            events.extend(self._get_archived_events(events, date, count))
+        return events
+
+    def _get_event_model(self):
+        return self.model._meta.pk.rel.to
+
+    def _get_events(self, recent):
+        return [r.event for r in recent.select_related('event__protagonist',
+                                                       'event__deuteragonist',
+                                                       'event__task')]
+
+    def _get_archived_events(self, events, date, count):
+        """
+        Continues a page that ran off the end of the hot window.  Every
+        recent event older than the cursor is already in events, so the
+        full table only needs to be searched from the oldest of them.
+        """
+        if events:
+            date = events[-1].date
+
+        archived = self._get_event_model().objects.filter(digest__isnull=True) \
+                                                  .order_by('-date')
+        if date is not None:
+            archived = archived.filter(date__lt=date)
+        return list(archived[:count - len(events)])
+
+class EventTokenManager(models.Manager):
+    # The number of postings read at a time while intersecting search terms
+    SEARCH_CHUNK_SIZE = 500
+
+    def index_events(self, events):
+        """
+        Adds the tokens of the given, saved, events to the search index.
+        """
+        tokens = []
+        for event in events:
+            for token in get_event_tokens(event):
+                tokens.append(self.model(token=token, event=event))
+        bulk_insert(tokens)
+
+    def search_event_ids(self, query, before=None, limit=25):
+        """
+        Returns the ids, newest first, of up to limit events matching every
+        word in query.  If before is given, only events with a smaller id are
+        considered, so the last id returned can be used to fetch the next
+        page.
+
+        The words' postings are counted first, one cheap count of the
+        (token, event) index each.  The postings of the rarest word are then
+        walked backwards a chunk at a time, and each chunk is narrowed down
+        by the other words, rarest first.  At worst, the rarest word's
+        postings are all read, so a query is only as slow as its most
+        selective word allows.
+        """
+        counts = dict([(token, self.filter(token=token).count())
+                       for token in tokenize(query)])
+        tokens = sorted(counts, key=counts.get)
+        if not tokens or counts[tokens[0]] == 0:
+            return []
+
+        driver, others = tokens[0], tokens[1:]
+        found = []
+        while len(found) < limit:
+            postings = self.filter(token=driver)
+            if before is not None:
+                postings = postings.filter(event__lt=before)
+            ids = list(postings.order_by('-event') \
+                               .values_list('event', flat=True) \
+                               [:self.SEARCH_CHUNK_SIZE])
+            if not ids:
+                break
+
+            matches = set(ids)
+            for token in others:
+                matches = set(self.filter(token=token, event__in=matches) \
+                                  .values_list('event', flat=True))
+                if not matches:
+                    break
+
+            found.extend([i for i in ids if i in matches])
+            if len(ids) < self.SEARCH_CHUNK_SIZE:
+                break
+            before = ids[-1]
+        return found[:limit]
+
+class FeedEntryManager(models.Manager):
+    """
+    Keeps each user's personal feed: the events about them, written to their
+    feed as the events are inserted, so that a page of it is a single range
+    of the (user, date) index.
+    """
+    def fan_out(self, events):
+        """
+        Adds the given, saved, top level events to the feeds of the users they
+        concern: the users of their protagonist and deuteragonist, and the
+        user their task is assigned to.  A digest is also added to the feeds
+        of the users its children concern.
+        """
+        ids = [e.pk for e in events]
+        if not ids:
+            return
+
+        event_model = self._get_event_model()
+        rows = event_model.objects.filter(Q(pk__in=ids) | Q(digest__in=ids)) \
+                                  .values_list('pk', 'digest', 'date', 'task',
+                                               'protagonist__user',
+                                               'deuteragonist__user')
+        users = {}
+        dates = {}
+        tasks = {}
+        for pk, digest_id, date, task_id, proto_user, deuter_user in rows:
+            top = digest_id or pk
+            if not digest_id:
+                dates[pk] = date
+            users.setdefault(top, set()).update([proto_user, deuter_user])
+            if task_id:
+                tasks.setdefault(task_id, set()).add(top)
+
+        for task_id, assigned_to in self._get_assignees(tasks.keys()):
+            for top in tasks[task_id]:
+                users[top].add(assigned_to)
+
+        bulk_insert([self.model(user_id=user_id, event_id=top, date=dates[top])
+                     for top, user_ids in users.iteritems()
+                     for user_id in user_ids if user_id is not None])
+
+    def trim(self, length):
+        """
+        Removes all but about the newest length entries from each user's
+        feed.
+        """
+        full = self.values('user').annotate(entries=Count('pk')) \
+                   .filter(entries__gt=length)
+        for user_id in [f['user'] for f in full]:
+            cutoff = self.filter(user=user_id).order_by('-date') \
+                         .values_list('date', flat=True)[length]
+            self.filter(user=user_id, date__lte=cutoff).delete()
+
+    def older_than(self, user, date, count):
+        """
+        Returns a list of up to count events from user's feed, newest first.
+        If date is given, only events older than it are returned.
+        """
+        entries = self.filter(user=user)
+        if date is not None:
+            entries = entries.filter(date__lt=date)
+        entries = entries.select_related('event__protagonist',
+                                         'event__deuteragonist', 'event__task')
+        return [f.event for f in entries.order_by('-date')[:count]]
+
+    def _get_event_model(self):
+        return self.model._meta.get_field('event').rel.to
+
+    def _get_assignees(self, task_ids):
+        """
+        Returns (task id, user id) pairs for whoever each of the given tasks
+        is assigned to in its latest snapshot.
+        """
+        if not task_ids:
+            return []
+
+        return Task.objects.filter(pk__in=task_ids, assigned_to__isnull=False) \
+                           .values_list('pk', 'assigned_to')
@@ -23,13 +23,19 @@
 
 import re
 
+from datetime import datetime
+
 from django.db import models
+from django.db.models.signals import m2m_changed
 from django.contrib.auth.models import User
 from django.template import Context, Template
 
 from berserk2.bugtracker import BugTrackerFactory
-from berserk2.timeline.managers import ActorManager
-from berserk2.sprints.models import BugTracker, Task
+from berserk2.timeline.managers import ActorManager, EventManager, \
+                                       EventTokenManager, FeedEntryManager, \
+                                       RecentEventManager
+from berserk2.timeline.signals import events_inserted
+from berserk2.sprints.models import BugTracker, Sprint, Task
 from berserk2.core.templatetags.truncate import truncate_chars
 
 class Actor(models.Model):
@@ -70,6 +76,21 @@ class Event(models.Model):
     comment = models.TextField()
     task = models.ForeignKey(Task, related_name='task',
                              blank=True, null=True)
+    remote_id = models.CharField(max_length=64, null=True, blank=True,
+        help_text='The id of the event at its source, such as a commit hash, if it has one.')
+    digest = models.ForeignKey('self', related_name='children',
+                               null=True, blank=True,
+        help_text='The digest event this event was grouped under, if any.')
+    child_count = models.PositiveIntegerField(default=0, editable=False)
+    sprint = models.ForeignKey(Sprint, null=True, blank=True, editable=False,
+        help_text='The sprint of the task during which the event happened, if any.')
+    objects = EventManager()
+
+    # Filtered timelines are read along (protagonist, date), (deuteragonist,
+    # date), (task, date), (source, date) and (sprint, date) indexes, which
+    # are created by migration 0007.
+    class Meta:
+        unique_together = (('source', 'remote_id'),)
 
     def __unicode__(self):
         return self.message
@@ -90,7 +111,6 @@ class Event(models.Model):
 
         task_link = ''
         if self.task:
-            snap = self.task.get_latest_snapshot()
             task_link = '<a href="%s" target="_blank">#%s</a>' \
                         % (self.task.get_absolute_url(), self.task.remote_tracker_id)
 
@@ -103,6 +123,115 @@ class Event(models.Model):
 
     def get_task_for_display(self):
         if self.task:
-            snap = self.task.get_latest_snapshot()
-            return '#%s: %s' % (self.task.remote_tracker_id, snap.title)
+            return '#%s: %s' % (self.task.remote_tracker_id, self.task.title)
         return ''
+
+class SourceCheckpoint(models.Model):
+    """
+    Records how far a timeline source has read, so that the next run can pick
+    up where the previous one left off.  For IMAP sources, this is the last
+    processed UID along with the UIDVALIDITY of the mailbox it belongs to.
+    """
+    source = models.CharField(max_length=128, unique=True)
+    uid_validity = models.BigIntegerField(default=0)
+    last_uid = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return u'%s @ %d' % (self.source, self.last_uid)
+
+class SourcePayload(models.Model):
+    """
+    A raw payload pushed to us by a timeline source, such as a GitHub post
+    receive hook, waiting for that source's next run to turn it into events.
+    """
+    source = models.CharField(max_length=32, db_index=True)
+    payload = models.TextField()
+    received = models.DateTimeField(auto_now_add=True)
+    processed = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __unicode__(self):
+        return u'%s payload received at %s' % (self.source, self.received)
+
+class RecentEvent(models.Model):
+    """
+    The hot end of the timeline: a copy of the date of every event newer than
+    TIMELINE_HOT_WINDOW_DAYS, which is all the timeline normally shows.  Kept
+    small by the trimrecentevents command, so that its index stays the same
+    size however long the history grows.
+    """
+    event = models.OneToOneField(Event, primary_key=True,
+                                 related_name='recent')
+    date = models.DateTimeField(db_index=True)
+    objects = RecentEventManager()
+
+    def __unicode__(self):
+        return unicode(self.event)
+
+class EventToken(models.Model):
+    """
+    An entry in the timeline's search index: one row for each word an Event
+    can be found by.  Kept up to date as sources insert events; use the
+    rebuildsearchindex command to index events from before it existed.
+    """
+    token = models.CharField(max_length=32)
+    event = models.ForeignKey(Event)
+    objects = EventTokenManager()
+
+    class Meta:
+        unique_together = (('token', 'event'),)
+
+    def __unicode__(self):
+        return self.token
+
+class FeedEntry(models.Model):
+    """
+    An event in a user's personal feed, written when the event is inserted.
+    Feeds are kept to TIMELINE_FEED_LENGTH entries by the trimfeeds command;
+    use the rebuildfeeds command to fill them from the hot window.
+    """
+    user = models.ForeignKey(User)
+    event = models.ForeignKey(Event)
+    date = models.DateTimeField()
+    objects = FeedEntryManager()
+
+    # Feeds are read along a (user, date) index, which is created by
+    # migration 0008.
+    class Meta:
+        unique_together = (('user', 'event'),)
+
+    def __unicode__(self):
+        return u'%s: %s' % (self.user, self.event)
+
+def _index_inserted_events(sender, events, **kwargs):
+    """
+    Called from Event's events_inserted signal.
+
+    Adds the newly inserted events to the hot window, the search index and
+    the feeds of the users they concern.
+    """
+    RecentEvent.objects.add_events(events)
+    EventToken.objects.index_events(events)
+    FeedEntry.objects.fan_out([e for e in events if not e.digest_id])
+
+events_inserted.connect(_index_inserted_events, sender=Event,
+                        dispatch_uid='berserk2.timeline.models.EventToken')
+
+def _assign_event_sprints(sender, instance, action, reverse, model, pk_set,
+                          **kwargs):
+    """
+    Called from Task.sprints' m2m_changed signal.
+
+    Points the events on tasks newly added to a sprint at that sprint.
+    """
+    if action != 'post_add':
+        return
+
+    if reverse:
+        Event.objects.assign_sprint(instance, task_ids=pk_set)
+    else:
+        for sprint in Sprint.objects.filter(pk__in=pk_set):
+            Event.objects.assign_sprint(sprint, task_ids=[instance.pk])
+
+m2m_changed.connect(_assign_event_sprints, sender=Task.sprints.through,
+                    dispatch_uid='berserk2.timeline.models.Event.sprint')
@@ -0,0 +1,148 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import sys
+import Queue
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import connection, transaction
+
+from berserk2 import settings
+from berserk2.timeline.models import Event
+
+class _Failure:
+    """
+    Carries an exception raised while fetching over to the main thread.
+    """
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+_DONE = object()
+
+class SourcePipeline:
+    """
+    Runs one or more timeline sources as three overlapping stages:
+
+     - fetch: source.fetch() is iterated on a background thread for each
+       source, and yields work items.  This is where network traffic and
+       decoding happens, so a slow source doesn't hold up the others.
+
+     - parse: source.parse(item) is called on the calling thread, and returns
+       a list of new, unsaved Events for the item.
+
+     - write: the Events are bulk inserted, with bursts of changes to the
+       same task grouped under digests, and source.commit(item) is called to
+       record the source's progress, all in one transaction per item.
+
+    At most TIMELINE_PIPELINE_QUEUE_SIZE items wait between the fetch and
+    parse stages; once the queue is full, fetching pauses until the writer
+    catches up, so memory stays bounded however large the backlog is.
+
+    Parsing and writing happen on the calling thread only, so sources may
+    share a SourceRunContext.
+    """
+    # How long the fetch thread blocks on a full queue before checking whether
+    # the pipeline has been stopped
+    PUT_TIMEOUT = 0.5
+
+    def __init__(self, sources, queue_size=None):
+        self.sources = sources
+        self.queue_size = queue_size or settings.TIMELINE_PIPELINE_QUEUE_SIZE
+
+    def run(self):
+        """
+        Runs the sources until all of their fetch stages are exhausted.  If
+        fetching from a source fails, the others carry on, and the exception
+        is re-raised here once they are done.
+        """
+        queue = Queue.Queue(self.queue_size)
+        stop = threading.Event()
+
+        fetchers = []
+        for source in self.sources:
+            fetcher = threading.Thread(target=self._fetch,
+                                       args=(source, queue, stop))
+            fetcher.setDaemon(True)
+            fetcher.start()
+            fetchers.append(fetcher)
+
+        failure = None
+        try:
+            running = len(fetchers)
+            while running > 0:
+                source, item = queue.get()
+                if item is _DONE:
+                    running -= 1
+                elif isinstance(item, _Failure):
+                    running -= 1
+                    logging.error('Fetching from %s failed'
+                                  % getattr(source, 'name', source),
+                                  exc_info=item.exc_info)
+                    failure = failure or item
+                else:
+                    self._write(source, item)
+        finally:
+            stop.set()
+            for fetcher in fetchers:
+                fetcher.join()
+
+        if failure:
+            raise failure.exc_info[0], failure.exc_info[1], failure.exc_info[2]
+
+    def _fetch(self, source, queue, stop):
+        items = source.fetch()
+        try:
+            try:
+                for item in items:
+                    if not self._put(queue, (source, item), stop):
+                        return
+            except:
+                self._put(queue, (source, _Failure(sys.exc_info())), stop)
+            else:
+                self._put(queue, (source, _DONE), stop)
+        finally:
+            items.close()
+
+            # Django opens a connection per thread
+            connection.close()
+
+    def _put(self, queue, item, stop):
+        """
+        Waits for room in the queue for item.  Returns False if the pipeline
+        was stopped before it could be queued.
+        """
+        while not stop.isSet():
+            try:
+                queue.put(item, True, self.PUT_TIMEOUT)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    @transaction.commit_on_success
+    def _write(self, source, item):
+        window = timedelta(seconds=settings.TIMELINE_DIGEST_SECONDS)
+        Event.objects.bulk_insert(source.parse(item), digest_window=window)
+        source.commit(item)
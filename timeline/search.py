@@ -0,0 +1,62 @@
+#
+# Copyright (c) 2008-2011 Brad Taylor <brad@getcoded.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+import re
+
+# Tokens longer than this are truncated to fit EventToken.token
+MAX_TOKEN_LENGTH = 32
+
+# Words so common in event text that indexing them would only make the
+# index larger without narrowing down a search
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is',
+    'it', 'of', 'on', 'or', 'the', 'to', 'was', 'with',
+])
+
+TEMPLATE_TAG_RE = re.compile(r'{{.*?}}|{%.*?%}|<[^>]*>')
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+def tokenize(text):
+    """
+    Splits text into the set of lowercase words we index it by.  Template
+    tags and HTML markup are ignored.
+    """
+    if not text:
+        return set()
+
+    text = TEMPLATE_TAG_RE.sub(' ', text).lower()
+    return set([w[:MAX_TOKEN_LENGTH] for w in WORD_RE.findall(text)
+                if w not in STOP_WORDS])
+
+def get_event_tokens(event):
+    """
+    Returns the set of tokens an Event can be found by: the words of its
+    message and comment, the names of its actors and the id of its task.
+    """
+    tokens = tokenize(event.message) | tokenize(event.comment)
+    for actor in (event.protagonist, event.deuteragonist):
+        if actor:
+            tokens |= tokenize(u'%s %s' % (actor.first_name, actor.last_name))
+    if event.task:
+        tokens |= tokenize(event.task.remote_tracker_id)
+    return tokens
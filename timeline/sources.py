@@ -22,8 +22,10 @@
 #
 
 import re
+import ssl
 import time
 import email
+import socket
 import imaplib
 import simplejson
 import dateutil.parser
@@ -33,21 +35,365 @@ from datetime import datetime
 from django.utils.html import escape
 
 from berserk2 import settings
-from berserk2.timeline.models import Actor, Event
-from berserk2.sprints.models import Task, BugTracker
+from berserk2.timeline.pipeline import SourcePipeline
+from berserk2.timeline.models import Actor, Event, SourceCheckpoint, SourcePayload
+from berserk2.sprints.models import Task, BugTracker, refresh_stale_tasks
+
+class SourceRunContext:
+    """
+    Remembers the trackers, tasks and actors looked up during a single run of
+    a source, so that a notification describing several changes does not hit
+    the database again for each one.  Tasks that events were added for are
+    collected so they can be refreshed together once the run is over.
+    """
+    def __init__(self):
+        self._tracker = None
+        self._tracker_loaded = False
+        self._tasks = {}
+        self._actors = {}
+        self.touched_tasks = {}
+
+    def get_default_tracker(self):
+        """
+        Returns the BugTracker new tasks are created in, or None if no bug
+        trackers have been set up.
+        """
+        if not self._tracker_loaded:
+            # TODO: Grab default bug tracker from the currently active sprint
+            trackers = list(BugTracker.objects.all()[:1])
+            self._tracker = trackers[0] if trackers else None
+            self._tracker_loaded = True
+        return self._tracker
+
+    def get_task(self, case_id):
+        """
+        Gets or creates the Task for case_id in the default bug tracker, and
+        marks it as touched.  Returns None if there is no bug tracker.
+        """
+        if case_id not in self._tasks:
+            tracker = self.get_default_tracker()
+            if tracker is None:
+                return None
+
+            task, created = Task.objects.get_or_create(remote_tracker_id=case_id,
+                                                       bug_tracker=tracker)
+            self._tasks[case_id] = task
+
+        task = self._tasks[case_id]
+        self.touched_tasks[task.pk] = task
+        return task
+
+    def get_actor(self, full_name):
+        """
+        Gets or creates the Actor with the given full name.
+        """
+        if full_name not in self._actors:
+            actor, created = Actor.objects.get_or_create_by_full_name(full_name)
+            self._actors[full_name] = actor
+        return self._actors[full_name]
+
+    def refresh_touched_tasks(self):
+        """
+        Refreshes the snapshots of the tasks touched during the run that are
+        out of date.
+        """
+        refresh_stale_tasks(self.touched_tasks.values())
+        self.touched_tasks = {}
+
+FETCH_UID_RE = re.compile(r'UID (\d+)')
+FETCH_START_RE = re.compile(r'^\d+ \(')
+
+#
+# Parsing tables for FogBugz notification emails.
+#
+# Every handler returns a (deuteragonist, message) tuple for the event to be
+# added, where the message is a template rendered by Event.
+#
+
+END_OF_EMAIL_MARKERS = ('You are subscribed', 'If you do not want to')
+
+SUBJECT_ACTOR_RE = re.compile(r'by (\w+ \w+)')
+SUBJECT_ASSIGNED_TO_RE = re.compile(r'A FogBugz case was assigned to (.*) by')
+CASE_ID_RE = re.compile(r'Case (?P<case_id>\d+)')
+
+def _get_case_id(after):
+    """
+    From a string like 'Case 43355' returns the case number as an int.
+    """
+    m = CASE_ID_RE.match(after)
+    if m:
+        return int(m.group('case_id'))
+    return None
+
+def _get_hours(value):
+    """
+    From a string like '2.5 hours' returns the number of hours as a float.
+    """
+    return float(value.split(' ', 1)[0])
+
+def _estimate_message(hours):
+    plural = 'hour' if hours == 1 else 'hours'
+    return "{{ protagonist }} estimates {{ task_link }} will require %g %s to complete." \
+           % (hours, plural)
+
+def _on_new_case(protagonist, subject):
+    return None, '{{ protagonist }} opened a new case {{ task_link }}.'
+
+def _on_assigned(protagonist, subject):
+    deuteragonist = SUBJECT_ASSIGNED_TO_RE.search(subject).group(1)
+    if protagonist == deuteragonist:
+        return None, '{{ protagonist }} assigned {{ task_link }} to {{ proto_self }}.'
+    return deuteragonist, '{{ protagonist }} assigned {{ task_link }} to {{ deuteragonist }}.'
+
+def _on_closed(protagonist, subject):
+    return None, '{{ protagonist }} closed {{ task_link }}.'
+
+SUBJECT_HANDLERS = (
+    ('A new case', _on_new_case),
+    ('A FogBugz case was assigned to', _on_assigned),
+    ('A FogBugz case was closed by', _on_closed),
+)
+
+# How a status of 'Resolved (...)' is described once marked
+RESOLUTIONS = {
+    'Resolved (Fixed)': 'fixed',
+    'Resolved (Not Reproducible)': 'not reproducible',
+    'Resolved (Duplicate)': 'duplicate',
+    'Resolved (Postpooned)': 'postponed',
+    'Resolved (By Design)': 'by design',
+    'Resolved (Won\'t Fix)': 'won\'t fix',
+    'Resolved (Implemented)': 'implemented',
+    'Resolved (Completed)': 'completed',
+}
+
+def _on_milestone_changed(protagonist, type, before, after):
+    return None, "{{ protagonist }} moved {{ task_link }} to the '%s' milestone." % after
+
+def _on_title_changed(protagonist, type, before, after):
+    return None, "{{ protagonist }} changed the title of {{ task_link }} to '%s'." % escape(after)
+
+def _on_estimate_changed(protagonist, type, before, after):
+    return None, _estimate_message(_get_hours(after))
+
+def _on_elapsed_changed(protagonist, type, before, after):
+    hours = _get_hours(after)
+    plural = 'hour has' if hours == 1 else 'hours have'
+    return None, "{{ protagonist }} reports that %g %s been spent on {{ task_link }}." \
+                 % (hours, plural)
+
+def _on_status_changed(protagonist, type, before, after):
+    if before.startswith('Resolved') and after == 'Active':
+        return None, "{{ protagonist }} reopened {{ task_link }}."
+    elif after in RESOLUTIONS:
+        return None, "{{ protagonist }} marked {{ task_link }} as %s." % RESOLUTIONS[after]
+    return None, "{{ protagonist }} marked the status of {{ task_link }} as %s." % after
+
+def _on_duplicate_of_changed(protagonist, type, before, after):
+    return None, '{{ protagonist }} notes that {{ task_link }} is a duplicate of #%d.' \
+                 % _get_case_id(after)
+
+def _on_parent_changed(protagonist, type, before, after):
+    return None, '{{ protagonist }} set the parent of {{ task_link }} to #%d.' \
+                 % _get_case_id(after)
+
+def _on_qa_assignee_changed(protagonist, type, before, after):
+    if protagonist == after:
+        return None, '{{ protagonist }} assigned {{ proto_self }} as the QA resource for {{ task_link }}.'
+    return after, '{{ protagonist }} assigned {{ deuteragonist }} as the QA resource for {{ task_link }}.'
+
+def _on_other_changed(protagonist, type, before, after):
+    if before == '(No Value)':
+        return None, "{{ protagonist }} set the %s of {{ task_link }} to %s." % (type, after)
+    return None, "{{ protagonist }} changed the %s of {{ task_link }} from %s to %s." \
+                 % (type, before, after)
+
+CHANGE_TYPE_HANDLERS = {
+    'milestone': _on_milestone_changed,
+    'title': _on_title_changed,
+    'estimate': _on_estimate_changed,
+    'non-timesheet elapsed time': _on_elapsed_changed,
+    'status': _on_status_changed,
+    'duplicate of': _on_duplicate_of_changed,
+    'parent': _on_parent_changed,
+    'qa assignee': _on_qa_assignee_changed,
+}
+
+def _on_estimate_set(protagonist, hours):
+    return None, _estimate_message(float(hours))
+
+def _on_changed(protagonist, type, before, after):
+    # Sometimes the regex isn't greedy enough and doesn't eat the single quote
+    # when we ask it nicely
+    type = type.lower()
+    handler = CHANGE_TYPE_HANDLERS.get(type, _on_other_changed)
+    return handler(protagonist, type, before.strip("'"), after.strip("'"))
+
+CHANGE_HANDLERS = (
+    (re.compile(r"Estimate set to '(?P<hours>\d+.?\d*) hours?'"), _on_estimate_set),
+    (re.compile(r"^(?P<type>.+) changed from '?(?P<before>.*)'? to '?(?P<after>.*)'?$"), _on_changed),
+)
+
+class _IMAP4_SSL(imaplib.IMAP4_SSL):
+    """
+    An IMAP4_SSL connection which gives up on any read or write that takes
+    longer than timeout seconds, rather than waiting forever on a server that
+    has stopped responding.
+    """
+    def __init__(self, host, timeout):
+        self.timeout = timeout
+        imaplib.IMAP4_SSL.__init__(self, host)
+
+    def open(self, host='', port=imaplib.IMAP4_SSL_PORT):
+        self.host = host
+        self.port = port
+        self.sock = socket.create_connection((host, port), self.timeout)
+        self.sslobj = ssl.wrap_socket(self.sock, self.keyfile, self.certfile)
+        self.file = self.sslobj.makefile('rb')
+
+class FogBugzMailbox:
+    """
+    An IMAP mailbox that FogBugz notification emails are delivered to.  Each
+    mailbox is fetched from on its own, and keeps its own checkpoint, while
+    parsing is left to the FogBugzEmailSource it belongs to.
+    """
+    # Only pull down the headers needed to decode the body, and the body
+    # itself.  PEEK leaves the \Seen flag alone, as we track our position
+    # with a SourceCheckpoint instead.
+    FETCH_ITEMS = '(UID BODY.PEEK[HEADER.FIELDS (DATE CONTENT-TYPE CONTENT-TRANSFER-ENCODING)] BODY.PEEK[TEXT])'
+
+    def __init__(self, source, host, user, password, folder='INBOX',
+                 timeout=None):
+        self.source = source
+        self.host = host
+        self.user = user
+        self.password = password
+        self.folder = folder
+        self.timeout = timeout or settings.FB_EMAIL_SOURCE_TIMEOUT
+
+        # Also the key of the mailbox's SourceCheckpoint
+        self.name = '%s:%s@%s' % (source.name, user, host)
+        if folder != 'INBOX':
+            self.name += '/%s' % folder
+
+    def fetch(self):
+        """
+        Yields a (uid_validity, last_uid, messages) tuple for every batch of
+        new messages in the mailbox, where messages is a list of (tokens, date)
+        tuples.
+
+        At most FB_EMAIL_SOURCE_MAX_MESSAGES are handled per run, fetched in
+        UID ranges of FB_EMAIL_SOURCE_BATCH_SIZE, so that a large backlog is
+        drained over several runs.
+        """
+        c = _IMAP4_SSL(self.host, self.timeout)
+        c.login(self.user, self.password)
+        try:
+            c.select(self.folder, readonly=True)
+
+            checkpoint = self._get_checkpoint(c)
+            uids = self._search_new_uids(c, checkpoint.last_uid)
+            uids = uids[:settings.FB_EMAIL_SOURCE_MAX_MESSAGES]
+
+            batch_size = settings.FB_EMAIL_SOURCE_BATCH_SIZE
+            for i in xrange(0, len(uids), batch_size):
+                batch = uids[i:i + batch_size]
+                typ, msg_data = c.uid('FETCH', '%d:%d' % (batch[0], batch[-1]),
+                                      self.FETCH_ITEMS)
+
+                messages = []
+                for uid, msg in self.source._parse_fetch_response(msg_data):
+                    if uid > checkpoint.last_uid:
+                        decoded = self.source._decode_message(msg)
+                        if decoded:
+                            messages.append(decoded)
+
+                yield (checkpoint.uid_validity, batch[-1], messages)
+        finally:
+            try:
+                c.close()
+            except:
+                pass
+            c.logout()
+
+    def parse(self, item):
+        return self.source.parse(item)
+
+    def commit(self, item):
+        """
+        Moves the checkpoint past a batch yielded by fetch() once its events
+        have been written.
+        """
+        uid_validity, last_uid, messages = item
+        SourceCheckpoint.objects.filter(source=self.name) \
+                                .update(uid_validity=uid_validity,
+                                        last_uid=last_uid)
+
+    def _get_checkpoint(self, c):
+        """
+        Returns the SourceCheckpoint for the selected mailbox.  If we have
+        never read from this mailbox, or its UIDVALIDITY has changed (making
+        our stored UID meaningless), the checkpoint is placed just before the
+        oldest unread message.
+        """
+        typ, [uid_validity] = c.response('UIDVALIDITY')
+        uid_validity = int(uid_validity) if uid_validity else 0
+
+        checkpoint, created = SourceCheckpoint.objects.get_or_create(
+            source=self.name
+        )
+        if created or checkpoint.uid_validity != uid_validity:
+            typ, [unseen] = c.uid('SEARCH', None, 'UNSEEN')
+            if unseen:
+                checkpoint.last_uid = min([int(u) for u in unseen.split()]) - 1
+            else:
+                typ, [all] = c.uid('SEARCH', None, 'ALL')
+                checkpoint.last_uid = max([int(u) for u in all.split()] or [0])
+            checkpoint.uid_validity = uid_validity
+            checkpoint.save()
+        return checkpoint
+
+    def _search_new_uids(self, c, last_uid):
+        """
+        Returns a sorted list of the UIDs in the selected mailbox greater than
+        last_uid.
+        """
+        typ, [uids] = c.uid('SEARCH', None, 'UID', '%d:*' % (last_uid + 1))
+        if not uids:
+            return []
+
+        # A range of 'n:*' always matches the newest message, even if its UID
+        # is less than n
+        return sorted([u for u in [int(u) for u in uids.split()] if u > last_uid])
 
 class FogBugzEmailSource():
     def __init__(self):
         self.name = 'FogBugz'
+        self.context = SourceRunContext()
 
     @staticmethod
     def enabled():
         """
         Returns true if the source is configured properly and should be run.
         """
-        return settings.FB_EMAIL_SOURCE_HOST != '' \
-               and settings.FB_EMAIL_SOURCE_USER != '' \
-               and settings.FB_EMAIL_SOURCE_USER != ''
+        return len(FogBugzEmailSource.get_mailboxes()) > 0
+
+    @staticmethod
+    def get_mailboxes():
+        """
+        Returns the settings of each mailbox to read from, as dicts of
+        FogBugzMailbox arguments: FB_EMAIL_SOURCE_MAILBOXES, or else the
+        single mailbox given by FB_EMAIL_SOURCE_HOST and friends.
+        """
+        if settings.FB_EMAIL_SOURCE_MAILBOXES:
+            return list(settings.FB_EMAIL_SOURCE_MAILBOXES)
+
+        if settings.FB_EMAIL_SOURCE_HOST != '' \
+           and settings.FB_EMAIL_SOURCE_USER != '' \
+           and settings.FB_EMAIL_SOURCE_PASSWORD != '':
+            return [{'host': settings.FB_EMAIL_SOURCE_HOST,
+                     'user': settings.FB_EMAIL_SOURCE_USER,
+                     'password': settings.FB_EMAIL_SOURCE_PASSWORD}]
+        return []
 
     def _parse_date(self, str):
         """
@@ -61,8 +407,67 @@ class FogBugzEmailSource():
 
     def run(self):
         """
-        Runs a single iteration of the source, in this case, polling for the
-        first set of unread messages.
+        Runs a single iteration of the source, in this case, fetching the
+        messages that have arrived in each mailbox since its last processed
+        UID.  The mailboxes are fetched from at the same time, alongside
+        parsing and writing; see SourcePipeline.
+        """
+        self.context = SourceRunContext()
+        SourcePipeline([FogBugzMailbox(self, **m)
+                        for m in self.get_mailboxes()]).run()
+
+        # Done after we've hung up, as this can mean a round trip to the bug
+        # tracker for every case mentioned
+        self.context.refresh_touched_tasks()
+
+    def parse(self, item):
+        """
+        Returns the new Events for a batch yielded by FogBugzMailbox.fetch().
+        """
+        uid_validity, last_uid, messages = item
+
+        events = []
+        for tokens, date in messages:
+            events.extend(self._parse_events(tokens, date))
+        return events
+
+    def _parse_fetch_response(self, msg_data):
+        """
+        Turns the response of a UID FETCH for FogBugzMailbox.FETCH_ITEMS into
+        a list of (uid, email.Message) tuples.  Servers are free to order the
+        items as they please, so the UID may be found either before or after
+        the literals.
+        """
+        def get_uid(s):
+            m = FETCH_UID_RE.search(s)
+            return int(m.group(1)) if m else None
+
+        messages = []
+        uid, header, text = None, '', ''
+        for part in msg_data:
+            if isinstance(part, tuple):
+                prefix, literal = part
+                if FETCH_START_RE.match(prefix):
+                    if uid is not None:
+                        messages.append((uid, email.message_from_string(header + text)))
+                    uid, header, text = None, '', ''
+
+                uid = get_uid(prefix) or uid
+                if 'HEADER' in prefix:
+                    header = literal
+                elif 'TEXT' in prefix:
+                    text = literal
+            elif part:
+                uid = get_uid(part) or uid
+
+        if uid is not None:
+            messages.append((uid, email.message_from_string(header + text)))
+        return messages
+
+    def _decode_message(self, msg):
+        """
+        Decodes and tokenizes a single notification email.  Returns a
+        (tokens, date) tuple, or None if the message has no usable body.
         """
         def get_charset(msg, default="ascii"):
             if msg.get_content_charset():
@@ -71,40 +476,25 @@ class FogBugzEmailSource():
                 return msg.get_charset()
             return default
 
-        c = imaplib.IMAP4_SSL(settings.FB_EMAIL_SOURCE_HOST)
-        c.login(settings.FB_EMAIL_SOURCE_USER, settings.FB_EMAIL_SOURCE_PASSWORD)
-        try:
-            c.select('INBOX')
-
-            typ, [msg_ids] = c.search(None, 'UNSEEN')
-            if msg_ids == '':
-                return
-
-            for i in msg_ids.split(' '):
-                typ, msg_data = c.fetch(i, '(RFC822)')
-                for response_part in msg_data:
-                    if isinstance(response_part, tuple):
-                        msg = email.message_from_string(response_part[1])
-                        date = self._parse_date(msg['date'])
+        date = self._parse_date(msg['date'])
 
-                        payload = msg.get_payload(decode=True)
-                        if not payload:
-                            continue
+        payload = msg.get_payload(decode=True)
+        if not payload:
+            return None
 
-                        body = unicode(payload, get_charset(msg), 'replace')
-                        if not body:
-                            continue
+        body = unicode(payload, get_charset(msg), 'replace')
+        if not body:
+            return None
 
-                        self._parse_body(self._tokenize_body(body.split('\r\n')),
-                                         date)
-        finally:
-            try:
-                c.close()
-            except:
-                pass
-            c.logout()
+        return (self._tokenize_body(body.split('\r\n')), date)
 
     def _tokenize_body(self, lines):
+        """
+        Splits the body of a notification email into its subject line, case
+        id, list of change lines and list of comment lines.  Lines are
+        stripped once up front, and the following two lines are only looked
+        at when a blank line or the URL line is found.
+        """
         case_id = 0
         changes = []
         begin_changes_block = False
@@ -112,25 +502,26 @@ class FogBugzEmailSource():
         comment = []
         begin_comment_block = False
 
+        stripped = [line.strip() for line in lines]
+        count = len(stripped)
+
         i = 0
-        while i < len(lines):
-            l = lines[i].strip()
-            m = lines[i+1].strip() if i + 1 < len(lines) else None
-            n = lines[i+2].strip() if i + 2 < len(lines) else None
+        while i < count:
+            l = stripped[i]
 
             # Look for the end of email marker
-            if l == '' and m == '':
-                if n and (n.startswith('You are subscribed') \
-                          or n.startswith('If you do not want to')):
-                    break
+            if l == '' and i + 2 < count and stripped[i+1] == '' \
+               and stripped[i+2].startswith(END_OF_EMAIL_MARKERS):
+                break
 
             if l.startswith('Changes:'):
                 begin_changes_block = True
             elif l.startswith('Last message:'):
                 begin_comment_block = True
             elif not begin_changes_block and not begin_comment_block \
-                 and l.startswith('URL:') and m == '' and n != '' \
-                 and not n.startswith('Description'):
+                 and l.startswith('URL:') and i + 2 < count \
+                 and stripped[i+1] == '' and stripped[i+2] != '' \
+                 and not stripped[i+2].startswith('Description'):
                 i += 1
                 begin_comment_block = True
             elif begin_changes_block:
@@ -153,20 +544,20 @@ class FogBugzEmailSource():
                 'changes': changes,
                 'comment': comment}
 
-    def _get_case_id(self, after):
+    def _parse_body(self, tokens, date=datetime.now()):
         """
-        From a string like 'Case 43355' returns the case number as an int.
+        Parses a tokenized email and writes its events.
         """
-        m = re.match('Case (?P<case_id>\d+)', after)
-        if m:
-            return int(m.group('case_id'))
-        return None
+        Event.objects.bulk_insert(self._parse_events(tokens, date))
+
+    def _parse_events(self, tokens, date):
+        """
+        Parses a tokenized email, returning a list of new, unsaved Events.
+        """
+        self._events = []
 
-    def _parse_body(self, tokens, date=datetime.now()):
         e = None
-        message = ''
         protagonist = ''
-        deuteragonist = ''
 
         subject = tokens['subject']
         case_id = int(tokens['case_id'])
@@ -175,185 +566,147 @@ class FogBugzEmailSource():
 
         # The actor involved in the event will be identified in the subject line:
         # e.g.: A FogBugz case was edited by Aardvark Bobcat.
-        m = re.search('by (\w+ \w+)', subject)
+        m = SUBJECT_ACTOR_RE.search(subject)
         if m:
             protagonist = m.group(1)
 
         # Some emails are formatted such that the action is embedded inside of
         # the subject line:
-        if subject.startswith('A new case'):
-            e = self._add_event(case_id, protagonist, None, date,
-                                '{{ protagonist }} opened a new case {{ task_link }}.', comment)
-        elif subject.startswith('A FogBugz case was assigned to'):
-            m = re.search('A FogBugz case was assigned to (.*) by', subject)
-            deuteragonist = m.group(1)
-            if protagonist == deuteragonist:
-                e = self._add_event(case_id, protagonist, None, date,
-                                    '{{ protagonist }} assigned {{ task_link }} to {{ proto_self }}.', comment)
-            else:
+        for prefix, handler in SUBJECT_HANDLERS:
+            if subject.startswith(prefix):
+                deuteragonist, message = handler(protagonist, subject)
                 e = self._add_event(case_id, protagonist, deuteragonist, date,
-                                    '{{ protagonist }} assigned {{ task_link }} to {{ deuteragonist }}.', comment)
-        elif subject.startswith('A FogBugz case was closed by'):
-            e = self._add_event(case_id, protagonist, None, date,
-                                '{{ protagonist }} closed {{ task_link }}.', comment)
+                                    message, comment)
+                break
 
         # Others have actions listed out nicely:
-        if len(changes) > 0:
-            for change in changes:
-                m = re.match("Estimate set to '(?P<hours>\d+.?\d*) hours?'", change)
+        for change in changes:
+            # The change line may or may not end in a period
+            # Don't you just love their consistentcy?
+            change = change.rstrip('.')
+
+            for pattern, handler in CHANGE_HANDLERS:
+                m = pattern.match(change)
                 if m:
-                    hours = float(m.group('hours'))
-                    plural = 'hour' if hours == 1 else 'hours'
-                    e = self._add_event(case_id, protagonist, None, date,
-                                        "{{ protagonist }} estimates {{ task_link }} will require %g %s to complete." % (hours, plural),
-                                        comment)
-                    continue
-
-                # The change line may or may not end in a period
-                # Don't you just love their consistentcy?
-                change = change.rstrip('.')
-
-                m = re.match("^(?P<type>.+) changed from '?(?P<before>.*)'? to '?(?P<after>.*)'?$", change)
-                if not m:
-                    continue
-
-                type = m.group('type').lower()
-
-                # Sometimes the regex isn't greedy enough and doesn't eat the
-                # single quote when we ask it nicely
-                before = m.group('before').strip("'")
-                after = m.group('after').strip("'")
-                if type == 'milestone':
-                    e = self._add_event(case_id, protagonist, None, date,
-                                        "{{ protagonist }} moved {{ task_link }} to the '%s' milestone." % after,
-                                        comment)
-                elif type == 'title':
-                    e = self._add_event(case_id, protagonist, None, date,
-                                        "{{ protagonist }} changed the title of {{ task_link }} to '%s'." % escape(after),
-                                        comment)
-                elif type == 'estimate':
-                    hours = float(after.split(' ', 1)[0])
-                    plural = 'hour' if hours == 1 else 'hours'
-                    e = self._add_event(case_id, protagonist, None, date,
-                                        "{{ protagonist }} estimates {{ task_link }} will require %g %s to complete." % (hours, plural),
-                                        comment)
-                elif type == 'non-timesheet elapsed time':
-                    hours = float(after.split(' ', 1)[0])
-                    plural = 'hour has' if hours == 1 else 'hours have'
-                    e = self._add_event(case_id, protagonist, None, date,
-                                        "{{ protagonist }} reports that %g %s been spent on {{ task_link }}." % (hours, plural),
-                                        comment)
-                elif type == 'status':
-                    if before.startswith('Resolved') and after == 'Active':
-                        e = self._add_event(case_id, protagonist, None, date,
-                                            "{{ protagonist }} reopened {{ task_link }}.", comment)
-                    elif after == 'Resolved (Fixed)':
-                        e = self._add_event(case_id, protagonist, None, date,
-                                            "{{ protagonist }} marked {{ task_link }} as fixed.", comment)
-                    elif after == 'Resolved (Not Reproducible)':
-                        e = self._add_event(case_id, protagonist, None, date,
-                                            "{{ protagonist }} marked {{ task_link }} as not reproducible.", comment)
-                    elif after == 'Resolved (Duplicate)':
-                        e = self._add_event(case_id, protagonist, None, date,
-                                            "{{ protagonist }} marked {{ task_link }} as duplicate.", comment)
-                    elif after == 'Resolved (Postpooned)':
-                        e = self._add_event(case_id, protagonist, None, date,
-                                            "{{ protagonist }} marked {{ task_link }} as postponed.", comment)
-                    elif after == 'Resolved (By Design)':
-                        e = self._add_event(case_id, protagonist, None, date,
-                                            "{{ protagonist }} marked {{ task_link }} as by design.", comment)
-                    elif after == 'Resolved (Won\'t Fix)':
-                        e = self._add_event(case_id, protagonist, None, date,
-                                            "{{ protagonist }} marked {{ task_link }} as won't fix.", comment)
-                    elif after == 'Resolved (Implemented)':
-                        e = self._add_event(case_id, protagonist, None, date,
-                                            "{{ protagonist }} marked {{ task_link }} as implemented.", comment)
-                    elif after == 'Resolved (Completed)':
-                        e = self._add_event(case_id, protagonist, None, date,
-                                            "{{ protagonist }} marked {{ task_link }} as completed.", comment)
-                    else:
-                        e = self._add_event(case_id, protagonist, None, date,
-                                            "{{ protagonist }} marked the status of {{ task_link }} as %s." % after,
-                                            comment)
-                elif type == 'duplicate of':
-                    e = self._add_event(case_id, protagonist, None, date,
-                                        '{{ protagonist }} notes that {{ task_link }} is a duplicate of #%d.' % self._get_case_id(after),
-                                        comment)
-                elif type == 'parent':
-                    e = self._add_event(case_id, protagonist, None, date,
-                                        '{{ protagonist }} set the parent of {{ task_link }} to #%d.' % self._get_case_id(after),
-                                        comment)
-                elif type == 'qa assignee':
-                    if protagonist == after:
-                        e = self._add_event(case_id, protagonist, None, date,
-                                            '{{ protagonist }} assigned {{ proto_self }} as the QA resource for {{ task_link }}.',
-                                            comment)
-                    else:
-                        e = self._add_event(case_id, protagonist, after, date,
-                                            '{{ protagonist }} assigned {{ deuteragonist }} as the QA resource for {{ task_link }}.',
-                                            comment)
-                else:
-                    if before == '(No Value)':
-                        e = self._add_event(case_id, protagonist, None, date,
-                                            "{{ protagonist }} set the %s of {{ task_link }} to %s." % (type, after),
-                                            comment)
-                    else:
-                        e = self._add_event(case_id, protagonist, None, date,
-                                            "{{ protagonist }} changed the %s of {{ task_link }} from %s to %s." % \
-                                            (type, before, after), comment)
+                    deuteragonist, message = handler(protagonist, **m.groupdict())
+                    e = self._add_event(case_id, protagonist, deuteragonist, date,
+                                        message, comment)
+                    break
 
         # Last resort: if nothing else, the user just commented
         if e == None and len(changes) == 0 and len(comment) > 0:
             self._add_event(case_id, protagonist, None, date,
                             '{{ protagonist }} commented on {{ task_link }}.', comment)
 
+        return self._events
 
     def _add_event(self, case_id, protagonist, deuteragonist, date, message, comment):
-        task = None
-        trackers = BugTracker.objects.all()
-        if trackers.count() > 0:
-            # TODO: Grab default bug tracker from the currently active sprint
-            task, created = Task.objects.get_or_create(remote_tracker_id=case_id,
-                                                       bug_tracker=trackers[0])
-            task.get_latest_snapshot(refresh_if_old=True)
+        task = self.context.get_task(case_id)
 
         if protagonist:
-            protagonist, created = Actor.objects.get_or_create_by_full_name(protagonist)
+            protagonist = self.context.get_actor(protagonist)
 
         if deuteragonist:
-            deuteragonist, created = Actor.objects.get_or_create_by_full_name(deuteragonist)
+            deuteragonist = self.context.get_actor(deuteragonist)
 
         comments = u'\n'.join(comment)
 
-        return Event.objects.create(
-            source=self.name, protagonist=protagonist, deuteragonist=deuteragonist,
-            message=message, comment=comments, task=task, date=date
-        )
+        e = Event(source=self.name, protagonist=protagonist,
+                  deuteragonist=deuteragonist, message=message,
+                  comment=comments, task=task, date=date)
+        self._events.append(e)
+        return e
 
 class GitHubPushSource:
+    NAME = 'GitHub'
+
+    # How many queued payloads are turned into events per transaction
+    PAYLOADS_PER_BATCH = 50
+
     def __init__(self):
-        self.name = 'GitHub'
+        self.name = self.NAME
+        self.context = SourceRunContext()
 
     @staticmethod
     def enabled():
         """
         Returns true if the source is configured properly and should be run.
         """
-        return False
+        return True
 
-    def process_payload(self, payload):
+    def run(self):
+        """
+        Runs a single iteration of the source, in this case, processing the
+        payloads GitHub has posted to timeline_github_hook since the last run.
+        """
+        self.context = SourceRunContext()
+        SourcePipeline([self]).run()
+
+    def fetch(self):
+        """
+        Yields lists of unprocessed SourcePayloads, oldest first.
+        """
+        last_id = 0
+        while True:
+            payloads = list(SourcePayload.objects.filter(source=self.name,
+                                                         processed__isnull=True,
+                                                         pk__gt=last_id)
+                                                 .order_by('pk')[:self.PAYLOADS_PER_BATCH])
+            if not payloads:
+                return
+
+            yield payloads
+            last_id = payloads[-1].pk
+
+    def parse(self, payloads):
+        """
+        Returns the new Events for a list of payloads yielded by fetch().
+        """
+        events = []
+        for p in payloads:
+            events.extend(self._parse_payload(p.payload))
+        return self._remove_duplicates(events)
+
+    def commit(self, payloads):
+        """
+        Marks a list of payloads yielded by fetch() as processed.
+        """
+        SourcePayload.objects.filter(pk__in=[p.pk for p in payloads]) \
+                             .update(processed=datetime.now())
+
+    def _remove_duplicates(self, events):
+        """
+        Filters out events for commits that we have already seen, either
+        earlier in the list or in the database.  The same commit is sent to us
+        again when GitHub redelivers a hook or a branch is force-pushed.
+        """
+        existing = set(Event.objects.filter(source=self.name,
+                                            remote_id__in=[e.remote_id for e in events])
+                                    .values_list('remote_id', flat=True))
+        unique = []
+        for e in events:
+            if e.remote_id not in existing:
+                existing.add(e.remote_id)
+                unique.append(e)
+        return unique
+
+    def _parse_payload(self, payload):
+        """
+        Returns a list of new, unsaved Events for the commits in a payload.
+        """
         data = simplejson.loads(payload)
 
         repo = data.get('repository')
         repo_name = repo.get('name') if repo else 'Unknown'
         ref = data.get('ref')
 
+        events = []
         for commit in data.get('commits'):
             author = commit.get('author')
             protagonist = author.get('name')
 
             if protagonist:
-                protagonist, created = Actor.objects.get_or_create_by_full_name(protagonist)
+                protagonist = self.context.get_actor(protagonist)
 
             if ref == 'refs/heads/master':
                 message = '{{ protagonist }} pushed <a href="%s" target="_blank">%s</a> to %s.' \
@@ -368,7 +721,9 @@ class GitHubPushSource:
             if timestamp:
                 date = dateutil.parser.parse(timestamp).replace(tzinfo=None)
 
-            Event.objects.create(
+            events.append(Event(
                 source=self.name, protagonist=protagonist, date=date,
-                message=message, comment=escape(commit.get('message'))
-            )
+                message=message, comment=escape(commit.get('message')),
+                remote_id=commit['id']
+            ))
+        return events
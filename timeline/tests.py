@@ -21,11 +21,22 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
-from datetime import datetime
+import simplejson
 
-from django.test import TestCase
+from datetime import datetime, timedelta
 
-from berserk2.timeline.models import Event, Actor
+from django.conf import settings
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.utils.html import escape
+
+from berserk2.sprints.models import BugTracker, TaskSnapshot
+from berserk2.sprints.testutils import create_task
+from berserk2.timeline.models import Event, EventToken, FeedEntry, \
+                                     RecentEvent, Actor, SourcePayload
+from berserk2.timeline.managers import _find_bursts
+from berserk2.timeline.pipeline import SourcePipeline
 from berserk2.timeline.sources import FogBugzEmailSource, GitHubPushSource
 
 class FogBugzEmailSourceTokenizerTest(TestCase):
@@ -160,6 +171,28 @@ class FogBugzEmailSourceTokenizerTest(TestCase):
         self.assertEqual(["QA Assignee changed from Bobcat Goldthwait to Aardvark Bobcat"], tokens['changes'])
         self.assertEqual([], tokens['comment'])
 
+class FogBugzEmailSourceFetchTest(TestCase):
+    def setUp(self):
+        self.fb = FogBugzEmailSource()
+
+    def test_parse_fetch_response(self):
+        header = 'Date: Tue, 1 Mar 2011 12:30:53 -0500\r\nContent-Type: text/plain; charset="us-ascii"\r\n\r\n'
+        messages = self.fb._parse_fetch_response([
+            ('1 (UID 41 BODY[HEADER.FIELDS (DATE CONTENT-TYPE CONTENT-TRANSFER-ENCODING)] {%d}' % len(header), header),
+            (' BODY[TEXT] {5}', 'first'),
+            ')',
+            ('2 (BODY[HEADER.FIELDS (DATE CONTENT-TYPE CONTENT-TRANSFER-ENCODING)] {%d}' % len(header), header),
+            (' BODY[TEXT] {6}', 'second'),
+            ' UID 43)',
+        ])
+
+        self.assertEqual(2, len(messages))
+        self.assertEqual(41, messages[0][0])
+        self.assertEqual('first', messages[0][1].get_payload(decode=True))
+        self.assertEqual('Tue, 1 Mar 2011 12:30:53 -0500', messages[0][1]['date'])
+        self.assertEqual(43, messages[1][0])
+        self.assertEqual('second', messages[1][1].get_payload(decode=True))
+
 class FogBugzEmailSourceParserTest(TestCase):
     def setUp(self):
         self.fb = FogBugzEmailSource()
@@ -504,17 +537,32 @@ Sed consectetur quam vel metus hendrerit ac porta nisl placerat. Nulla quis metu
 
         self.assertEqual('', a.comment)
 
-class GitHubPushSourceTest(TestCase):
-    def setUp(self):
-        self.gh = GitHubPushSource()
-
-    def _process_payload(self, file):
-        f = open(file, 'r')
-        self.gh.process_payload('\n'.join(f.readlines()))
+def _process_queued_payloads():
+    """
+    Turns the queued GitHub payloads into events on this thread, the way
+    GitHubPushSource.run() does through its pipeline.
+    """
+    gh = GitHubPushSource()
+    for payloads in gh.fetch():
+        Event.objects.bulk_insert(gh.parse(payloads))
+        gh.commit(payloads)
+
+def _process_payload(file):
+    """
+    Queues the GitHub payload in file, as timeline_github_hook does, and turns
+    it into events.
+    """
+    f = open(file, 'r')
+    try:
+        SourcePayload.objects.create(source=GitHubPushSource.NAME,
+                                     payload=f.read())
+    finally:
         f.close()
+    _process_queued_payloads()
 
+class GitHubPushSourceTest(TestCase):
     def test_github_example(self):
-        self._process_payload('timeline/testassets/github_payloads/github_example.txt')
+        _process_payload('timeline/testassets/github_payloads/github_example.txt')
 
         events = Event.objects.all()
         self.assertEqual(2, events.count())
@@ -546,7 +594,7 @@ class GitHubPushSourceTest(TestCase):
         self.assertEqual('update pricing a tad', b.comment)
 
     def test_berserk(self):
-        self._process_payload('timeline/testassets/github_payloads/berserk.txt')
+        _process_payload('timeline/testassets/github_payloads/berserk.txt')
 
         events = Event.objects.all()
         self.assertEqual(3, events.count())
@@ -589,3 +637,328 @@ class GitHubPushSourceTest(TestCase):
                          c.message)
 
         self.assertEqual('Switch order of args', c.comment)
+
+    def test_redelivery(self):
+        _process_payload('timeline/testassets/github_payloads/berserk.txt')
+        _process_payload('timeline/testassets/github_payloads/berserk.txt')
+
+        events = Event.objects.all()
+        self.assertEqual(3, events.count())
+        self.assertEqual(['1398bb563b416b5121f23cbc8108c69b011baa94',
+                          'eb0a4dc458c4213bd0d8daaee23c5e940cecff58',
+                          'c59fcedbd8783336223ec57a17baa3e390299b4d'],
+                         [e.remote_id for e in events])
+
+    def _post_payload(self, sources):
+        old_sources = settings.TIMELINE_SOURCES
+        settings.TIMELINE_SOURCES = sources
+        try:
+            f = open('timeline/testassets/github_payloads/github_example.txt', 'r')
+            try:
+                return self.client.post('/timeline/github_hook/', {'payload': f.read()})
+            finally:
+                f.close()
+        finally:
+            settings.TIMELINE_SOURCES = old_sources
+
+    def test_hook_refuses_payload_without_source(self):
+        self.assertEqual(503, self._post_payload(()).status_code)
+        self.assertEqual(0, SourcePayload.objects.count())
+
+    def test_hook_queues_payload(self):
+        response = self._post_payload(('GitHubPushSource',))
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(0, Event.objects.count())
+        self.assertEqual(1, SourcePayload.objects.filter(processed__isnull=True).count())
+
+        _process_queued_payloads()
+
+        self.assertEqual(2, Event.objects.count())
+        self.assertEqual(0, SourcePayload.objects.filter(processed__isnull=True).count())
+
+class RecentEventTest(TestCase):
+    def setUp(self):
+        Event.objects.bulk_insert([
+            Event(source='Test', date=datetime(2011, 3, day), message='%d' % day,
+                  comment='')
+            for day in xrange(1, 11)
+        ])
+        RecentEvent.objects.trim(datetime(2011, 3, 6))
+
+    def _days(self, events):
+        return [e.date.day for e in events]
+
+    def test_trim(self):
+        self.assertEqual(5, RecentEvent.objects.count())
+        self.assertEqual(10, Event.objects.count())
+
+    def test_newest(self):
+        self.assertEqual([10, 9, 8], self._days(RecentEvent.objects.newest(3)))
+        self.assertEqual(range(10, 0, -1),
+                         self._days(RecentEvent.objects.newest(50)))
+
+    def test_older_than(self):
+        self.assertEqual([7, 6],
+                         self._days(RecentEvent.objects.older_than(datetime(2011, 3, 8), 2)))
+        self.assertEqual([7, 6, 5, 4],
+                         self._days(RecentEvent.objects.older_than(datetime(2011, 3, 8), 4)))
+        self.assertEqual([2, 1],
+                         self._days(RecentEvent.objects.older_than(datetime(2011, 3, 3), 4)))
+
+    def test_newer_than(self):
+        self.assertEqual([9, 10],
+                         self._days(RecentEvent.objects.newer_than(datetime(2011, 3, 8))))
+        self.assertEqual(range(3, 11),
+                         self._days(RecentEvent.objects.newer_than(datetime(2011, 3, 2))))
+
+class EventDigestTest(TestCase):
+    def _event(self, protagonist_id, task_id, minute):
+        return Event(protagonist_id=protagonist_id, task_id=task_id,
+                     date=datetime(2011, 3, 1, 12, minute),
+                     message='%d' % minute)
+
+    def test_find_bursts(self):
+        events = [
+            self._event(1, 1, 0), self._event(1, 1, 1), self._event(2, 1, 1),
+            self._event(1, 2, 1), self._event(1, 1, 2), self._event(1, 1, 10),
+            self._event(1, 1, 11), self._event(None, 1, 11),
+        ]
+        bursts = _find_bursts(events, timedelta(minutes=1))
+        self.assertEqual([['0', '1', '2'], ['10', '11']],
+                         [[e.message for e in b] for b in bursts])
+
+    def test_untasked_events_are_not_grouped(self):
+        events = [Event(source='Test', date=datetime(2011, 3, 1, 12, 0),
+                        message='%d' % i, comment='') for i in xrange(3)]
+        Event.objects.bulk_insert(events, digest_window=timedelta(minutes=5))
+        self.assertEqual(3, Event.objects.count())
+        self.assertEqual(3, RecentEvent.objects.count())
+
+    def test_digest_keeps_each_comment_once(self):
+        brad = Actor.objects.create(first_name='Brad', last_name='Taylor')
+        tracker = BugTracker.objects.create(base_url='http://example.com',
+                                            product='Berserk', username='',
+                                            password='')
+        task = create_task('1', tracker)
+
+        # Like a FogBugz email with three changes and a comment, followed by
+        # another with one
+        events = [Event(source='FogBugz', protagonist=brad, task=task,
+                        date=datetime(2011, 3, 1, 12, 0), message='%d' % i,
+                        comment='Looks good') for i in xrange(3)]
+        events.append(Event(source='FogBugz', protagonist=brad, task=task,
+                            date=datetime(2011, 3, 1, 12, 1), message='3',
+                            comment='Done'))
+        Event.objects.bulk_insert(events, digest_window=timedelta(minutes=5))
+
+        digest = Event.objects.get(child_count=4)
+        self.assertEqual('{{ protagonist }} made 4 changes to {{ task_link }}.',
+                         digest.message)
+        self.assertEqual('Looks good\n\nDone', digest.comment)
+
+class EventFacetTest(TestCase):
+    def setUp(self):
+        self.brad = Actor.objects.create(first_name='Brad', last_name='Taylor')
+        self.chris = Actor.objects.create(first_name='Chris', last_name='Wanstrath')
+
+        def event(minute, source, protagonist, deuteragonist=None):
+            return Event(source=source, date=datetime(2011, 3, 1, 12, minute),
+                         protagonist=protagonist, deuteragonist=deuteragonist,
+                         message='%d' % minute, comment='')
+
+        Event.objects.bulk_insert([
+            event(0, 'FogBugz', self.brad),
+            event(1, 'GitHub', self.chris),
+            event(2, 'FogBugz', self.chris, self.brad),
+            event(3, 'GitHub', self.brad),
+            event(4, 'FogBugz', self.chris),
+        ])
+
+    def _minutes(self, events):
+        return [e.date.minute for e in events]
+
+    def test_actor(self):
+        self.assertEqual([3, 2, 0],
+                         self._minutes(Event.objects.newest(10, actor=self.brad.pk)))
+        self.assertEqual([3, 2],
+                         self._minutes(Event.objects.newest(2, actor=self.brad.pk)))
+        self.assertEqual([2, 0],
+                         self._minutes(Event.objects.older_than(datetime(2011, 3, 1, 12, 3),
+                                                                10, actor=self.brad.pk)))
+        self.assertEqual([2, 3],
+                         self._minutes(Event.objects.newer_than(datetime(2011, 3, 1, 12, 0),
+                                                                actor=self.brad.pk)))
+
+    def test_source(self):
+        self.assertEqual([3, 1],
+                         self._minutes(Event.objects.newest(10, source='GitHub')))
+        self.assertEqual([2, 0],
+                         self._minutes(Event.objects.newest(10, source='FogBugz',
+                                                            actor=self.brad.pk)))
+
+class CompactEventsJsonTest(TestCase):
+    def setUp(self):
+        _process_payload('timeline/testassets/github_payloads/berserk.txt')
+
+    def test_compact(self):
+        url = reverse('timeline_previous_events_json', args=[2000000000])
+        full = simplejson.loads(self.client.get(url).content)
+        compact = simplejson.loads(self.client.get(url, {'format': 'compact'}).content)
+
+        self.assertEqual(full['new_earlier_than'], compact['new_earlier_than'])
+        self.assertEqual([e['pk'] for e in full['events']],
+                         compact['events']['pk'])
+        self.assertEqual([['Brad Taylor', 'itself']], compact['actors'])
+        self.assertEqual([0, 0, 0], compact['events']['protagonist'])
+        self.assertEqual([None, None, None], compact['events']['task'])
+        self.assertEqual('Forgot to add import', compact['events']['comment'][-1])
+
+    def test_compact_comment_matches_full(self):
+        # Comments are stored as HTML, so both formats send them as is
+        Event.objects.all().update(comment=escape('Fix <b> & "c"\nagain'))
+
+        url = reverse('timeline_previous_events_json', args=[2000000000])
+        full = simplejson.loads(self.client.get(url).content)
+        compact = simplejson.loads(self.client.get(url, {'format': 'compact'}).content)
+
+        self.assertEqual('Fix &lt;b&gt; &amp; &quot;c&quot;<br />again',
+                         compact['events']['comment'][0])
+        self.assertEqual([e['comment'] for e in full['events']],
+                         compact['events']['comment'])
+
+class EventSearchTest(TestCase):
+    def setUp(self):
+        _process_payload('timeline/testassets/github_payloads/berserk.txt')
+
+    def _search(self, query, **kwargs):
+        ids = EventToken.objects.search_event_ids(query, **kwargs)
+        return [Event.objects.get(pk=i).comment for i in ids]
+
+    def test_comment(self):
+        self.assertEqual(['Forgot to add import'], self._search('IMPORT'))
+
+    def test_every_word_must_match(self):
+        self.assertEqual(['Forgot to add import'],
+                         self._search('brad forgot import'))
+        self.assertEqual([], self._search('brad forgot pricing'))
+
+    def test_markup_is_not_indexed(self):
+        self.assertEqual(3, len(self._search('Brad Taylor pushed')))
+        self.assertEqual([], self._search('href'))
+        self.assertEqual([], self._search('protagonist'))
+
+    def test_paging(self):
+        newest = EventToken.objects.search_event_ids('brad', limit=2)
+        self.assertEqual(2, len(newest))
+        self.assertTrue(newest[0] > newest[1])
+
+        rest = EventToken.objects.search_event_ids('brad', before=newest[-1])
+        self.assertEqual(1, len(rest))
+        self.assertTrue(rest[0] < newest[-1])
+
+    def test_no_words(self):
+        self.assertEqual([], self._search(''))
+        self.assertEqual([], self._search('the'))
+
+class FeedEntryTest(TestCase):
+    def setUp(self):
+        self.brad = User.objects.create_user('brad', 'brad@example.com')
+        self.chris = User.objects.create_user('chris', 'chris@example.com')
+        self.pj = User.objects.create_user('pj', 'pj@example.com')
+
+        self.brad_actor = Actor.objects.create(first_name='Brad', last_name='Taylor',
+                                               user=self.brad)
+        self.chris_actor = Actor.objects.create(first_name='Chris', last_name='Wanstrath',
+                                                user=self.chris)
+
+        tracker = BugTracker.objects.create(base_url='http://example.com',
+                                            product='Berserk', username='',
+                                            password='')
+        self.task = create_task('1', tracker)
+        for assigned_to in (self.brad, self.pj):
+            TaskSnapshot.objects.create(task=self.task, title='Task',
+                                        component='', assigned_to=assigned_to,
+                                        status='Active', estimated_hours=1,
+                                        actual_hours=0, remaining_hours=1)
+
+    def _event(self, minute, protagonist, deuteragonist=None, task=None):
+        return Event(source='Test', date=datetime(2011, 3, 1, 12, minute),
+                     protagonist=protagonist, deuteragonist=deuteragonist,
+                     task=task, message='%d' % minute, comment='')
+
+    def _minutes(self, user):
+        return [e.date.minute for e in FeedEntry.objects.older_than(user, None, 50)]
+
+    def test_fan_out(self):
+        Event.objects.bulk_insert([
+            self._event(0, self.brad_actor),
+            self._event(1, self.chris_actor, self.brad_actor),
+            self._event(2, self.chris_actor, task=self.task),
+        ])
+        self.assertEqual([1, 0], self._minutes(self.brad))
+        self.assertEqual([2, 1], self._minutes(self.chris))
+        self.assertEqual([2], self._minutes(self.pj))
+
+    def test_digest(self):
+        Event.objects.bulk_insert([
+            self._event(0, self.chris_actor, task=self.task),
+            self._event(1, self.chris_actor, self.brad_actor, task=self.task),
+        ], digest_window=timedelta(minutes=5))
+
+        digest = Event.objects.get(digest__isnull=True)
+        for user in (self.brad, self.chris, self.pj):
+            self.assertEqual([digest], FeedEntry.objects.older_than(user, None, 50))
+
+    def test_paging_and_trim(self):
+        Event.objects.bulk_insert([self._event(m, self.brad_actor)
+                                   for m in xrange(10)])
+        page = FeedEntry.objects.older_than(self.brad, datetime(2011, 3, 1, 12, 5), 2)
+        self.assertEqual([4, 3], [e.date.minute for e in page])
+
+        FeedEntry.objects.trim(4)
+        self.assertEqual([9, 8, 7, 6], self._minutes(self.brad))
+
+class SourcePipelineTest(TestCase):
+    class NumberSource:
+        """
+        Fetches the numbers 0 through 9, and adds an event for each.
+        """
+        def __init__(self):
+            self.committed = []
+
+        def fetch(self):
+            for i in xrange(10):
+                yield i
+
+        def parse(self, item):
+            return [Event(source='Numbers', date=datetime(2011, 3, 1, 12, item),
+                          message='Event %d' % item, comment='')]
+
+        def commit(self, item):
+            self.committed.append(item)
+
+    def test_writes_every_item(self):
+        source = self.NumberSource()
+        SourcePipeline([source], queue_size=2).run()
+
+        events = Event.objects.order_by('date')
+        self.assertEqual(10, events.count())
+        self.assertEqual(['Event %d' % i for i in xrange(10)],
+                         [e.message for e in events])
+        self.assertEqual(range(10), source.committed)
+
+    def test_failing_source_does_not_stop_others(self):
+        class FailingSource(self.NumberSource):
+            def fetch(self):
+                yield 0
+                raise IOError('Connection timed out')
+
+        failing = FailingSource()
+        source = self.NumberSource()
+        self.assertRaises(IOError,
+                          SourcePipeline([failing, source], queue_size=2).run)
+
+        self.assertEqual([0], failing.committed)
+        self.assertEqual(range(10), source.committed)
+        self.assertEqual(11, Event.objects.count())
@@ -27,6 +27,9 @@ urlpatterns = patterns('berserk2.timeline.views',
     url(r'^$', 'timeline_index', name="timeline_index"),
     url(r'^latest_events_json/(?P<start_after>\d+)$', 'timeline_latest_events_json', name="timeline_latest_events_json"),
     url(r'^previous_events_json/(?P<earlier_than>\d+)$', 'timeline_previous_events_json', name="timeline_previous_events_json"),
+    url(r'^search/json$', 'timeline_search_json', name="timeline_search_json"),
+    url(r'^feed_json$', 'timeline_feed_json', name="timeline_feed_json"),
+    url(r'^event_children_json/(?P<event_id>\d+)$', 'timeline_event_children_json', name="timeline_event_children_json"),
     url(r'^event_popup/(?P<event_id>\d+)$', 'timeline_event_popup', name="timeline_event_popup"),
     url(r'^github_hook/$', 'timeline_github_hook'),
 )
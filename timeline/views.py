@@ -21,84 +21,139 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
+import re
+import logging
 import simplejson
 
 from datetime import datetime
 
+from django.conf import settings
 from django.template import RequestContext
 from django.contrib.csrf.middleware import csrf_exempt
 from django.http import HttpResponse, HttpResponseBadRequest
+from django.views.decorators.gzip import gzip_page
 from django.template.defaultfilters import linebreaksbr
 from django.shortcuts import render_to_response, get_object_or_404
 
-from berserk2.timeline.models import Event
 from berserk2.timeline.sources import GitHubPushSource
+from berserk2.timeline.models import Event, EventToken, FeedEntry, \
+                                     RecentEvent, SourcePayload
 from berserk2.timeline.templatetags.utcunixtimestamp import utcunixtimestamp
 
+SOURCE_NAME_RE = re.compile(r'^\w+$')
+
 def timeline_index(request,
                    template_name='timeline/index.html'):
-    events = Event.objects.order_by('-date')[:50]
+    facets = _get_facets(request)
+    events = _get_timeline(facets).newest(50, **facets)
 
     new_start_after = datetime.now()
-    if events.count() > 0:
+    if events:
         new_start_after = utcunixtimestamp(events[0].date)
 
     new_earlier_than = 0
-    if events.count() > 0:
-        new_earlier_than = utcunixtimestamp(events[events.count()-1].date)
+    if events:
+        new_earlier_than = utcunixtimestamp(events[-1].date)
 
     return render_to_response(template_name,
                               {'events': events,
+                               'facets': simplejson.dumps(facets),
                                'new_start_after': new_start_after,
                                'new_earlier_than': new_earlier_than},
                               context_instance=RequestContext(request))
 
+@gzip_page
 def timeline_latest_events_json(request, start_after):
     """
     Returns a list of events newer than start_after (a event pk) in json format.
+    The actor, task, source and sprint parameters filter the events.
     """
+    facets = _get_facets(request)
     after = datetime.fromtimestamp(float(start_after))
-    events = Event.objects.filter(date__gt=after) \
-                          .order_by('date')
-    data = map(lambda e: {
-        'pk': e.pk, 'date': utcunixtimestamp(e.date),
-        'message': e.get_message_for_display(),
-        'task': e.get_task_for_display(),
-        'comment': linebreaksbr(e.comment),
-    }, events)
+    events = _get_timeline(facets).newer_than(after, **facets)
 
     new_start_after = start_after
-    if events.count() > 0:
-        new_start_after = utcunixtimestamp(events[events.count()-1].date)
+    if events:
+        new_start_after = utcunixtimestamp(events[-1].date)
 
-    return HttpResponse(simplejson.dumps({
-        'events': data,
-        'new_start_after': new_start_after,
-    }))
+    return _events_json_response(request, events,
+                                 new_start_after=new_start_after)
 
+@gzip_page
 def timeline_previous_events_json(request, earlier_than):
     """
     Returns a list of 25 events older than earlier_than (a event pk) in json
-    format.
+    format.  The actor, task, source and sprint parameters filter the events.
     """
+    facets = _get_facets(request)
     before = datetime.fromtimestamp(float(earlier_than))
-    events = Event.objects.filter(date__lt=before) \
-                          .order_by('-date')[:25]
-    data = map(lambda e: {
-        'pk': e.pk, 'date': utcunixtimestamp(e.date),
-        'message': e.get_message_for_display(),
-        'task': e.get_task_for_display(),
-        'comment': linebreaksbr(e.comment),
-    }, events)
+    events = _get_timeline(facets).older_than(before, 25, **facets)
+
+    new_earlier_than = -1 # signal end of data
+    if events:
+        new_earlier_than = utcunixtimestamp(events[-1].date)
+
+    return _events_json_response(request, events,
+                                 new_earlier_than=new_earlier_than)
+
+@gzip_page
+def timeline_search_json(request):
+    """
+    Returns a page of events matching every word of the q parameter in json
+    format, newest first.  Pass the returned new_before (a event pk) as the
+    before parameter to get the next page.
+    """
+    query = request.GET.get('q', '')
+    try:
+        before = int(request.GET['before'])
+    except (KeyError, ValueError):
+        before = None
+
+    ids = EventToken.objects.search_event_ids(query, before=before, limit=25)
+    events = Event.objects.in_bulk(ids)
+    events = [events[i] for i in ids if i in events]
+
+    new_before = -1 # signal end of data
+    if len(ids) == 25:
+        new_before = ids[-1]
+
+    return _events_json_response(request, events, new_before=new_before)
+
+@gzip_page
+def timeline_feed_json(request):
+    """
+    Returns a page of 25 events from the logged in user's feed in json
+    format, newest first.  Pass the returned new_earlier_than as the
+    earlier_than parameter to get the next page.
+    """
+    if not request.user.is_authenticated():
+        return _events_json_response(request, [], new_earlier_than=-1)
+
+    try:
+        before = datetime.fromtimestamp(float(request.GET['earlier_than']))
+    except (KeyError, ValueError):
+        before = None
+
+    events = FeedEntry.objects.older_than(request.user, before, 25)
 
     new_earlier_than = -1 # signal end of data
-    if events.count() > 0:
-        new_earlier_than = utcunixtimestamp(events[events.count()-1].date)
+    if len(events) == 25:
+        new_earlier_than = utcunixtimestamp(events[-1].date)
+
+    return _events_json_response(request, events,
+                                 new_earlier_than=new_earlier_than)
 
-    return HttpResponse(simplejson.dumps({
-        'events': data,
-        'new_earlier_than': new_earlier_than,
-    }))
+@gzip_page
+def timeline_event_children_json(request, event_id):
+    """
+    Returns the events grouped under the given digest event in json format,
+    oldest first.
+    """
+    digest = get_object_or_404(Event, pk=event_id)
+    events = digest.children.select_related('protagonist', 'deuteragonist',
+                                            'task') \
+                            .order_by('date', 'pk')
+    return _events_json_response(request, events)
 
 def timeline_event_popup(request, event_id,
                          template_name='timeline/event_popup.html'):
@@ -115,7 +170,10 @@ def timeline_event_popup(request, event_id,
 def timeline_github_hook(request):
     """
     Accepts a POST request from GitHub when a user git pushes to a repository
-    we're monitorring.
+    we're monitorring.  The payload is stored as-is and turned into events
+    the next time GitHubPushSource runs, so that large pushes don't keep
+    GitHub waiting.  Pushes are refused unless GitHubPushSource is listed in
+    TIMELINE_SOURCES, as nothing would ever turn them into events.
     """
     if request.method != 'POST':
         return HttpResponseBadRequest()
@@ -123,6 +181,104 @@ def timeline_github_hook(request):
     if not 'payload' in request.POST:
         return HttpResponseBadRequest()
 
-    g = GitHubPushSource()
-    g.process_payload(request.POST['payload'])
+    if 'GitHubPushSource' not in settings.TIMELINE_SOURCES:
+        logging.warning('Refusing a GitHub push because GitHubPushSource is not in TIMELINE_SOURCES')
+        return HttpResponse(status=503)
+
+    SourcePayload.objects.create(source=GitHubPushSource.NAME,
+                                 payload=request.POST['payload'])
     return HttpResponse()
+
+def _event_to_json(e):
+    return {
+        'pk': e.pk, 'date': utcunixtimestamp(e.date),
+        'message': e.get_message_for_display(),
+        'task': e.get_task_for_display(),
+        'comment': linebreaksbr(e.comment),
+        'children': e.child_count,
+    }
+
+def _get_facets(request):
+    """
+    Returns the facets the timeline is filtered by: the ids of an actor, task
+    and sprint, and the name of a source.
+    """
+    facets = {}
+    for name in ('actor', 'task', 'sprint'):
+        try:
+            facets[name] = int(request.GET[name])
+        except (KeyError, ValueError):
+            pass
+    if SOURCE_NAME_RE.match(request.GET.get('source', '')):
+        facets['source'] = request.GET['source']
+    return facets
+
+def _get_timeline(facets):
+    """
+    The unfiltered timeline is read from the hot window of recent events;
+    filtered timelines are read from the facet indexes on Event.
+    """
+    if facets:
+        return Event.objects
+    return RecentEvent.objects
+
+def _events_json_response(request, events, **extra):
+    """
+    Returns a response with events and the values in extra in json format.
+
+    If the format parameter is 'compact', events are sent column by column,
+    as they are stored, and each actor and task they mention is sent just
+    once.  Rendering them is left to the client; see timeline.js.
+    """
+    if request.GET.get('format') == 'compact':
+        extra.update(_compact_events(events))
+    else:
+        extra['events'] = map(_event_to_json, events)
+    return HttpResponse(simplejson.dumps(extra))
+
+def _compact_events(events):
+    actors = {}
+    tasks = {}
+    def lookup(table, id, get, describe):
+        """
+        Returns the index of the object with the given id in table, adding it
+        if needed.  get is only called for objects not seen before.
+        """
+        if id is None:
+            return None
+        if id not in table:
+            table[id] = (len(table), describe(get()))
+        return table[id][0]
+
+    def describe_actor(a):
+        return [unicode(a), a.get_reflexive_gender_pronoun()]
+
+    def describe_task(t):
+        return [t.remote_tracker_id, t.get_absolute_url(), t.title]
+
+    columns = dict([(c, []) for c in ('pk', 'date', 'message', 'protagonist',
+                                      'deuteragonist', 'task', 'comment',
+                                      'children')])
+    for e in events:
+        columns['pk'].append(e.pk)
+        columns['date'].append(utcunixtimestamp(e.date))
+        columns['message'].append(e.message)
+        columns['protagonist'].append(lookup(actors, e.protagonist_id,
+                                             lambda: e.protagonist,
+                                             describe_actor))
+        columns['deuteragonist'].append(lookup(actors, e.deuteragonist_id,
+                                               lambda: e.deuteragonist,
+                                               describe_actor))
+        columns['task'].append(lookup(tasks, e.task_id, lambda: e.task,
+                                      describe_task))
+        columns['comment'].append(linebreaksbr(e.comment))
+        columns['children'].append(e.child_count)
+
+    def by_index(table):
+        return [d for i, d in sorted(table.values())]
+
+    return {
+        'events': columns,
+        'actors': by_index(actors),
+        'tasks': by_index(tasks),
+    }
@@ -32,6 +32,7 @@ urlpatterns = patterns('',
     (r'^timeline/', include('berserk2.timeline.urls')),
     (r'^reports/', include('berserk2.reports.urls')),
     (r'^$', 'django.views.generic.simple.redirect_to', {'url': '/sprints/'}),
+    (r'^metrics$', 'berserk2.core.views.metrics'),
 
     # Uncomment the admin/doc line below and add 'django.contrib.admindocs'
     # to INSTALLED_APPS to enable admin documentation: